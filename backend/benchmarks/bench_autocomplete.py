@@ -0,0 +1,59 @@
+"""Benchmark: in-memory domain index lookups for /seo/domains/autocomplete.
+
+Loads synthetic domains into the index structures directly (no database)
+and reports build time and per-lookup latency for admin and per-user
+searches.
+
+Usage:
+    cd backend && python benchmarks/bench_autocomplete.py --rows 1000000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.domain_index import _DomainTable
+
+WORDS = (
+    'baeckerei autohaus werkstatt friseur zahnarzt praxis steuerberater kanzlei '
+    'bestattungen gaertnerei schreinerei elektro sanitaer dachdecker maler umzug '
+    'reinigung restaurant hotel metzgerei optiker apotheke'
+).split()
+CITIES = 'muenchen berlin hamburg koeln frankfurt stuttgart leipzig dresden'.split()
+QUERIES = ['a', 'auto', 'www.bae', 'hamburg', 'decker-dre', 'zzz']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    rows = []
+    for i in range(args.rows):
+        www = 'www.' if rng.random() < 0.3 else ''
+        rows.append((i + 1, f'{www}{rng.choice(WORDS)}-{rng.choice(CITIES)}-{i}.de',
+                     rng.randint(1, args.users)))
+
+    t0 = time.perf_counter()
+    table = _DomainTable()
+    table.load(rows)
+    print(f"Built index for {args.rows} domains in {time.perf_counter() - t0:.1f} s")
+
+    for user_id in (None, 1):
+        who = 'admin' if user_id is None else f'user {user_id}'
+        for query in QUERIES:
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                matches = table.search(query, user_id, 10)
+            per_call = (time.perf_counter() - t0) / args.repeat * 1e6
+            print(f"  {who:8s} {query!r:12s} {per_call:10.1f} us  ({len(matches)} matches)")
+
+
+if __name__ == '__main__':
+    main()
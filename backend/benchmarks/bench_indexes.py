@@ -0,0 +1,129 @@
+"""Benchmark: lookup/listing queries before and after the index migration.
+
+Builds a throw-away SQLite database with the legacy (index-less) schema,
+fills it with synthetic rows, then prints query plans and timings for the
+hot queries of /seo/analyze, /seo/results and /images/history before and
+after running the migrations.
+
+Usage:
+    cd backend && python benchmarks/bench_indexes.py --rows 1000000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import text
+from src.models.user import db
+from src.models.image import GeneratedImage  # noqa: F401 (registers table)
+from src.models.migrations import run_migrations
+
+LEGACY_INDEXES = [
+    'ix_seo_result_domain',
+    'ix_seo_result_user_created',
+    'ix_seo_result_created',
+    'ix_generated_images_user_created',
+]
+
+QUERIES = {
+    'analyze: lookup by domain':
+        'SELECT * FROM seo_result WHERE domain = :domain LIMIT 1',
+    'results: user page 1':
+        'SELECT * FROM seo_result WHERE user_id = :user_id '
+        'ORDER BY created_at DESC LIMIT 10',
+    'results: admin page 1':
+        'SELECT * FROM seo_result ORDER BY created_at DESC LIMIT 10',
+    'images/history: user page 1':
+        'SELECT * FROM generated_images WHERE user_id = :user_id '
+        'ORDER BY created_at DESC LIMIT 10',
+}
+
+
+def create_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def fill(conn, rows, users, batch=50000):
+    start = datetime(2024, 1, 1)
+    conn.execute(text(
+        "INSERT INTO user (id, username, email, password_hash, role, created_at) "
+        "VALUES " + ", ".join(
+            f"({i}, 'user{i}', 'user{i}@example.com', 'x', 'user', '2024-01-01')"
+            for i in range(1, users + 1)
+        )
+    ))
+    for offset in range(0, rows, batch):
+        seo_rows = []
+        image_rows = []
+        for i in range(offset, min(offset + batch, rows)):
+            created = start + timedelta(seconds=i * 7)
+            user_id = random.randint(1, users)
+            seo_rows.append((f'domain{i}.example.de', 'short', created, user_id))
+            image_rows.append((user_id, 'prompt', 'header', f'/static/uploads/{i}.png', created))
+        conn.exec_driver_sql(
+            'INSERT INTO seo_result (domain, short_description, created_at, user_id) '
+            'VALUES (?, ?, ?, ?)', seo_rows
+        )
+        conn.exec_driver_sql(
+            'INSERT INTO generated_images (user_id, user_input, image_type, image_url, created_at) '
+            'VALUES (?, ?, ?, ?, ?)', image_rows
+        )
+
+
+def measure(conn, rows, repeat):
+    params = {'domain': f'domain{rows // 2}.example.de', 'user_id': 1}
+    for label, sql in QUERIES.items():
+        plan = conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params).fetchall()
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            conn.execute(text(sql), params).fetchall()
+            timings.append(time.perf_counter() - t0)
+        timings.sort()
+        print(f"  {label:32s} median {timings[len(timings) // 2] * 1000:9.3f} ms")
+        for row in plan:
+            print(f"      plan: {row[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            with db.engine.begin() as conn:
+                for name in LEGACY_INDEXES:
+                    conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+                print(f"Inserting {args.rows} SEO results and images ...")
+                fill(conn, args.rows, args.users)
+
+            with db.engine.connect() as conn:
+                print("Before migration:")
+                measure(conn, args.rows, args.repeat)
+
+            t0 = time.perf_counter()
+            run_migrations(db.engine)
+            print(f"Migrations took {time.perf_counter() - t0:.2f} s")
+
+            with db.engine.connect() as conn:
+                print("After migration:")
+                measure(conn, args.rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark: OFFSET pagination vs. keyset (cursor) pagination.
+
+Times fetching a page at increasing depths for the admin listing and a
+single user's listing, using the same queries as /seo/results.
+
+Usage:
+    cd backend && python benchmarks/bench_pagination.py --rows 1000000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.user import db, SEOResult
+from src.models.migrations import run_migrations
+from src.models.pagination import keyset_page, encode_cursor
+from bench_indexes import create_app, fill
+
+PER_PAGE = 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            run_migrations(db.engine)
+            print(f"Inserting {args.rows} SEO results ...")
+            with db.engine.begin() as conn:
+                fill(conn, args.rows, args.users)
+
+            for label, base in (('admin', SEOResult.query),
+                                ('user 1', SEOResult.query.filter(SEOResult.user_id == 1))):
+                total = base.count()
+                pages = max(total // PER_PAGE, 1)
+                print(f"{label}: {total} rows")
+                for depth in (1, 10, 100, 1000, pages // 2, pages):
+                    if depth > pages:
+                        continue
+                    # Offset mode: what paginate() does (COUNT + OFFSET)
+                    t0 = time.perf_counter()
+                    base.order_by(SEOResult.created_at.desc()).paginate(
+                        page=depth, per_page=PER_PAGE, error_out=False)
+                    offset_ms = (time.perf_counter() - t0) * 1000
+
+                    # Keyset mode: cursor taken from the row before that page
+                    before = base.order_by(SEOResult.created_at.desc(), SEOResult.id.desc()) \
+                        .offset((depth - 1) * PER_PAGE - 1).first() if depth > 1 else None
+                    cursor = encode_cursor(before.created_at, before.id) if before else None
+                    t0 = time.perf_counter()
+                    keyset_page(base, SEOResult, PER_PAGE, cursor)
+                    keyset_ms = (time.perf_counter() - t0) * 1000
+                    print(f"  page {depth:7d}: offset {offset_ms:9.2f} ms   keyset {keyset_ms:7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark: full-text profile search vs. the old domain LIKE filter.
+
+Fills a throw-away SQLite database with synthetic SEO profiles (the FTS
+index is maintained by the insert trigger) and times ranked FTS searches
+against the previous ``domain LIKE '%x%'`` query.
+
+Usage:
+    cd backend && python benchmarks/bench_search.py --rows 1000000
+"""
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from src.models.user import db
+from src.models.image import GeneratedImage  # noqa: F401 (registers table)
+from src.models.migrations import run_migrations
+from src.models.search import search_results
+from bench_indexes import create_app
+
+WORDS = (
+    'bäckerei konditorei autohaus werkstatt reifen friseur salon zahnarzt praxis '
+    'physiotherapie steuerberater kanzlei rechtsanwalt bestattungen blumen gärtnerei '
+    'schreinerei tischlerei elektro sanitär heizung dachdecker maler fliesen umzug '
+    'reinigung catering restaurant hotel pension café metzgerei optiker apotheke'
+).split()
+CITIES = 'münchen berlin hamburg köln frankfurt stuttgart leipzig dresden nürnberg'.split()
+SEARCHES = ['bäck', 'autohaus münchen', 'steuerberater köln', 'gmbh', 'zahn prax']
+# Filler vocabulary so long descriptions look like text, not a handful of terms
+FILLER = [f'wort{i}' for i in range(20000)]
+
+
+def fill(conn, rows, batch=20000):
+    conn.execute(text(
+        "INSERT INTO user (id, username, email, password_hash, role) "
+        "VALUES (1, 'bench', 'bench@example.com', 'x', 'user')"
+    ))
+    rng = random.Random(42)
+    for offset in range(0, rows, batch):
+        values = []
+        for i in range(offset, min(offset + batch, rows)):
+            trade = rng.choice(WORDS)
+            city = rng.choice(CITIES)
+            keywords = json.dumps(rng.sample(WORDS, 3) + rng.sample(FILLER, 7), ensure_ascii=False)
+            values.append((
+                f'{trade}-{city}-{i}.de',
+                f'Wir sind Ihre {trade} in {city}.',
+                f'{trade} {city} ' + ' '.join(rng.choices(FILLER, k=80)),
+                keywords,
+                json.dumps({'Unternehmen': f'{trade.title()} {i} GmbH',
+                            'Adresse': city.title()}, ensure_ascii=False),
+                1,
+            ))
+        conn.exec_driver_sql(
+            'INSERT INTO seo_result (domain, short_description, long_description, '
+            'keywords, company_info, user_id) VALUES (?, ?, ?, ?, ?, ?)', values
+        )
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            run_migrations(db.engine)
+            print(f"Inserting {args.rows} SEO profiles ...")
+            t0 = time.perf_counter()
+            with db.engine.begin() as conn:
+                fill(conn, args.rows)
+            print(f"Insert took {time.perf_counter() - t0:.1f} s (including FTS triggers)")
+
+            for search in SEARCHES:
+                fts_ms, (hits, total) = timed(
+                    lambda: search_results(search, page=1, per_page=10), args.repeat)
+                like_ms, _ = timed(lambda: db.session.execute(
+                    text('SELECT id FROM seo_result WHERE domain LIKE :q '
+                         'ORDER BY created_at DESC LIMIT 10'),
+                    {'q': f'%{search}%'}).fetchall(), args.repeat)
+                print(f"  {search!r:24s} FTS {fts_ms:8.2f} ms ({total} matches)   "
+                      f"LIKE on domain {like_ms:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
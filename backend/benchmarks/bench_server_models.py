@@ -0,0 +1,211 @@
+"""Benchmark: throughput of the worker models in src/serve.py for I/O-bound traffic.
+
+An analysis is dominated by waiting: fetching the website and the OpenAI
+call. The benchmark starts a local upstream that answers after --delay
+seconds and serves the app (create_app plus a /bench/analyze route that
+fetches the upstream twice, like crawl and LLM call) under each worker
+model with the same number of processes. ``asgi-async`` serves the route
+like the async analyze handler of src/asgi.py (httpx on the event loop)
+instead of through the WSGI adapter. --clients concurrent clients then
+send requests for --duration seconds.
+
+Reports requests per second, latency percentiles and errors per model.
+
+Usage:
+    cd backend && python benchmarks/bench_server_models.py
+    cd backend && python benchmarks/bench_server_models.py --models gevent asgi-async --clients 256
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BASE_PORT = 5090
+
+
+class SlowUpstream(BaseHTTPRequestHandler):
+    delay = 0.1
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        body = b'<html><body><footer>Beispiel GmbH</footer></body></html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_upstream(port, delay):
+    SlowUpstream.delay = delay
+    server = ThreadingHTTPServer(('127.0.0.1', port), SlowUpstream)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serve(argv):
+    """Subprocess: run src/serve.py with the benchmark route added to the app"""
+    from src import serve as server_module
+
+    upstream = os.environ['BENCH_UPSTREAM']
+    original_load_app = server_module.load_app
+
+    def load_app(args):
+        from src.main import create_app
+        app = create_app(start_services=not args.preload, setup_schema=False)
+
+        @app.route('/bench/analyze')
+        def bench_analyze():
+            import requests
+            # Crawl, then the model call: two blocking upstream requests
+            page = requests.get(upstream, timeout=30)
+            answer = requests.get(upstream, timeout=30)
+            return {'length': len(page.text) + len(answer.text)}
+
+        wrapped = server_module.wrap_app(app, args)
+        if os.environ.get('BENCH_ASYNC'):
+            from src.services.async_runtime import http_client
+
+            async def bench_analyze_async(request):
+                page = await http_client().get(upstream, timeout=30)
+                answer = await http_client().get(upstream, timeout=30)
+                return {'length': len(page.text) + len(answer.text)}, 200
+
+            wrapped.routes[('GET', '/bench/analyze')] = bench_analyze_async
+        return wrapped
+
+    server_module.load_app = load_app
+    try:
+        server_module.configure_logging()
+        server_module.run(server_module.parse_args(argv))
+    finally:
+        server_module.load_app = original_load_app
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/auth/me')
+            conn.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def load(port, clients, duration):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def client():
+        nonlocal errors
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while time.time() < deadline:
+            t0 = time.perf_counter()
+            try:
+                conn.request('GET', '/bench/analyze')
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - t0)
+                else:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        for _ in range(clients):
+            pool.submit(client)
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_model(model, args, port, env):
+    if model == 'asgi-async':
+        env = dict(env, BENCH_ASYNC='1')
+    argv = ['--worker-class', model.split('-')[0], '--port', str(port), '--workers', str(args.workers),
+            '--threads', str(args.threads), '--worker-connections', str(args.clients * 2),
+            '--max-requests', '0', '--log-level', 'warning']
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve'] + argv,
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        if not wait_ready(port):
+            print(f"{model:<10} did not start: {process.stderr.read1().decode(errors='replace')[-300:]}")
+            return
+        latencies, errors, elapsed = load(port, args.clients, args.duration)
+        print(f"{model:<10} {len(latencies) / elapsed:>8.1f} req/s   "
+              f"p50 {percentile(latencies, 0.5) * 1000:>7.1f} ms   "
+              f"p95 {percentile(latencies, 0.95) * 1000:>7.1f} ms   "
+              f"{errors} errors")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', nargs='+', default=['sync', 'gthread', 'gevent', 'asgi', 'asgi-async'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--delay', type=float, default=0.1, help='Upstream latency in seconds')
+    args = parser.parse_args()
+
+    upstream = start_upstream(BASE_PORT - 1, args.delay)
+    workdir = tempfile.mkdtemp(prefix='bench-server-')
+    env = dict(os.environ,
+               BENCH_UPSTREAM=f"http://127.0.0.1:{BASE_PORT - 1}/",
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+               UPLOAD_DIR=os.path.join(workdir, 'uploads'),
+               IMAGE_GC_INTERVAL='0',
+               OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'sk-bench'))
+
+    print(f"{args.workers} workers, {args.threads} threads (gthread, asgi), {args.clients} clients, "
+          f"{args.delay * 1000:.0f} ms upstream latency x2 per request, {args.duration:.0f} s per model")
+    print(f"Upper bound: {args.clients / (2 * args.delay):.1f} req/s\n")
+    try:
+        for i, model in enumerate(args.models):
+            run_model(model, args, BASE_PORT + i, env)
+    finally:
+        upstream.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        serve(sys.argv[2:])
+    else:
+        main()
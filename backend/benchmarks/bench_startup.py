@@ -0,0 +1,145 @@
+"""Benchmark: cold start of the app.
+
+Measures in fresh interpreters (median of --runs):
+
+* ``import src.main``,
+* ``create_app()`` against a database whose schema is already set up
+  (the fingerprint fast path) and against an empty one,
+* which heavy modules (openai, bs4, requests, httpx) are loaded once the
+  app is built - they should only arrive with the first request that
+  needs them or the background warm-up,
+
+and for the production server (``src/serve.py``, one worker): time from
+process start to the first response and to the first 200 (a login), on a
+new database (first deploy) and on the same database again (redeploy).
+
+Usage:
+    cd backend && python benchmarks/bench_startup.py
+    cd backend && python benchmarks/bench_startup.py --runs 10 --worker-class asgi
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+import http.client
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('openai', 'bs4', 'requests', 'httpx')
+
+PROBE = """
+import os, sys, json, time
+started = time.perf_counter()
+sys.path.insert(0, os.getcwd())
+import src.main
+imported = time.perf_counter()
+src.main.create_app(start_services=False)
+built = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (built - imported) * 1000,
+    'heavy_modules': [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def probe(env):
+    output = subprocess.run([sys.executable, '-c', PROBE % (HEAVY_MODULES,)], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def request(port, method, path, body=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    headers = {'Content-Type': 'application/json'} if body else {}
+    conn.request(method, path, body=json.dumps(body) if body else None, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def time_to_first_200(args, env, timeout=60):
+    """Seconds from spawning the server to its first response and first successful login"""
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'src/serve.py', '--worker-class', args.worker_class,
+                                '--workers', '1', '--port', str(args.port), '--log-level', 'warning'],
+                               cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first_response = None
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                status = request(args.port, 'POST', '/api/auth/login',
+                                 {'username': 'admin', 'password': 'admin123'})
+            except OSError:
+                time.sleep(0.01)
+                continue
+            if first_response is None:
+                first_response = time.perf_counter() - started
+            if status == 200:
+                return first_response, time.perf_counter() - started
+            time.sleep(0.01)
+        return first_response, None
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def median(values):
+    return statistics.median(values) if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--worker-class', default='gthread')
+    parser.add_argument('--port', type=int, default=5190)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    base_env = dict(os.environ,
+                    UPLOAD_DIR=os.path.join(workdir, 'uploads'),
+                    IMAGE_GC_INTERVAL='0',
+                    METRICS_DIR=os.path.join(workdir, 'metrics'),
+                    STARTUP_WARMUP='0')
+    try:
+        # App startup in-process, on a prepared and on an empty database
+        ready_env = dict(base_env, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'ready.db')}")
+        probe(ready_env)
+        ready = [probe(ready_env) for _ in range(args.runs)]
+        empty = []
+        for i in range(args.runs):
+            empty.append(probe(dict(base_env, DATABASE_URL=f"sqlite:///{os.path.join(workdir, f'empty{i}.db')}")))
+
+        print(f"import src.main              {median([r['import_ms'] for r in ready]):>8.1f} ms")
+        print(f"create_app (schema current)  {median([r['create_app_ms'] for r in ready]):>8.1f} ms")
+        print(f"create_app (empty database)  {median([r['create_app_ms'] for r in empty]):>8.1f} ms")
+        heavy = ready[-1]['heavy_modules']
+        print(f"heavy modules after startup  {', '.join(heavy) if heavy else 'none'}")
+
+        # Production server: first deploy on a new database, then a redeploy
+        print(f"\nsrc/serve.py, {args.worker_class}, 1 worker (median of {args.runs})")
+        for label, fresh in (('new database', True), ('redeploy', False)):
+            first, ok = [], []
+            for i in range(args.runs):
+                name = f'serve{i}.db' if fresh else 'serve.db'
+                env = dict(base_env, DATABASE_URL=f"sqlite:///{os.path.join(workdir, name)}")
+                response, login = time_to_first_200(args, env)
+                if response is not None:
+                    first.append(response)
+                if login is not None:
+                    ok.append(login)
+            print(f"{label:<14} first response {median(first) * 1000:>8.1f} ms   "
+                  f"first 200 {median(ok) * 1000:>8.1f} ms   {args.runs - len(ok)} failed")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
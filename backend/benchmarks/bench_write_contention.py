@@ -0,0 +1,122 @@
+"""Benchmark: concurrent analysis writes from several worker processes.
+
+Simulates N gunicorn workers each storing analyses (domain lookup, then an
+insert of an SEOResult with a few KB of GPT output and a commit) against
+
+* SQLite with the old defaults (rollback journal, 5 s driver timeout),
+* SQLite as configured by src/models/storage.py (WAL, synchronous=NORMAL,
+  busy timeout),
+* PostgreSQL, if --postgres-url is given (pooled, pre-ping).
+
+Reports throughput, latency percentiles and failed writes per setup.
+
+Usage:
+    cd backend && python benchmarks/bench_write_contention.py --workers 8 --writes 200
+    cd backend && python benchmarks/bench_write_contention.py --postgres-url postgresql://...
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import text
+from src.models.user import db, User, SEOResult
+from src.models.image import GeneratedImage  # noqa: F401 (registers table)
+from src.models.migrations import run_migrations
+from src.models.storage import init_database
+
+RAW_RESPONSE = 'Kurzbeschreibung (max. 150 Zeichen)\n' + 'Wir sind ... ' * 300
+
+
+def make_app(mode, url):
+    app = Flask(__name__)
+    if mode == 'sqlite-default':
+        app.config['SQLALCHEMY_DATABASE_URI'] = url
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+    else:
+        init_database(app, url)
+    return app
+
+
+def worker(mode, url, worker_id, writes, results):
+    app = make_app(mode, url)
+    latencies = []
+    errors = 0
+    with app.app_context():
+        for i in range(writes):
+            domain = f'w{worker_id}-{i}.example.de'
+            t0 = time.perf_counter()
+            try:
+                SEOResult.query.filter_by(domain=domain).first()
+                db.session.add(SEOResult(domain=domain, short_description='Kurz',
+                                         raw_response=RAW_RESPONSE, user_id=1))
+                db.session.commit()
+                latencies.append(time.perf_counter() - t0)
+            except Exception:
+                db.session.rollback()
+                errors += 1
+    results.put((latencies, errors))
+
+
+def prepare(mode, url):
+    app = make_app(mode, url)
+    with app.app_context():
+        db.drop_all()
+        with db.engine.begin() as conn:
+            conn.execute(text('DROP TABLE IF EXISTS schema_migrations'))
+            conn.execute(text('DROP TABLE IF EXISTS seo_result_fts'))
+        db.create_all()
+        run_migrations(db.engine)
+        user = User(username='bench', email='bench@example.com', role='user')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+        db.engine.dispose()
+
+
+def run(mode, url, workers, writes):
+    prepare(mode, url)
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker, args=(mode, url, n, writes, results))
+             for n in range(workers)]
+    t0 = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    collected = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - t0
+
+    latencies = sorted(lat for lats, _ in collected for lat in lats)
+    errors = sum(err for _, err in collected)
+
+    def pct(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0
+
+    print(f"  {mode:15s} {len(latencies) / elapsed:8.1f} writes/s   "
+          f"p50 {pct(0.5):7.1f} ms   p99 {pct(0.99):8.1f} ms   failed {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200, help='writes per worker')
+    parser.add_argument('--postgres-url', help='PostgreSQL URL (database is wiped)')
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers x {args.writes} analyses")
+    with tempfile.TemporaryDirectory() as tmp:
+        run('sqlite-default', f"sqlite:///{os.path.join(tmp, 'default.db')}", args.workers, args.writes)
+        run('sqlite-tuned', f"sqlite:///{os.path.join(tmp, 'tuned.db')}", args.workers, args.writes)
+    if args.postgres_url:
+        run('postgresql', args.postgres_url, args.workers, args.writes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""ASGI application for the ``asgi`` worker model of ``src/serve.py``.
+
+The two expensive endpoints are almost entirely network wait time, so they
+have async handlers: ``POST /api/seo/analyze`` (crawl with httpx, GPT call
+with ``openai.AsyncOpenAI``) and ``POST /api/images/generate`` (variants
+as coroutines). One process keeps hundreds of them in flight without a
+thread each; blocking work (database, parsing, image files) runs on a
+small thread pool.
+
+Everything else is the Flask app behind ``PooledWsgiToAsgi``, on the same
+pool.
+
+Responses of the async handlers go through the Flask ``after_request``
+chain (CORS, compression, session) on the pool; metrics, the access log
+and RSS tracking are recorded as for WSGI requests. They are not profiled
+(``src/services/profiling.py`` profiles Flask views only).
+"""
+import io
+import sys
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from src.services import access_log, async_runtime, metrics
+from src.services.image_jobs import async_image_jobs
+from src.routes.seo import analyze_domain_async
+from src.routes.image_generator import generate_image_async
+
+logger = logging.getLogger(__name__)
+
+
+def async_routes():
+    """(method, path) -> async handler"""
+    return {
+        ('POST', '/api/seo/analyze'): analyze_domain_async,
+        ('POST', '/api/images/generate'): generate_image_async,
+    }
+
+
+def wsgi_environ(scope, body, duplicate_header_limit=100):
+    """WSGI environ of an ASGI http ``scope``; raises ValueError for too many duplicate headers"""
+    script_name = scope.get('root_path', '').encode('utf8').decode('latin1')
+    path_info = scope['path'].encode('utf8').decode('latin1')
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client') is not None:
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    headers = defaultdict(list)
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1')
+        if name in ('content-length', 'content-type'):
+            key = name.upper().replace('-', '_')
+        else:
+            key = f"HTTP_{name.upper().replace('-', '_')}"
+        if duplicate_header_limit and len(headers[key]) >= duplicate_header_limit:
+            raise ValueError(f'Too many duplicate headers: {key}')
+        headers[key].append(value.decode('latin1'))
+    environ.update((key, ','.join(values)) for key, values in headers.items())
+    return environ
+
+
+class PooledWsgiToAsgi:
+    """WSGI-to-ASGI adapter running each request on ``executor``.
+
+    Same behaviour as asgiref's ``WsgiToAsgi``, which runs every request on
+    one shared thread (serializing blocking requests) and has no public way
+    to change that. Response chunks are sent as the application yields them.
+    """
+
+    def __init__(self, wsgi_application, executor, duplicate_header_limit=100):
+        self.wsgi_application = wsgi_application
+        self.executor = executor
+        self.duplicate_header_limit = duplicate_header_limit
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            raise ValueError('WSGI adapter received a non-HTTP scope')
+        loop = asyncio.get_running_loop()
+
+        def sync_send(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            await loop.run_in_executor(self.executor, self._run, scope, body, sync_send)
+
+    def _run(self, scope, body, sync_send):
+        try:
+            environ = wsgi_environ(scope, body, self.duplicate_header_limit)
+        except ValueError:
+            sync_send({'type': 'http.response.start', 'status': 400,
+                       'headers': [(b'content-type', b'text/plain')]})
+            sync_send({'type': 'http.response.body', 'body': b'Bad Request: Too many duplicate headers'})
+            return
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if response.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            if 'start' in response and exc_info is None:
+                raise ValueError('start_response called a second time without exc_info')
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('ascii'), value.encode('ascii')) for name, value in headers],
+            }
+            response['length'] = next((int(value) for name, value in headers
+                                       if name.lower() == 'content-length'), None)
+
+        output = self.wsgi_application(environ, start_response)
+        try:
+            sent = 0
+            for chunk in output:
+                if not response.get('started'):
+                    response['started'] = True
+                    sync_send(response['start'])
+                length = response['length']
+                if length is not None:
+                    # Never more than the announced Content-Length
+                    chunk = chunk[:length - sent]
+                sync_send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                sent += len(chunk)
+                if sent == length:
+                    break
+            if not response.get('started'):
+                response['started'] = True
+                sync_send(response['start'])
+            sync_send({'type': 'http.response.body'})
+        finally:
+            # WSGI requires it (streams release their slots, Flask tears down the request)
+            if hasattr(output, 'close'):
+                output.close()
+
+
+class AsgiApp:
+    def __init__(self, app, threads):
+        self.wsgi_application = app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='wsgi')
+        self.wsgi = PooledWsgiToAsgi(app, self.executor)
+        self.routes = async_routes()
+        async_runtime.configure(app, self.executor)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        async_image_jobs.bind(asyncio.get_running_loop())
+        handler = self.routes.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+        if handler is None:
+            await self.wsgi(scope, receive, send)
+            return
+        await self._handle(handler, scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                async_image_jobs.bind(asyncio.get_running_loop())
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_runtime.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _handle(self, handler, scope, receive, send):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        request = async_runtime.AsyncRequest(self.wsgi_application, scope, b''.join(chunks))
+
+        started = time.perf_counter()
+        metrics.http_in_flight.inc()
+        extra_headers = {}
+        try:
+            result = await handler(request)
+            payload, status = result[:2]
+            if len(result) > 2:
+                extra_headers = result[2]
+        except Exception as e:
+            logger.exception(f"Error in {handler.__name__}: {str(e)}")
+            payload, status = {'error': f'Internal server error: {str(e)}'}, 500
+        finally:
+            metrics.http_in_flight.dec()
+
+        status, headers, body = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._response, scope, request, payload, status, extra_headers
+        )
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+        client = scope.get('client')
+        access_log.record_request(
+            scope['method'], scope['path'], scope['path'], status, time.perf_counter() - started,
+            len(body), request.headers.get('x-forwarded-for', client[0] if client else None),
+            request.principal.id if request.principal else None
+        )
+
+    def _response(self, scope, request, payload, status, extra_headers):
+        """(status, headers, body) of a handler result, after the Flask ``after_request`` chain"""
+        app = self.wsgi_application
+        # Duplicate headers were accepted when the request came in
+        environ = wsgi_environ(scope, io.BytesIO(request.body), duplicate_header_limit=0)
+        with app.request_context(environ):
+            response = app.response_class(f"{app.json.dumps(payload)}\n", status=status,
+                                          mimetype='application/json')
+            response.headers.update(extra_headers)
+            response = app.process_response(response)
+            body = response.get_data()
+            headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                       for name, value in response.headers.items()]
+            return response.status_code, headers, body
+
+
+def create_asgi_app(app, threads):
+    """ASGI application around the Flask ``app``"""
+    return AsgiApp(app, threads)
@@ -1,103 +1,124 @@
 import os
 import sys
 import logging
-import urllib3
-from flask import Flask, send_from_directory, jsonify, request
+import warnings
+from flask import Flask
 
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask_cors import CORS
 from src.models.user import db
+from src.models.storage import init_database, init_schema
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.seo import seo_bp
 from src.routes.image_generator import image_bp
+from src.routes.diagnostics import diagnostics_bp
+from src.routes.changes import changes_bp
+from src.services.upload_serving import send_upload
+from src.services import access_log, compression, profiling
 
-# SSL-Warnungen unterdrücken
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# SSL-Warnungen unterdrücken (urllib3's InsecureRequestWarning, ohne urllib3 beim Start zu importieren)
+warnings.filterwarnings('ignore', message='Unverified HTTPS request')
 
 # Logging konfigurieren
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
     format='%(asctime)s - %(levelname)s - %(message)s',
     stream=sys.stdout
 )
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-
-# Configuration
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
-
-# Enable CORS for all routes with credentials support
-CORS(app, origins="*", supports_credentials=True)
-
-# Flask-Request-Logging aktivieren
-@app.before_request
-def log_request_info():
-    app.logger.info(f'{request.method} {request.url} - {request.remote_addr}')
-
-@app.after_request
-def log_response_info(response):
-    app.logger.info(f'{request.method} {request.url} - {response.status_code}')
-    return response
-
-# Register blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(seo_bp, url_prefix='/api/seo')
-app.register_blueprint(image_bp, url_prefix='/api/images')
-
-# Database configuration
-# Create database directory if it doesn't exist
-db_dir = os.path.join(os.path.dirname(__file__), 'database')
-os.makedirs(db_dir, exist_ok=True)
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(db_dir, 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-with app.app_context():
-    # Import models to ensure tables are created
-    from src.models.user import User
-    from src.models.image import GeneratedImage
-    
-    db.create_all()
-    
-    # Create default admin user if it doesn't exist
-    admin_user = User.query.filter_by(username='admin').first()
-    if not admin_user:
-        admin_user = User(username='admin', email='admin@example.com', role='admin')
-        admin_user.set_password('admin123')
-        db.session.add(admin_user)
-        db.session.commit()
-        print("Default admin user created: admin/admin123")
-
-@app.route('/static/uploads/<filename>')
-def serve_uploaded_file(filename):
-    """Serve uploaded images"""
-    uploads_dir = os.path.join(os.getcwd(), 'static', 'uploads')
-    return send_from_directory(uploads_dir, filename)
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve_react_app(path):
-    """Serve React app for all routes"""
-    static_folder_path = app.static_folder
-    
-    if static_folder_path is None:
-        return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
+def create_app(start_services=True, setup_schema=True):
+    """Build the Flask application.
+
+    ``start_services=False`` skips the background threads (autocomplete
+    index, upload GC); a preloading server starts them in each worker after
+    forking via ``start_background_services``. ``setup_schema=False`` skips
+    table creation and migrations when the server already ran them once.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+
+    # Configuration
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+
+    # Enable CORS for all routes with credentials support
+    CORS(app, origins="*", supports_credentials=True)
+
+    # JSON access log and Prometheus metrics (/metrics)
+    access_log.init_app(app)
+
+    # Per-request profiling for admins (X-Profile header) and sampled requests
+    profiling.init_app(app)
+
+    # gzip/Brotli for larger JSON responses
+    compression.init_app(app)
+
+    # Register blueprints
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(seo_bp, url_prefix='/api/seo')
+    app.register_blueprint(image_bp, url_prefix='/api/images')
+    app.register_blueprint(diagnostics_bp, url_prefix='/api/diagnostics')
+    app.register_blueprint(changes_bp, url_prefix='/api/changes')
+
+    # Database configuration (DATABASE_URL or the SQLite file in src/database)
+    init_database(app)
+
+    if setup_schema:
+        with app.app_context():
+            init_schema()
+        # Images written to static/uploads of the working directory by earlier versions
+        from src.services import image_store
+        image_store.adopt_legacy_uploads()
+
+    # Worker threads for background image generation jobs (started on first job)
+    from src.services.image_jobs import image_jobs
+    image_jobs.init_app(app)
+
+    if start_services:
+        start_background_services(app)
+
+    @app.route('/static/uploads/<path:filename>')
+    def serve_uploaded_file(filename):
+        """Serve uploaded images (immutable, ETag/304, ranges, optional proxy offload)"""
+        return send_upload(filename)
+
+    # React bundle, held in memory with precompressed variants
+    from src.services.static_manifest import static_manifest
+    static_manifest.init_app(app)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve_react_app(path):
+        """Serve React app for all routes"""
+        if app.static_folder is None:
+            return "Static folder not configured", 404
+
+        entry = static_manifest.lookup(path)
+        if entry is None:
             return "index.html not found", 404
+        return static_manifest.response(entry)
+
+    return app
+
+
+def start_background_services(app):
+    """Start the per-process background threads (call once per worker)"""
+    # Build the autocomplete index in the background
+    from src.services.domain_index import domain_index
+    domain_index.init_app(app)
+
+    # Periodic removal of orphaned uploads and quota enforcement
+    from src.services.upload_gc import upload_collector
+    upload_collector.init_app(app)
+
+    # Deferred imports, parser regexes and the first DB connection, off the first request
+    from src.services import warmup
+    warmup.init_app(app)
 
 
 if __name__ == '__main__':
+    # Development server; production: python src/serve.py
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
-
+    create_app().run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,42 @@
+from datetime import datetime
+from .user import db
+
+
+class AnalysisStats(db.Model):
+    """Timing and size figures of one analysis run (see services/analysis_timing.py)"""
+    __tablename__ = 'analysis_stats'
+    __table_args__ = (
+        # Percentiles over a time window
+        db.Index('ix_analysis_stats_created', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign keys: stats outlive deleted results and users
+    seo_result_id = db.Column(db.Integer, nullable=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    domain = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # ok, crawl_failed, failed
+    bytes_fetched = db.Column(db.Integer, nullable=True)
+    prompt_tokens = db.Column(db.Integer, nullable=True)
+    completion_tokens = db.Column(db.Integer, nullable=True)
+    total_ms = db.Column(db.Float, nullable=False)
+    stages = db.Column(db.JSON, nullable=False)  # {stage: milliseconds}
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'seo_result_id': self.seo_result_id,
+            'user_id': self.user_id,
+            'domain': self.domain,
+            'status': self.status,
+            'bytes_fetched': self.bytes_fetched,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_ms': self.total_ms,
+            'stages': self.stages,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<AnalysisStats {self.domain}: {self.status} {self.total_ms:.0f} ms>'
@@ -0,0 +1,28 @@
+from datetime import datetime
+from .user import db
+
+
+class ChangeEvent(db.Model):
+    """Insert/delete of a row, for the change feed (see services/change_feed.py)"""
+    __tablename__ = 'change_events'
+    __table_args__ = (
+        # Pruning by age
+        db.Index('ix_change_events_created', 'created_at'),
+        # Cursors, and the events still waiting for one (NULL)
+        db.Index('ix_change_events_seq', 'seq', unique=True),
+        # Ids order the events waiting for a position: never reuse them (SQLite)
+        {'sqlite_autoincrement': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Feed position, assigned after commit in commit order (see change_feed.sequence)
+    seq = db.Column(db.Integer, nullable=True)
+    entity = db.Column(db.String(20), nullable=False)  # seo_result, image
+    op = db.Column(db.String(10), nullable=False)  # insert, delete, reset
+    # No foreign keys: events outlive their rows; None for reset
+    entity_id = db.Column(db.Integer, nullable=True)
+    user_id = db.Column(db.Integer, nullable=True)  # Owner of the row
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ChangeEvent {self.id}: {self.op} {self.entity} {self.entity_id}>'
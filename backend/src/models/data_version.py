@@ -0,0 +1,15 @@
+from datetime import datetime
+from .user import db
+
+
+class DataVersion(db.Model):
+    """Change counter of a slice of the data (see services/data_versions.py)"""
+    __tablename__ = 'data_versions'
+
+    # "<entity>:user:<id>" or "<entity>:bulk" ("<entity>:all" is derived)
+    scope = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DataVersion {self.scope}: {self.version}>'
@@ -0,0 +1,81 @@
+"""Storage formats for SEOResult columns.
+
+* ``raw_response`` (the full GPT output) is stored zlib-compressed.
+* ``keywords`` is stored as a JSON list of keywords.
+* ``company_info`` (Impressum) is stored as a JSON object of label -> value.
+
+The API keeps returning the display strings (``keywords_text``,
+``company_info_text``) the frontend shows, next to the structured values.
+"""
+import re
+import zlib
+
+COMPRESSION_LEVEL = 6
+
+_bullet_re = re.compile(r'^\s*[–\-•*]\s*')
+_keyword_split_re = re.compile(r'[,\n;]')
+
+
+def compress_text(value):
+    if value is None:
+        return None
+    return zlib.compress(value.encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def decompress_text(data):
+    if data is None:
+        return None
+    return zlib.decompress(data).decode('utf-8')
+
+
+def parse_keywords(text):
+    """Split the GPT keyword section ("– Keyword 1, Keyword 2, …") into a list"""
+    if not text:
+        return []
+    keywords = []
+    for part in _keyword_split_re.split(text):
+        keyword = _bullet_re.sub('', part).strip(' .…')
+        if keyword and keyword not in keywords:
+            keywords.append(keyword)
+    return keywords
+
+
+def keywords_text(keywords):
+    if not keywords:
+        return ''
+    if isinstance(keywords, str):
+        return keywords
+    return ', '.join(keywords)
+
+
+def parse_company_info(text):
+    """Turn the Impressum section ("Unternehmen: …" lines) into a dict.
+
+    Lines without a label continue the previous value.
+    """
+    if not text:
+        return {}
+    info = {}
+    last_key = None
+    for line in text.splitlines():
+        line = _bullet_re.sub('', line).strip()
+        if not line:
+            continue
+        label, sep, value = line.partition(':')
+        if sep and label.strip() and len(label) <= 40:
+            last_key = label.strip()
+            info[last_key] = value.strip()
+        elif last_key is not None:
+            info[last_key] = f"{info[last_key]}\n{line}".strip()
+        else:
+            last_key = 'Unternehmen'
+            info[last_key] = line
+    return info
+
+
+def company_info_text(info):
+    if not info:
+        return ''
+    if isinstance(info, str):
+        return info
+    return '\n'.join(f"{label}: {value}" for label, value in info.items())
@@ -1,3 +1,4 @@
+import hashlib
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from .user import db
@@ -5,6 +6,14 @@ from .user import db
 class GeneratedImage(db.Model):
     """Model for storing generated images"""
     __tablename__ = 'generated_images'
+    __table_args__ = (
+        # /images/history: filter by user, newest first
+        db.Index('ix_generated_images_user_created', 'user_id', 'created_at'),
+        db.Index('ix_generated_images_job', 'job_id'),
+        # Reference counting of stored files / prompt cache
+        db.Index('ix_generated_images_content_hash', 'content_hash'),
+        db.Index('ix_generated_images_prompt_hash', 'prompt_hash'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # Korrigiert: 'user.id' statt 'users.id'
@@ -14,10 +23,54 @@ class GeneratedImage(db.Model):
     prompt_used = db.Column(db.Text, nullable=True)  # Der vollständige Prompt der verwendet wurde
     image_size = db.Column(db.String(20), nullable=True)  # z.B. "1792x1024"
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    job_id = db.Column(db.String(32), nullable=True)  # ImageJob, falls asynchron erzeugt
+    content_hash = db.Column(db.String(64), nullable=True)  # SHA-256 der Bilddatei im Store
+    prompt_hash = db.Column(db.String(64), nullable=True)  # SHA-256 von Prompt und Größe
+    image_bytes = db.Column(db.Integer, nullable=True)  # Größe des Originals
+    webp_url = db.Column(db.String(500), nullable=True)  # Komprimierte Vollversion
+    webp_bytes = db.Column(db.Integer, nullable=True)
+    avif_url = db.Column(db.String(500), nullable=True)  # Optional, falls AVIF aktiviert
+    avif_bytes = db.Column(db.Integer, nullable=True)
+    thumbnail_url = db.Column(db.String(500), nullable=True)  # Vorschaubild für den Verlauf
+    thumbnail_bytes = db.Column(db.Integer, nullable=True)
     
     # Relationship to user
     user = db.relationship('User', backref=db.backref('generated_images', lazy=True))
     
+    DERIVATIVE_FIELDS = ('image_bytes', 'webp_url', 'webp_bytes', 'avif_url', 'avif_bytes',
+                         'thumbnail_url', 'thumbnail_bytes')
+    
+    @staticmethod
+    def prompt_hash_for(prompt, size):
+        """Key of the prompt cache: identical built prompt and size"""
+        return hashlib.sha256(f"{size}\n{prompt}".encode('utf-8')).hexdigest()
+    
+    def derivative_fields(self):
+        """Derivative URLs/sizes, to copy onto a row sharing the same file"""
+        return {name: getattr(self, name) for name in self.DERIVATIVE_FIELDS}
+    
+    @classmethod
+    def projection_columns(cls):
+        """Columns selectable via ?fields="""
+        return {
+            'id': cls.id,
+            'user_id': cls.user_id,
+            'user_input': cls.user_input,
+            'image_type': cls.image_type,
+            'image_url': cls.image_url,
+            'prompt_used': cls.prompt_used,
+            'image_size': cls.image_size,
+            'created_at': cls.created_at,
+            'job_id': cls.job_id,
+            'image_bytes': cls.image_bytes,
+            'webp_url': cls.webp_url,
+            'webp_bytes': cls.webp_bytes,
+            'avif_url': cls.avif_url,
+            'avif_bytes': cls.avif_bytes,
+            'thumbnail_url': cls.thumbnail_url,
+            'thumbnail_bytes': cls.thumbnail_bytes,
+        }
+
     def to_dict(self):
         """Convert image to dictionary for JSON response"""
         return {
@@ -28,9 +81,63 @@ class GeneratedImage(db.Model):
             'image_url': self.image_url,
             'prompt_used': self.prompt_used,
             'image_size': self.image_size,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'job_id': self.job_id,
+            'image_bytes': self.image_bytes,
+            'webp_url': self.webp_url,
+            'webp_bytes': self.webp_bytes,
+            'avif_url': self.avif_url,
+            'avif_bytes': self.avif_bytes,
+            'thumbnail_url': self.thumbnail_url,
+            'thumbnail_bytes': self.thumbnail_bytes
         }
     
     def __repr__(self):
         return f'<GeneratedImage {self.id}: {self.image_type} for user {self.user_id}>'
 
+
+
+
+class ImageJob(db.Model):
+    """Background image generation request producing one or more variants"""
+    __tablename__ = 'image_jobs'
+    __table_args__ = (
+        # Active-job limit per user
+        db.Index('ix_image_jobs_user_status', 'user_id', 'status'),
+    )
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_input = db.Column(db.Text, nullable=False)
+    image_type = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    variants = db.Column(db.Integer, nullable=False, default=1)  # Anzahl angeforderter Bilder
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+    
+    def to_dict(self, images=None):
+        """Convert job to dictionary; ``images`` are the variants finished so far"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'user_input': self.user_input,
+            'image_type': self.image_type,
+            'status': self.status,
+            'variants': self.variants,
+            'completed': self.completed,
+            'failed': self.failed,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'images': [image.to_dict() for image in images or []]
+        }
+    
+    def __repr__(self):
+        return f'<ImageJob {self.id}: {self.status} {self.completed}/{self.variants}>'
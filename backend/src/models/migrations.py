@@ -0,0 +1,346 @@
+"""Lightweight schema migrations.
+
+``db.create_all()`` only creates missing tables; it never alters tables that
+already exist. Changes to existing tables (new indexes, columns, data fixes)
+are registered here as numbered migrations and applied once per database.
+Applied versions are recorded in the ``schema_migrations`` table.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register a migration function under a unique, increasing version"""
+    def decorator(func):
+        if any(m[0] == version for m in MIGRATIONS):
+            raise ValueError(f'Duplicate migration version: {version}')
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def _ensure_migrations_table(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version INTEGER PRIMARY KEY, '
+        'name VARCHAR(255) NOT NULL, '
+        'applied_at TIMESTAMP NOT NULL)'
+    ))
+
+
+def applied_versions(conn):
+    """Return the set of migration versions already applied"""
+    _ensure_migrations_table(conn)
+    rows = conn.execute(text('SELECT version FROM schema_migrations')).fetchall()
+    return {row[0] for row in rows}
+
+
+def run_migrations(engine):
+    """Apply all pending migrations, each in its own transaction.
+
+    Returns the list of applied (version, name) tuples.
+    """
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+
+    applied = []
+    for version, name, func in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            func(conn)
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, name, applied_at) '
+                     'VALUES (:version, :name, :applied_at)'),
+                {'version': version, 'name': name, 'applied_at': datetime.utcnow()}
+            )
+        logger.info(f"Applied migration {version}: {name}")
+        applied.append((version, name))
+    return applied
+
+
+@migration(1, 'seo_result_and_image_indexes')
+def add_lookup_indexes(conn):
+    """Normalize stored domains and add lookup/listing indexes"""
+    # Domains are stored lower-cased by normalize_domain(); make sure older
+    # rows follow the same format before enforcing uniqueness.
+    conn.execute(text(
+        'UPDATE seo_result SET domain = lower(trim(domain)) '
+        'WHERE domain != lower(trim(domain))'
+    ))
+    # The unique index needs one profile per domain; which duplicate to keep
+    # is for an admin to decide, so stop here instead of deleting any
+    duplicates = conn.execute(text(
+        'SELECT domain, COUNT(*) FROM seo_result GROUP BY domain '
+        'HAVING COUNT(*) > 1 ORDER BY domain'
+    )).fetchall()
+    if duplicates:
+        listed = ', '.join(f'{domain} ({count})' for domain, count in duplicates[:20])
+        more = f' and {len(duplicates) - 20} more' if len(duplicates) > 20 else ''
+        raise RuntimeError(
+            f'Migration 1: {len(duplicates)} domains have more than one SEO result: '
+            f'{listed}{more}. Delete the surplus rows, then restart.'
+        )
+    conn.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_seo_result_domain '
+        'ON seo_result (domain)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_seo_result_user_created '
+        'ON seo_result (user_id, created_at)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_seo_result_created '
+        'ON seo_result (created_at)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_generated_images_user_created '
+        'ON generated_images (user_id, created_at)'
+    ))
+
+
+@migration(2, 'seo_result_fulltext_search')
+def add_fulltext_search(conn):
+    """Create the FTS5 index over SEO profiles and its sync triggers"""
+    if conn.dialect.name != 'sqlite':
+        # Full-text search falls back to a domain substring match elsewhere
+        return
+    fields = ('domain', 'short_description', 'long_description', 'keywords', 'company_info')
+    columns = ', '.join(fields)
+    new_values = ', '.join(f'new.{c}' for c in fields)
+    old_values = ', '.join(f'old.{c}' for c in fields)
+
+    conn.execute(text(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS seo_result_fts USING fts5('
+        f"{columns}, content='seo_result', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+    ))
+    conn.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS seo_result_fts_insert AFTER INSERT ON seo_result BEGIN '
+        f'INSERT INTO seo_result_fts (rowid, {columns}) VALUES (new.id, {new_values}); END'
+    ))
+    conn.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS seo_result_fts_delete AFTER DELETE ON seo_result BEGIN '
+        f"INSERT INTO seo_result_fts (seo_result_fts, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values}); END"
+    ))
+    conn.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS seo_result_fts_update AFTER UPDATE ON seo_result BEGIN '
+        f"INSERT INTO seo_result_fts (seo_result_fts, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values}); "
+        f'INSERT INTO seo_result_fts (rowid, {columns}) VALUES (new.id, {new_values}); END'
+    ))
+    # Index rows that existed before the table was created
+    conn.execute(text("INSERT INTO seo_result_fts (seo_result_fts) VALUES ('rebuild')"))
+
+
+def _searchable_values(prefix):
+    """SQL expressions for the FTS columns of a seo_result row.
+
+    keywords/company_info are JSON; index their display text instead. FTS5
+    cannot call json_each() from its content queries, so the JSON written
+    by json.dumps (", " and ": " separators) is unwrapped with replace().
+    """
+    keywords = f'{prefix}keywords'
+    company_info = f'{prefix}company_info'
+    keywords_text = (
+        f"""CASE WHEN {keywords} LIKE '["%"]' """
+        f"""THEN replace(substr({keywords}, 3, length({keywords}) - 4), '", "', ', ') """
+        f"""WHEN {keywords} = '[]' THEN NULL ELSE {keywords} END"""
+    )
+    company_info_text = (
+        f"""CASE WHEN {company_info} LIKE '{{"%"}}' """
+        f"""THEN replace(replace(replace(substr({company_info}, 3, length({company_info}) - 4), """
+        f"""'", "', char(10)), '": "', ': '), '\\n', char(10)) """
+        f"""WHEN {company_info} = '{{}}' THEN NULL ELSE {company_info} END"""
+    )
+    return (f'{prefix}domain', f'{prefix}short_description', f'{prefix}long_description',
+            keywords_text, company_info_text)
+
+
+@migration(3, 'compressed_raw_response_and_json_fields')
+def compress_raw_response(conn):
+    """Compress raw_response and store keywords/company_info as JSON"""
+    import json
+    from sqlalchemy import inspect
+    from .fields import compress_text, parse_keywords, parse_company_info
+
+    sqlite = conn.dialect.name == 'sqlite'
+    fts_columns = 'domain, short_description, long_description, keywords, company_info'
+
+    if sqlite:
+        # Stop the old triggers from re-indexing every converted row
+        for trigger in ('seo_result_fts_insert', 'seo_result_fts_delete', 'seo_result_fts_update'):
+            conn.execute(text(f'DROP TRIGGER IF EXISTS {trigger}'))
+
+    columns = {c['name'] for c in inspect(conn).get_columns('seo_result')}
+    if 'raw_response_z' not in columns:
+        blob = 'BLOB' if sqlite else 'BYTEA'
+        conn.execute(text(f'ALTER TABLE seo_result ADD COLUMN raw_response_z {blob}'))
+
+    def to_json(value, parse):
+        if value is None:
+            return None
+        if not isinstance(value, (str, bytes)):
+            # JSON column already decoded by the driver (psycopg2 on PostgreSQL)
+            return json.dumps(value, ensure_ascii=False)
+        try:
+            json.loads(value)
+            return value  # already converted
+        except (TypeError, ValueError):
+            return json.dumps(parse(value), ensure_ascii=False)
+
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, raw_response, keywords, company_info FROM seo_result '
+            'WHERE id > :last_id ORDER BY id LIMIT 500'
+        ), {'last_id': last_id}).fetchall()
+        if not rows:
+            break
+        for row_id, raw_response, keywords, company_info in rows:
+            params = {
+                'id': row_id,
+                'keywords': to_json(keywords, parse_keywords),
+                'company_info': to_json(company_info, parse_company_info),
+            }
+            if raw_response is not None:
+                conn.execute(text(
+                    'UPDATE seo_result SET raw_response_z = :raw_response_z, raw_response = NULL, '
+                    'keywords = :keywords, company_info = :company_info WHERE id = :id'
+                ), dict(params, raw_response_z=compress_text(raw_response)))
+            else:
+                conn.execute(text(
+                    'UPDATE seo_result SET keywords = :keywords, company_info = :company_info '
+                    'WHERE id = :id'
+                ), params)
+        last_id = rows[-1][0]
+
+    if not sqlite:
+        for column in ('keywords', 'company_info'):
+            conn.execute(text(
+                f'ALTER TABLE seo_result ALTER COLUMN {column} TYPE JSON USING {column}::json'
+            ))
+        return
+
+    # Re-create the FTS index on a view that flattens the JSON columns, so
+    # snippets show "Brot, Kuchen" instead of '["Brot", "Kuchen"]'.
+    conn.execute(text('DROP TABLE IF EXISTS seo_result_fts'))
+    conn.execute(text('DROP VIEW IF EXISTS seo_result_search'))
+    conn.execute(text(
+        'CREATE VIEW seo_result_search AS SELECT id, '
+        + ', '.join(f'{expr} AS {name}' for expr, name in
+                    zip(_searchable_values('seo_result.'), fts_columns.split(', ')))
+        + ' FROM seo_result'
+    ))
+    conn.execute(text(
+        f'CREATE VIRTUAL TABLE seo_result_fts USING fts5('
+        f"{fts_columns}, content='seo_result_search', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+    ))
+    new_values = ', '.join(_searchable_values('new.'))
+    old_values = ', '.join(_searchable_values('old.'))
+    conn.execute(text(
+        f'CREATE TRIGGER seo_result_fts_insert AFTER INSERT ON seo_result BEGIN '
+        f'INSERT INTO seo_result_fts (rowid, {fts_columns}) VALUES (new.id, {new_values}); END'
+    ))
+    conn.execute(text(
+        f'CREATE TRIGGER seo_result_fts_delete AFTER DELETE ON seo_result BEGIN '
+        f"INSERT INTO seo_result_fts (seo_result_fts, rowid, {fts_columns}) "
+        f"VALUES ('delete', old.id, {old_values}); END"
+    ))
+    conn.execute(text(
+        f'CREATE TRIGGER seo_result_fts_update AFTER UPDATE OF {fts_columns} ON seo_result BEGIN '
+        f"INSERT INTO seo_result_fts (seo_result_fts, rowid, {fts_columns}) "
+        f"VALUES ('delete', old.id, {old_values}); "
+        f'INSERT INTO seo_result_fts (rowid, {fts_columns}) VALUES (new.id, {new_values}); END'
+    ))
+    conn.execute(text("INSERT INTO seo_result_fts (seo_result_fts) VALUES ('rebuild')"))
+
+
+@migration(4, 'generated_image_job_id')
+def add_generated_image_job_id(conn):
+    """Link images to the background job that produced them"""
+    from sqlalchemy import inspect
+
+    columns = {c['name'] for c in inspect(conn).get_columns('generated_images')}
+    if 'job_id' not in columns:
+        conn.execute(text('ALTER TABLE generated_images ADD COLUMN job_id VARCHAR(32)'))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_generated_images_job ON generated_images (job_id)'
+    ))
+
+
+@migration(5, 'generated_image_derivatives')
+def add_generated_image_derivatives(conn):
+    """URLs and byte sizes of WebP/AVIF versions and thumbnails"""
+    from sqlalchemy import inspect
+
+    columns = {c['name'] for c in inspect(conn).get_columns('generated_images')}
+    new_columns = [
+        ('image_bytes', 'INTEGER'),
+        ('webp_url', 'VARCHAR(500)'),
+        ('webp_bytes', 'INTEGER'),
+        ('avif_url', 'VARCHAR(500)'),
+        ('avif_bytes', 'INTEGER'),
+        ('thumbnail_url', 'VARCHAR(500)'),
+        ('thumbnail_bytes', 'INTEGER'),
+    ]
+    for name, column_type in new_columns:
+        if name not in columns:
+            conn.execute(text(f'ALTER TABLE generated_images ADD COLUMN {name} {column_type}'))
+
+
+@migration(6, 'generated_image_content_store')
+def add_generated_image_hashes(conn):
+    """Content hash (stored file) and prompt hash (prompt cache) per image"""
+    import hashlib
+    from sqlalchemy import inspect
+
+    def prompt_hash(prompt, size):
+        # Frozen copy of GeneratedImage.prompt_hash_for at the time of this migration
+        return hashlib.sha256(f"{size}\n{prompt}".encode('utf-8')).hexdigest()
+
+    columns = {c['name'] for c in inspect(conn).get_columns('generated_images')}
+    for name in ('content_hash', 'prompt_hash'):
+        if name not in columns:
+            conn.execute(text(f'ALTER TABLE generated_images ADD COLUMN {name} VARCHAR(64)'))
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_generated_images_{name} ON generated_images ({name})'
+        ))
+
+    # Existing images keep their files; only the prompt cache key is filled in
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, prompt_used, image_size FROM generated_images '
+            'WHERE id > :last_id ORDER BY id LIMIT 500'
+        ), {'last_id': last_id}).fetchall()
+        if not rows:
+            break
+        for row_id, prompt, size in rows:
+            if prompt:
+                conn.execute(text('UPDATE generated_images SET prompt_hash = :hash WHERE id = :id'),
+                             {'hash': prompt_hash(prompt, size), 'id': row_id})
+        last_id = rows[-1][0]
+
+
+@migration(7, 'change_event_positions')
+def add_change_event_seq(conn):
+    """Feed positions of change events, assigned in commit order"""
+    from sqlalchemy import inspect
+
+    columns = {c['name'] for c in inspect(conn).get_columns('change_events')}
+    if 'seq' not in columns:
+        conn.execute(text('ALTER TABLE change_events ADD COLUMN seq INTEGER'))
+    # Cursors handed out so far were ids: existing events keep them as positions
+    conn.execute(text('UPDATE change_events SET seq = id WHERE seq IS NULL'))
+    conn.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_change_events_seq ON change_events (seq)'
+    ))
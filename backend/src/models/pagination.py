@@ -0,0 +1,84 @@
+"""Keyset (cursor) pagination for newest-first listings.
+
+Pages are keyed on ``(created_at, id)``: the next page starts strictly after
+the last row of the previous one, so fetching page 1000 costs the same as
+page 1 (no OFFSET scan, no COUNT per page). Cursors are opaque to clients.
+"""
+import base64
+import json
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import tuple_
+
+# How long approximate totals are reused before counting again
+APPROX_TOTAL_TTL = 60.0
+# Cached totals per worker; keys include free-text searches, so bounded (LRU)
+APPROX_TOTAL_MAX_ENTRIES = 1000
+
+_total_cache = OrderedDict()
+_total_lock = threading.Lock()
+
+
+def encode_cursor(created_at, row_id):
+    payload = json.dumps([created_at.isoformat() if created_at else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, id)`` for a cursor; raises ValueError if invalid"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def keyset_page(query, model, per_page, cursor=None):
+    """Fetch one newest-first page of ``query``.
+
+    ``query`` must not be ordered yet; its rows (model instances or projected
+    rows) need ``created_at`` and ``id`` attributes. Returns
+    ``(items, next_cursor)`` where next_cursor is None on the last page.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
+
+
+def count_total(query, mode, cache_key=None):
+    """Total row count for cursor pages.
+
+    ``mode`` is ``exact`` (COUNT on every call), ``approx`` (COUNT cached for
+    ``APPROX_TOTAL_TTL`` seconds per ``cache_key``) or anything else for no
+    total at all (None).
+    """
+    if mode == 'exact':
+        return query.order_by(None).count()
+    if mode != 'approx':
+        return None
+    now = time.monotonic()
+    with _total_lock:
+        cached = _total_cache.get(cache_key)
+        if cached and now - cached[1] < APPROX_TOTAL_TTL:
+            _total_cache.move_to_end(cache_key)
+            return cached[0]
+    total = query.order_by(None).count()
+    with _total_lock:
+        _total_cache[cache_key] = (total, now)
+        _total_cache.move_to_end(cache_key)
+        # Trim from the least recently used end: expired entries and any over the bound
+        while _total_cache:
+            key, (_, counted_at) = next(iter(_total_cache.items()))
+            if now - counted_at < APPROX_TOTAL_TTL and len(_total_cache) <= APPROX_TOTAL_MAX_ENTRIES:
+                break
+            del _total_cache[key]
+    return total
@@ -0,0 +1,49 @@
+"""Sparse field projection for list endpoints (``?fields=id,domain,...``).
+
+Only the requested columns are selected, so large text columns such as
+``raw_response`` are never read from the database for list views.
+"""
+from datetime import datetime
+
+
+def parse_fields(value, allowed):
+    """Parse a comma-separated ``fields`` parameter.
+
+    Returns None if no projection was requested, otherwise the list of field
+    names (``id`` is always included). Raises ValueError for unknown names.
+    """
+    if not value:
+        return None
+    names = []
+    for name in value.split(','):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    if 'id' not in names:
+        names.insert(0, 'id')
+    return names
+
+
+def project_query(query, columns, names):
+    """Restrict ``query`` to the columns for ``names``"""
+    return query.with_entities(*(columns[name].label(name) for name in names))
+
+
+def row_to_dict(row, names, decoders=None):
+    """Serialize a projected row the same way the models' to_dict() does.
+
+    ``decoders`` maps field names to conversions of the stored value.
+    """
+    decoders = decoders or {}
+    data = {}
+    for name in names:
+        value = getattr(row, name)
+        if name in decoders:
+            value = decoders[name](value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        data[name] = value
+    return data
@@ -0,0 +1,15 @@
+from .user import db
+
+
+class RateLimitBucket(db.Model):
+    """Token bucket shared by all worker processes (see services/admission.py)"""
+    __tablename__ = 'rate_limit_buckets'
+
+    # "<budget>:user:<id>" or "<budget>:global"
+    key = db.Column(db.String(100), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    # Epoch seconds of the last refill
+    updated_at = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key}: {self.tokens:.1f}>'
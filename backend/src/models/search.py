@@ -0,0 +1,136 @@
+"""Full-text search over stored SEO profiles.
+
+On SQLite the ``seo_result_fts`` FTS5 table (created by migration 2) mirrors
+the searchable columns of ``seo_result`` and is kept in sync by triggers.
+Other databases fall back to a plain domain substring match.
+"""
+import re
+import html
+from sqlalchemy import text
+from .user import db
+
+FTS_TABLE = 'seo_result_fts'
+
+# bm25() column weights, in FTS column order:
+# domain, short_description, long_description, keywords, company_info
+BM25_WEIGHTS = (10.0, 4.0, 1.0, 3.0, 2.0)
+
+# Above this many matches, results are ordered newest first instead of by bm25
+MAX_RANKED = 1000
+# Match counts are capped to keep COUNT(*) bounded for very common terms
+MAX_COUNT = 5000
+
+SNIPPET_OPEN = '<mark>'
+SNIPPET_CLOSE = '</mark>'
+# Match markers of snippet(): control characters, replaced after escaping the text
+_SNIPPET_START = '\x02'
+_SNIPPET_END = '\x03'
+
+_token_re = re.compile(r'\w+', re.UNICODE)
+_fts_available = {}
+
+
+def fts_available():
+    """Return True if the FTS table exists for the current engine"""
+    engine = db.engine
+    key = str(engine.url)
+    if key not in _fts_available:
+        if engine.dialect.name != 'sqlite':
+            _fts_available[key] = False
+        else:
+            with engine.connect() as conn:
+                row = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': FTS_TABLE}
+                ).first()
+            _fts_available[key] = row is not None
+    return _fts_available[key]
+
+
+def snippet_html(snippet):
+    """HTML of an FTS snippet: crawled text escaped, matches in ``<mark>``"""
+    if not snippet:
+        return ''
+    escaped = html.escape(snippet, quote=False)
+    return escaped.replace(_SNIPPET_START, SNIPPET_OPEN).replace(_SNIPPET_END, SNIPPET_CLOSE)
+
+
+def build_match_query(search):
+    """Turn free user input into a safe FTS5 MATCH expression.
+
+    Every word is quoted (so FTS operators in user input are inert); the
+    last word is used as a prefix since it is usually still being typed,
+    e.g. ``autohaus münch`` -> ``"autohaus" "münch"*``.
+    Returns None if the input contains no searchable words.
+    """
+    tokens = _token_re.findall(search.lower())
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_results(search, user_id=None, page=1, per_page=10):
+    """Ranked full-text search.
+
+    Returns ``(hits, total)`` where hits is a list of
+    ``(result_id, snippet, rank)`` tuples for the requested page.
+
+    bm25 ranking has to score every match, so very unselective searches
+    (more than ``MAX_RANKED`` matches) are returned newest first instead,
+    with ``rank`` set to None. ``total`` is counted up to ``MAX_COUNT``.
+    """
+    match = build_match_query(search)
+    if not match:
+        return [], 0
+
+    join = ''
+    user_filter = ''
+    if user_id is not None:
+        join = f'JOIN seo_result ON seo_result.id = {FTS_TABLE}.rowid'
+        user_filter = 'AND seo_result.user_id = :user_id'
+    params = {
+        'match': match,
+        'user_id': user_id,
+        'limit': per_page,
+        'offset': max(page - 1, 0) * per_page,
+        'max_count': MAX_COUNT,
+    }
+
+    total = db.session.execute(text(f"""
+        SELECT COUNT(*) FROM (
+            SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} {join}
+            WHERE {FTS_TABLE} MATCH :match {user_filter}
+            LIMIT :max_count
+        )
+    """), params).scalar() or 0
+
+    if total <= MAX_RANKED:
+        weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+        rank, order_by = f'bm25({FTS_TABLE}, {weights})', 'rank'
+    else:
+        rank, order_by = 'NULL', f'{FTS_TABLE}.rowid DESC'
+    page_rows = db.session.execute(text(f"""
+        SELECT {FTS_TABLE}.rowid, {rank} AS rank FROM {FTS_TABLE} {join}
+        WHERE {FTS_TABLE} MATCH :match {user_filter}
+        ORDER BY {order_by}
+        LIMIT :limit OFFSET :offset
+    """), params).fetchall()
+    if not page_rows:
+        return [], total
+
+    # Snippets are costly, so only build them for the rows on this page
+    ids = [row[0] for row in page_rows]
+    snippet_params = {'match': match}
+    snippet_params.update({f'id{i}': result_id for i, result_id in enumerate(ids)})
+    id_list = ', '.join(f':id{i}' for i in range(len(ids)))
+    snippet_params.update({'start': _SNIPPET_START, 'end': _SNIPPET_END})
+    snippets = dict(db.session.execute(text(f"""
+        SELECT rowid, snippet({FTS_TABLE}, -1, :start, :end, '…', 16)
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :match AND rowid IN ({id_list})
+    """), snippet_params).fetchall())
+
+    hits = [(result_id, snippet_html(snippets.get(result_id)), rank) for result_id, rank in page_rows]
+    return hits, total
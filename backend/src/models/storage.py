@@ -0,0 +1,167 @@
+"""Database engine configuration.
+
+``DATABASE_URL`` selects the database (PostgreSQL in production); without it
+the app uses the SQLite file in ``src/database/app.db``.
+
+SQLite is tuned for several worker processes writing at once: WAL journal
+(readers never block the writer), ``synchronous=NORMAL`` (no fsync per
+commit in WAL mode) and a busy timeout so concurrent writers wait for the
+lock instead of failing with "database is locked".
+
+PostgreSQL connections come from a pre-pinged, recycled pool sized per
+worker process.
+
+``init_schema`` records a fingerprint of the models and migrations in
+``schema_state``; while it matches, startup skips ``create_all``, the
+migrations and the admin check (a single query per deploy). Deleting the
+row forces a full check on the next start.
+"""
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from sqlalchemy import event, text
+from .user import db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'app.db')
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def database_url():
+    """Return the configured database URL (SQLite file by default)"""
+    url = os.environ.get('DATABASE_URL')
+    if not url:
+        os.makedirs(os.path.dirname(DEFAULT_SQLITE_PATH), exist_ok=True)
+        return f"sqlite:///{DEFAULT_SQLITE_PATH}"
+    # Render/Heroku hand out postgres:// URLs, SQLAlchemy needs postgresql://
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def _json_serializer(value):
+    # Store umlauts as-is instead of \u escapes (smaller, searchable)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def engine_options(url):
+    """SQLAlchemy engine options for the given database URL"""
+    if url.startswith('sqlite'):
+        return {
+            'json_serializer': _json_serializer,
+            'connect_args': {
+                # Seconds the sqlite3 driver waits for a lock before raising
+                'timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 30000) / 1000,
+                # Connections are handed between threads by the pool
+                'check_same_thread': False,
+            },
+        }
+    return {
+        'pool_size': _env_int('DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+        'json_serializer': _json_serializer,
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')}")
+    cursor.execute(f"PRAGMA synchronous={os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+    cursor.execute(f"PRAGMA busy_timeout={_env_int('SQLITE_BUSY_TIMEOUT_MS', 30000)}")
+    cursor.close()
+
+
+def init_database(app, url=None):
+    """Configure the database for ``app`` and bind ``db`` to it"""
+    url = url or database_url()
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url)
+    db.init_app(app)
+
+    if url.startswith('sqlite'):
+        with app.app_context():
+            event.listen(db.engine, 'connect', _set_sqlite_pragmas)
+
+
+def dialect_insert(table, dialect):
+    """INSERT for ``table`` with ``on_conflict_do_*`` (SQLite and PostgreSQL)"""
+    if dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def schema_fingerprint():
+    """Hash of the model tables and the migration versions"""
+    from .migrations import MIGRATIONS
+    parts = [str(version) for version, _, _ in MIGRATIONS]
+    for table in db.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f'{column.name}:{column.type!r}:{column.nullable}' for column in table.columns)
+        parts.extend(sorted(index.name for index in table.indexes))
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:32]
+
+
+def _schema_current(fingerprint):
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_state ('
+            'fingerprint VARCHAR(64) PRIMARY KEY, '
+            'applied_at TIMESTAMP NOT NULL)'
+        ))
+        row = conn.execute(text('SELECT 1 FROM schema_state WHERE fingerprint = :fingerprint'),
+                           {'fingerprint': fingerprint}).first()
+    return row is not None
+
+
+def _record_schema(fingerprint):
+    with db.engine.begin() as conn:
+        conn.execute(text('DELETE FROM schema_state'))
+        conn.execute(text('INSERT INTO schema_state (fingerprint, applied_at) VALUES (:fingerprint, :applied_at)'),
+                     {'fingerprint': fingerprint, 'applied_at': datetime.utcnow()})
+
+
+def init_schema():
+    """Create missing tables, apply migrations and the default admin (needs an app context).
+
+    Returns False if the schema was already set up for this code version.
+    """
+    # Import models to ensure tables are created
+    from .user import User
+    from .image import GeneratedImage, ImageJob  # noqa: F401
+    from .analysis_stats import AnalysisStats  # noqa: F401
+    from .rate_limit import RateLimitBucket  # noqa: F401
+    from .data_version import DataVersion  # noqa: F401
+    from .change_event import ChangeEvent  # noqa: F401
+    from .migrations import run_migrations
+
+    fingerprint = schema_fingerprint()
+    if _schema_current(fingerprint):
+        return False
+
+    db.create_all()
+    run_migrations(db.engine)
+
+    # Create default admin user if it doesn't exist
+    admin_user = User.query.filter_by(username='admin').first()
+    if not admin_user:
+        admin_user = User(username='admin', email='admin@example.com', role='admin')
+        admin_user.set_password('admin123')
+        db.session.add(admin_user)
+        db.session.commit()
+        logger.warning("Default admin user created: admin/admin123")
+
+    _record_schema(fingerprint)
+    return True
@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from .fields import (compress_text, decompress_text, keywords_text,
+                     company_info_text)
 
 db = SQLAlchemy()
 
@@ -34,29 +36,84 @@ class User(db.Model):
         }
 
 class SEOResult(db.Model):
+    __table_args__ = (
+        # Lookup by normalized domain in analyze_domain, one profile per domain
+        db.Index('ix_seo_result_domain', 'domain', unique=True),
+        # /results listing: filter by user, newest first
+        db.Index('ix_seo_result_user_created', 'user_id', 'created_at'),
+        # /results listing for admins (no user filter)
+        db.Index('ix_seo_result_created', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     domain = db.Column(db.String(255), nullable=False)
     short_description = db.Column(db.Text, nullable=True)
     long_description = db.Column(db.Text, nullable=True)
-    keywords = db.Column(db.Text, nullable=True)  # JSON string of keywords
+    keywords = db.Column(db.JSON, nullable=True)  # List of keywords
     opening_hours = db.Column(db.Text, nullable=True)
-    company_info = db.Column(db.Text, nullable=True)  # JSON string of company info
-    raw_response = db.Column(db.Text, nullable=True)  # Full GPT response
+    company_info = db.Column(db.JSON, nullable=True)  # Impressum as {label: value}
+    # Full GPT response, zlib-compressed and only loaded when accessed
+    raw_response_compressed = db.deferred(db.Column('raw_response_z', db.LargeBinary, nullable=True))
+    # Uncompressed responses from before the compression migration
+    raw_response_text = db.deferred(db.Column('raw_response', db.Text, nullable=True))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
     def __repr__(self):
         return f'<SEOResult {self.domain}>'
 
+    @property
+    def raw_response(self):
+        if self.raw_response_compressed is not None:
+            return decompress_text(self.raw_response_compressed)
+        return self.raw_response_text
+
+    @raw_response.setter
+    def raw_response(self, value):
+        self.raw_response_compressed = compress_text(value)
+        self.raw_response_text = None
+
+    @classmethod
+    def projection_columns(cls):
+        """Columns selectable via ?fields= (username requires a join on User)"""
+        return {
+            'id': cls.id,
+            'domain': cls.domain,
+            'short_description': cls.short_description,
+            'long_description': cls.long_description,
+            'keywords': cls.keywords,
+            'keywords_list': cls.keywords,
+            'opening_hours': cls.opening_hours,
+            'company_info': cls.company_info,
+            'company_info_fields': cls.company_info,
+            'raw_response': cls.raw_response_compressed,
+            'created_at': cls.created_at,
+            'user_id': cls.user_id,
+            'username': User.username,
+        }
+
+    @classmethod
+    def projection_decoders(cls):
+        """Conversions applied to projected values so they match to_dict()"""
+        return {
+            'keywords': keywords_text,
+            'keywords_list': lambda value: value or [],
+            'company_info': company_info_text,
+            'company_info_fields': lambda value: value or {},
+            'raw_response': decompress_text,
+        }
+
     def to_dict(self):
         return {
             'id': self.id,
             'domain': self.domain,
             'short_description': self.short_description,
             'long_description': self.long_description,
-            'keywords': self.keywords,
+            'keywords': keywords_text(self.keywords),
+            'keywords_list': self.keywords or [],
             'opening_hours': self.opening_hours,
-            'company_info': self.company_info,
+            'company_info': company_info_text(self.company_info),
+            'company_info_fields': self.company_info or {},
             'raw_response': self.raw_response,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'user_id': self.user_id,
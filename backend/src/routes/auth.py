@@ -1,5 +1,8 @@
 from flask import Blueprint, jsonify, request, session
 from src.models.user import User, db
+from src.services.principal import (
+    admin_required, login_required, current_principal, invalidate_principal
+)
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -18,6 +21,7 @@ def login():
         session['user_id'] = user.id
         session['username'] = user.username
         session['role'] = user.role
+        invalidate_principal(user.id)
         
         return jsonify({
             'message': 'Login successful',
@@ -27,15 +31,9 @@ def login():
     return jsonify({'error': 'Invalid credentials'}), 401
 
 @auth_bp.route('/register', methods=['POST'])
+@admin_required
 def register():
     """Register new user (admin only)"""
-    if 'user_id' not in session:
-        return jsonify({'error': 'Authentication required'}), 401
-    
-    current_user = User.query.get(session['user_id'])
-    if not current_user or current_user.role != 'admin':
-        return jsonify({'error': 'Admin access required'}), 403
-    
     data = request.json
     
     if not data or not all(k in data for k in ['username', 'email', 'password']):
@@ -62,16 +60,10 @@ def register():
     return jsonify(user.to_dict()), 201
 
 @auth_bp.route('/me', methods=['GET'])
+@login_required
 def get_current_user():
     """Get current user information"""
-    if 'user_id' not in session:
-        return jsonify({'error': 'Authentication required'}), 401
-    
-    user = User.query.get(session['user_id'])
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    
-    return jsonify(user.to_dict()), 200
+    return jsonify(current_principal().to_dict()), 200
 
 @auth_bp.route('/verify', methods=['GET'])
 def verify_token():
@@ -79,12 +71,12 @@ def verify_token():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    user = User.query.get(session['user_id'])
-    if not user:
+    principal = current_principal()
+    if not principal:
         session.clear()  # Clear invalid session
         return jsonify({'error': 'User not found'}), 401
     
-    return jsonify({'valid': True, 'user': user.to_dict()}), 200
+    return jsonify({'valid': True, 'user': principal.to_dict()}), 200
 
 @auth_bp.route('/logout', methods=['POST'])
 def logout():
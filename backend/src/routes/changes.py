@@ -0,0 +1,124 @@
+import os
+import time
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from src.models.user import SEOResult
+from src.models.image import GeneratedImage
+from src.models.projection import parse_fields
+from src.services import change_feed
+from src.services.admission import admission_required
+from src.services.principal import login_required, current_principal
+
+changes_bp = Blueprint('changes', __name__)
+
+# Longest wait of a long-poll (seconds)
+LONG_POLL_MAX_TIMEOUT = 30
+# Streams end after this long; EventSource reconnects with Last-Event-ID
+CHANGE_FEED_STREAM_SECONDS = int(os.environ.get('CHANGE_FEED_STREAM_SECONDS', 300))
+# Comment line keeping proxies from closing an idle stream
+STREAM_HEARTBEAT = 15
+# Seconds a client should wait when no feed slot is free
+BUSY_RETRY_AFTER = 5
+
+def parse_since():
+    """Cursor of ?since= or the Last-Event-ID header; None starts at the newest event"""
+    value = request.args.get('since') or request.headers.get('Last-Event-ID')
+    if not value:
+        return None
+    if not value.isdigit():
+        raise ValueError('since must be a non-negative integer')
+    return int(value)
+
+def parse_feed_fields():
+    """Projections of the event rows: ?result_fields= and ?image_fields=, as on the list endpoints"""
+    return {
+        'seo_result': parse_fields(request.args.get('result_fields'), SEOResult.projection_columns()),
+        'image': parse_fields(request.args.get('image_fields'), GeneratedImage.projection_columns())
+    }
+
+@changes_bp.route('', methods=['GET'])
+@login_required
+@admission_required('read')
+def poll_changes():
+    """Events after ?since=, waiting up to ?timeout= seconds for the first one (long-poll)"""
+    try:
+        since = parse_since()
+        fields = parse_feed_fields()
+        timeout = min(float(request.args.get('timeout', 25)), LONG_POLL_MAX_TIMEOUT)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if since is None:
+        return jsonify({'events': [], 'cursor': change_feed.latest_cursor()}), 200
+
+    principal = current_principal()
+    events, cursor = change_feed.fetch(principal, since, fields)
+    if events or timeout <= 0:
+        return jsonify({'events': events, 'cursor': cursor}), 200
+
+    if not change_feed.acquire_slot():
+        # No thread to spare for waiting: answer now, the client polls again later
+        return jsonify({'events': [], 'cursor': cursor, 'retry_after': BUSY_RETRY_AFTER}), 200, \
+            {'Retry-After': str(BUSY_RETRY_AFTER)}
+    try:
+        deadline = time.monotonic() + timeout
+        while not events and time.monotonic() < deadline:
+            change_feed.wait(min(change_feed.CHANGE_FEED_POLL_INTERVAL, deadline - time.monotonic()))
+            events, cursor = change_feed.fetch(principal, cursor, fields)
+    finally:
+        change_feed.release_slot()
+    return jsonify({'events': events, 'cursor': cursor}), 200
+
+def sse(data, event_id=None, event=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {current_app.json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+@changes_bp.route('/stream', methods=['GET'])
+@login_required
+@admission_required('read')
+def stream_changes():
+    """Server-sent events: "ready" with the cursor, then one message per change"""
+    try:
+        since = parse_since()
+        fields = parse_feed_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not change_feed.acquire_slot():
+        return jsonify({
+            'error': 'Too many open change streams, use GET /api/changes',
+            'retry_after': BUSY_RETRY_AFTER
+        }), 429, {'Retry-After': str(BUSY_RETRY_AFTER)}
+
+    principal = current_principal()
+
+    def generate(cursor):
+        if cursor is None:
+            cursor = change_feed.latest_cursor()
+        yield f'retry: {BUSY_RETRY_AFTER * 1000}\n'
+        yield sse({'cursor': cursor}, cursor, 'ready')
+        end = time.monotonic() + CHANGE_FEED_STREAM_SECONDS
+        last_sent = time.monotonic()
+        while time.monotonic() < end:
+            events, cursor = change_feed.fetch(principal, cursor, fields)
+            for change in events:
+                yield sse(change, change['id'])
+            now = time.monotonic()
+            if events:
+                last_sent = now
+            elif now - last_sent >= STREAM_HEARTBEAT:
+                yield ': keepalive\n\n'
+                last_sent = now
+            change_feed.wait(change_feed.CHANGE_FEED_POLL_INTERVAL)
+
+    response = Response(stream_with_context(generate(since)), mimetype='text/event-stream')
+    # Also runs if the client is gone before the first chunk
+    response.call_on_close(change_feed.release_slot)
+    response.headers['Cache-Control'] = 'no-cache'
+    # nginx: pass events through instead of buffering them
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
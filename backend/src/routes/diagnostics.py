@@ -0,0 +1,148 @@
+import io
+import os
+import pstats
+from flask import Blueprint, Response, jsonify, request, send_from_directory
+from src.services import memory, profiling
+from src.services.principal import admin_required
+
+diagnostics_bp = Blueprint('diagnostics', __name__)
+
+@diagnostics_bp.route('/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    """Stored request profiles, newest first (admin only)"""
+    return jsonify({
+        'profiles': profiling.list_artifacts(),
+        'sample_rate': profiling.PROFILE_SAMPLE_RATE,
+        'max_files': profiling.PROFILE_MAX_FILES
+    }), 200
+
+@diagnostics_bp.route('/profiles/<name>', methods=['GET'])
+@admin_required
+def get_profile(name):
+    """Download a profile; ?format=text summarizes a .pstats file (admin only)"""
+    if name not in {artifact['name'] for artifact in profiling.list_artifacts()}:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    if request.args.get('format') == 'text' and name.endswith('.pstats'):
+        limit = request.args.get('limit', 50, type=int)
+        if not 1 <= limit <= 500:
+            return jsonify({'error': 'limit must be between 1 and 500'}), 400
+        output = io.StringIO()
+        stats = pstats.Stats(os.path.join(profiling.PROFILE_DIR, name), stream=output)
+        try:
+            stats.sort_stats(request.args.get('sort', 'cumulative'))
+        except KeyError:
+            return jsonify({'error': 'Invalid sort key'}), 400
+        stats.print_stats(limit)
+        return Response(output.getvalue(), mimetype='text/plain')
+
+    return send_from_directory(profiling.PROFILE_DIR, name, as_attachment=True)
+
+@diagnostics_bp.route('/profiles/<name>', methods=['DELETE'])
+@admin_required
+def delete_profile(name):
+    """Delete a stored profile (admin only)"""
+    if name not in {artifact['name'] for artifact in profiling.list_artifacts()}:
+        return jsonify({'error': 'Profile not found'}), 404
+    os.remove(os.path.join(profiling.PROFILE_DIR, name))
+    return '', 204
+
+GROUP_BY = ('lineno', 'filename', 'traceback')
+
+@diagnostics_bp.route('/memory', methods=['GET'])
+@admin_required
+def get_memory():
+    """RSS, tracemalloc state, snapshots and peak allocations of this worker (admin only)"""
+    return jsonify(memory.status()), 200
+
+@diagnostics_bp.route('/memory/tracemalloc', methods=['POST'])
+@admin_required
+def start_tracemalloc():
+    """Start tracing allocations; {"frames": n} stack depth per allocation (admin only)"""
+    data = request.get_json(silent=True) or {}
+    frames = data.get('frames', 10)
+    if not isinstance(frames, int) or not 1 <= frames <= 100:
+        return jsonify({'error': 'frames must be between 1 and 100'}), 400
+    if not memory.start_tracing(frames):
+        return jsonify({'error': 'tracemalloc is already running'}), 409
+    return jsonify(memory.status()), 200
+
+@diagnostics_bp.route('/memory/tracemalloc', methods=['DELETE'])
+@admin_required
+def stop_tracemalloc():
+    """Stop tracing and drop the snapshots (admin only)"""
+    if not memory.stop_tracing():
+        return jsonify({'error': 'tracemalloc is not running'}), 409
+    return jsonify(memory.status()), 200
+
+@diagnostics_bp.route('/memory/snapshots', methods=['POST'])
+@admin_required
+def take_memory_snapshot():
+    """Keep a snapshot of the traced allocations; {"label": "..."} (admin only)"""
+    if not memory.tracemalloc.is_tracing():
+        return jsonify({'error': 'tracemalloc is not running'}), 409
+    data = request.get_json(silent=True) or {}
+    return jsonify({'pid': os.getpid(), 'snapshot': memory.take_snapshot(data.get('label'))}), 201
+
+def _memory_query():
+    """group_by and limit of a top/diff request, or an error response"""
+    group_by = request.args.get('group_by', 'lineno')
+    if group_by not in GROUP_BY:
+        return None, None, (jsonify({'error': f'group_by must be one of {", ".join(GROUP_BY)}'}), 400)
+    limit = request.args.get('limit', 20, type=int)
+    if not 1 <= limit <= 200:
+        return None, None, (jsonify({'error': 'limit must be between 1 and 200'}), 400)
+    return group_by, limit, None
+
+def _snapshot_arg(name):
+    """Snapshot of the ?<name>= id, or a fresh one for "now" / no value"""
+    value = request.args.get(name, 'now')
+    if value == 'now':
+        return memory.current_snapshot()
+    return memory.get_snapshot(int(value)) if value.isdigit() else None
+
+@diagnostics_bp.route('/memory/top', methods=['GET'])
+@admin_required
+def get_top_allocations():
+    """Largest allocation sites of ?snapshot= (default: now) (admin only)"""
+    if not memory.tracemalloc.is_tracing():
+        return jsonify({'error': 'tracemalloc is not running'}), 409
+    group_by, limit, error = _memory_query()
+    if error:
+        return error
+    snapshot = _snapshot_arg('snapshot')
+    if snapshot is None:
+        return jsonify({'error': 'Snapshot not found'}), 404
+    return jsonify({
+        'pid': os.getpid(),
+        'group_by': group_by,
+        'allocations': memory.top_allocations(snapshot, group_by, limit)
+    }), 200
+
+@diagnostics_bp.route('/memory/diff', methods=['GET'])
+@admin_required
+def get_memory_diff():
+    """Growth per allocation site from ?from= to ?to= (default: now) (admin only)"""
+    if not memory.tracemalloc.is_tracing():
+        return jsonify({'error': 'tracemalloc is not running'}), 409
+    group_by, limit, error = _memory_query()
+    if error:
+        return error
+    if 'from' not in request.args:
+        return jsonify({'error': 'from is required'}), 400
+    old = _snapshot_arg('from')
+    new = _snapshot_arg('to')
+    if old is None or new is None:
+        return jsonify({'error': 'Snapshot not found'}), 404
+    return jsonify({
+        'pid': os.getpid(),
+        'group_by': group_by,
+        'allocations': memory.diff(old, new, group_by, limit)
+    }), 200
+
+@diagnostics_bp.route('/memory/gc', methods=['POST'])
+@admin_required
+def collect_garbage():
+    """Run a full garbage collection and report RSS before and after (admin only)"""
+    return jsonify(dict(memory.collect_garbage(), pid=os.getpid())), 200
@@ -1,45 +1,54 @@
 import os
-import base64
 import uuid
-import openai
-from flask import Blueprint, request, jsonify, session
+import logging
+from flask import Blueprint, request, jsonify
 from src.models.user import db, User
-from src.models.image import GeneratedImage
+from src.models.image import GeneratedImage, ImageJob
+from src.models.projection import parse_fields, project_query, row_to_dict
+from src.models.pagination import keyset_page, count_total
+from src.services.principal import login_required, admin_required, current_principal
+from src.services.image_jobs import image_jobs, async_image_jobs
+from src.services.async_runtime import async_login_required, openai_client, run_sync
+from src.services.admission import admission_required, async_admission_required
+from src.services.data_versions import conditional
+from src.services.image_derivatives import create_derivatives
+from src.services import image_store
+from src.services.upload_gc import upload_collector
+from src.services.metrics import track_call
+from src.services.memory import peak_tracked
+from sqlalchemy import update, case
+from datetime import datetime, timedelta
+from functools import partial
 
 image_bp = Blueprint('image', __name__)
 
-# OpenAI API configuration
-openai.api_key = os.environ.get('OPENAI_API_KEY')
+logger = logging.getLogger(__name__)
 
-def save_base64_image(b64_string, image_type):
-    """Convert base64 string to image file and return file path"""
+# Variants one request may ask for
+IMAGE_MAX_VARIANTS = int(os.environ.get('IMAGE_MAX_VARIANTS', 4))
+
+# Unfinished jobs a user may have at once
+IMAGE_JOBS_PER_USER = int(os.environ.get('IMAGE_JOBS_PER_USER', 2))
+
+# Seconds after which an unfinished job counts as lost
+IMAGE_JOB_TIMEOUT = int(os.environ.get('IMAGE_JOB_TIMEOUT', 600))
+
+ACTIVE_JOB_STATUSES = ('queued', 'running')
+
+# OpenAI API configuration (the openai package is imported on first use)
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+
+def save_base64_image(b64_string):
+    """Store a base64 image in the content-addressed store.
+
+    Returns ``(content_hash, path, created)`` or None on failure.
+    """
     try:
-        # Create uploads directory if it doesn't exist
-        upload_dir = os.path.join(os.getcwd(), 'static', 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Generate unique filename
-        filename = f"{image_type}_{uuid.uuid4().hex}.png"
-        file_path = os.path.join(upload_dir, filename)
-        
-        # Decode base64 and save to file
-        image_data = base64.b64decode(b64_string)
-        with open(file_path, 'wb') as f:
-            f.write(image_data)
-        
-        # Return relative URL for database storage
-        return f"/static/uploads/{filename}"
-        
+        return image_store.store_base64(b64_string)
     except Exception as e:
-        print(f"Error saving base64 image: {str(e)}")
+        logger.exception(f"Error saving base64 image: {str(e)}")
         return None
 
-def get_current_user():
-    """Get current user from session"""
-    if 'user_id' not in session:
-        return None
-    return User.query.get(session['user_id'])
-
 def build_prompt(user_input, image_type):
     """Build the professional prompt for image generation"""
     
@@ -67,141 +76,389 @@ def build_prompt(user_input, image_type):
     
     return complete_prompt, size
 
+def image_options(prompt, size):
+    """Arguments of the gpt-image-1 request for one variant"""
+    return dict(
+        model="gpt-image-1",
+        prompt=prompt,
+        size=size,
+        quality="high",  # gpt-image-1 supports quality parameter
+        n=1  # Variants are separate requests so they run in parallel
+        # Note: response_format is not supported by gpt-image-1
+    )
+
+def request_image(prompt, size, image_type):
+    """Generate one image with gpt-image-1 and store it with its derivatives.
+
+    Returns the GeneratedImage fields (image_url plus derivative URLs/sizes).
+    """
+    import openai
+    client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    with track_call('image'):
+        response = client.images.generate(**image_options(prompt, size))
+    return store_image_response(response)
+
+@peak_tracked('image')
+def store_image_response(response):
+    """Store the image of an images API response; returns the GeneratedImage fields"""
+    if not response or not getattr(response, 'data', None):
+        raise RuntimeError('Invalid API response')
+    
+    first_item = response.data[0]
+    # Handle base64 response from gpt-image-1
+    if getattr(first_item, 'b64_json', None):
+        stored = save_base64_image(first_item.b64_json)
+        if not stored:
+            raise RuntimeError('Failed to save base64 image')
+        content_hash, file_path, created = stored
+        image_url = image_store.url_for_path(file_path)
+        logger.debug(f"Base64 image saved to: {image_url}")
+        
+        # Identical bytes stored before: reuse their derivatives
+        existing = None if created else GeneratedImage.query.filter_by(content_hash=content_hash).first()
+        derivatives = existing.derivative_fields() if existing else create_derivatives(file_path, image_url)
+        return dict(derivatives, image_url=image_url, content_hash=content_hash)
+    if getattr(first_item, 'url', None):
+        # Fallback for URL response (shouldn't happen with gpt-image-1)
+        logger.warning(f"Found URL (unexpected): {first_item.url}")
+        return {'image_url': first_item.url}
+    raise RuntimeError('No usable image data returned')
+
+def expire_stale_jobs(user_id):
+    """Fail jobs of ``user_id`` whose worker never finished them (e.g. restart)"""
+    cutoff = datetime.utcnow() - timedelta(seconds=IMAGE_JOB_TIMEOUT)
+    db.session.execute(
+        update(ImageJob)
+        .where(ImageJob.user_id == user_id, ImageJob.status.in_(ACTIVE_JOB_STATUSES),
+               ImageJob.created_at < cutoff)
+        .values(status='failed', error='Job timed out', finished_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+def active_job_count(user_id):
+    return ImageJob.query.filter(
+        ImageJob.user_id == user_id,
+        ImageJob.status.in_(ACTIVE_JOB_STATUSES)
+    ).count()
+
+def reusable_images(user_id, prompt_hash, limit):
+    """Up to ``limit`` distinct stored images the user generated from the same prompt.
+
+    Only the user's own: quotas and eviction account files per user.
+    """
+    images = []
+    seen = set()
+    candidates = GeneratedImage.query.filter(
+        GeneratedImage.user_id == user_id,
+        GeneratedImage.prompt_hash == prompt_hash,
+        GeneratedImage.content_hash.isnot(None)
+    ).order_by(GeneratedImage.id.desc()).limit(limit * 5)
+    for image in candidates:
+        path = image_store.path_for_url(image.image_url)
+        if image.content_hash in seen or not path or not os.path.exists(path):
+            continue
+        seen.add(image.content_hash)
+        images.append(image)
+        if len(images) >= limit:
+            break
+    for image in images:
+        # Only their values are copied: keep them readable if the row is deleted meanwhile
+        db.session.expunge(image)
+    return images
+
+def start_variant(job_id):
+    db.session.execute(
+        update(ImageJob).where(ImageJob.id == job_id, ImageJob.status == 'queued').values(status='running')
+    )
+    db.session.commit()
+
+def finish_variant(job_id, user_id, user_input, image_type, prompt, size, image_fields=None, error=None):
+    """Record the outcome of one variant; the last variant to finish closes the job"""
+    if error is None:
+        try:
+            # The stored file may be shared: keep release() away until the row is committed
+            with image_store.content_locks([image_fields.get('content_hash')]):
+                if not image_store.is_stored(image_fields['image_url']):
+                    raise RuntimeError('Stored image was deleted concurrently')
+                db.session.add(GeneratedImage(
+                    user_id=user_id,
+                    user_input=user_input,
+                    image_type=image_type,
+                    prompt_used=prompt,
+                    prompt_hash=GeneratedImage.prompt_hash_for(prompt, size),
+                    image_size=size,
+                    job_id=job_id,
+                    **image_fields
+                ))
+                db.session.execute(
+                    update(ImageJob).where(ImageJob.id == job_id).values(completed=ImageJob.completed + 1)
+                )
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            error = e
+    
+    if error is not None:
+        logger.error(f"Image generation failed for job {job_id}: {str(error)}")
+        db.session.execute(
+            update(ImageJob).where(ImageJob.id == job_id)
+            .values(failed=ImageJob.failed + 1, error=f'Image generation failed: {str(error)}')
+        )
+        db.session.commit()
+    
+    db.session.execute(
+        update(ImageJob)
+        .where(ImageJob.id == job_id, ImageJob.status.in_(ACTIVE_JOB_STATUSES),
+               ImageJob.completed + ImageJob.failed >= ImageJob.variants)
+        .values(status=case((ImageJob.completed > 0, 'done'), else_='failed'),
+                finished_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+def run_image_variant(job_id, user_id, user_input, image_type, prompt, size):
+    """Generate one variant of an image job (runs on an image job thread)"""
+    start_variant(job_id)
+    
+    try:
+        image_fields, error = request_image(prompt, size, image_type), None
+    except Exception as e:
+        image_fields, error = None, e
+    finish_variant(job_id, user_id, user_input, image_type, prompt, size, image_fields, error)
+
+async def run_image_variant_async(job_id, user_id, user_input, image_type, prompt, size):
+    """``run_image_variant`` on the event loop (ASGI stack)"""
+    await run_sync(start_variant, job_id)
+    
+    try:
+        with track_call('image'):
+            response = await openai_client().images.generate(**image_options(prompt, size))
+        # Decoding, hashing and derivatives are CPU/disk work
+        image_fields, error = await run_sync(store_image_response, response), None
+    except Exception as e:
+        image_fields, error = None, e
+    await run_sync(finish_variant, job_id, user_id, user_input, image_type, prompt, size, image_fields, error)
+
+def variant_cost(data):
+    """Admission tokens of a generate request: one per variant (bad counts fail validation later)"""
+    try:
+        return min(max(int(data.get('variants', 1)), 1), IMAGE_MAX_VARIANTS)
+    except (AttributeError, TypeError, ValueError):
+        return 1
+
+def create_image_job(user_id, data, submit):
+    """Validate a generate request, create its ImageJob and queue the variants.
+
+    ``submit(variant_args, count)`` queues ``count`` variants and returns
+    False if the queue is full. Returns the response payload and status.
+    """
+    # Validate input
+    if not data:
+        return {'error': 'No data provided'}, 400
+    
+    user_input = data.get('user_input', '').strip()
+    image_type = data.get('image_type', 'header')
+    
+    if not user_input:
+        return {'error': 'User input is required'}, 400
+    
+    if image_type not in ['header', 'kachel']:
+        return {'error': 'Invalid image type. Must be "header" or "kachel"'}, 400
+    
+    try:
+        variants = int(data.get('variants', 1))
+    except (TypeError, ValueError):
+        variants = 0
+    if not 1 <= variants <= IMAGE_MAX_VARIANTS:
+        return {'error': f'Variants must be between 1 and {IMAGE_MAX_VARIANTS}'}, 400
+    
+    # Reuse images generated earlier from the identical prompt
+    allow_reuse = data.get('allow_reuse', False)
+    if isinstance(allow_reuse, str):
+        allow_reuse = allow_reuse.strip().lower() in ('1', 'true', 'yes')
+    allow_reuse = allow_reuse is True
+    
+    # Build prompt and get size
+    prompt, size = build_prompt(user_input, image_type)
+    prompt_hash = GeneratedImage.prompt_hash_for(prompt, size)
+    reused = reusable_images(user_id, prompt_hash, variants) if allow_reuse else []
+    remaining = variants - len(reused)
+    
+    # Check if OpenAI API key is available
+    if remaining and not OPENAI_API_KEY:
+        return {'error': 'OpenAI API key not configured'}, 500
+    
+    expire_stale_jobs(user_id)
+    # Concurrent requests of one user count one after another (row lock on
+    # PostgreSQL; SQLite has none, see the recount below)
+    db.session.query(User.id).filter(User.id == user_id).with_for_update().one()
+    if active_job_count(user_id) >= IMAGE_JOBS_PER_USER:
+        db.session.rollback()
+        return {'error': 'Too many image jobs in progress'}, 429
+    
+    logger.debug(f"Image generation: type={image_type} size={size} variants={variants} "
+                 f"({len(reused)} reused) input={user_input!r} prompt={prompt!r}")
+    
+    job = ImageJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        user_input=user_input,
+        image_type=image_type,
+        variants=variants,
+        completed=len(reused),
+        status='queued' if remaining else 'done',
+        finished_at=None if remaining else datetime.utcnow()
+    )
+    db.session.add(job)
+    for image in reused:
+        # New row referencing the same stored file
+        db.session.add(GeneratedImage(
+            user_id=user_id,
+            user_input=user_input,
+            image_type=image_type,
+            image_url=image.image_url,
+            prompt_used=prompt,
+            prompt_hash=prompt_hash,
+            image_size=size,
+            job_id=job.id,
+            content_hash=image.content_hash,
+            **image.derivative_fields()
+        ))
+    # Reused files must survive until the new rows referencing them are committed
+    with image_store.content_locks(image.content_hash for image in reused):
+        if not all(image_store.is_stored(image.image_url) for image in reused):
+            db.session.rollback()
+            return {'error': 'A reused image was just deleted, please try again'}, 409
+        db.session.flush()
+        # The insert holds the write lock now: a recount sees every committed job
+        if active_job_count(user_id) > IMAGE_JOBS_PER_USER:
+            db.session.rollback()
+            return {'error': 'Too many image jobs in progress'}, 429
+        db.session.commit()
+    
+    if remaining:
+        if not submit((job.id, user_id, user_input, image_type, prompt, size), remaining):
+            job.failed = remaining
+            job.status = 'done' if reused else 'failed'
+            job.error = 'Image queue is full'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            if not reused:
+                return {'error': 'Image queue is full, please try again later'}, 503
+    
+    logger.info(f"Image job {job.id} queued with {remaining} variant(s), {len(reused)} reused")
+    
+    images = GeneratedImage.query.filter_by(job_id=job.id).order_by(GeneratedImage.id).all() if reused else []
+    return {
+        'success': True,
+        'job': job.to_dict(images)
+    }, 202
+
 @image_bp.route('/generate', methods=['POST'])
+@login_required
+@admission_required('image', cost=variant_cost)
 def generate_image():
-    """Generate an image using OpenAI DALL-E"""
+    """Start a background job generating one or more image variants"""
+    
+    current_user = current_principal()
     
-    # Check authentication
-    current_user = get_current_user()
-    if not current_user:
-        return jsonify({'error': 'Authentication required'}), 401
+    def submit(variant_args, count):
+        return image_jobs.submit(current_user.id, [partial(run_image_variant, *variant_args) for _ in range(count)],
+                                 job_id=variant_args[0])
     
     try:
-        data = request.get_json()
-        
-        # Validate input
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        user_input = data.get('user_input', '').strip()
-        image_type = data.get('image_type', 'header')
-        
-        if not user_input:
-            return jsonify({'error': 'User input is required'}), 400
-        
-        if image_type not in ['header', 'kachel']:
-            return jsonify({'error': 'Invalid image type. Must be "header" or "kachel"'}), 400
-        
-        # Check if OpenAI API key is available
-        if not openai.api_key:
-            return jsonify({'error': 'OpenAI API key not configured'}), 500
-        
-        # Build prompt and get size
-        prompt, size = build_prompt(user_input, image_type)
-        
-        print(f"=== IMAGE GENERATION DEBUG ===")
-        print(f"User input: {user_input}")
-        print(f"Image type: {image_type}")
-        print(f"Size: {size}")
-        print(f"Prompt: {prompt}")
-        print(f"=== END DEBUG ===")
-        
-        # Generate image using OpenAI gpt-image-1
-        try:
-            client = openai.OpenAI(api_key=openai.api_key)
-            
-            response = client.images.generate(
-                model="gpt-image-1",  # Back to gpt-image-1 as requested
-                prompt=prompt,
-                size=size,
-                quality="high",  # gpt-image-1 supports quality parameter
-                n=1
-                # Note: response_format is not supported by gpt-image-1
-            )
-            
-            print(f"OpenAI API Response: {response}")
-            print(f"Response type: {type(response)}")
-            print(f"Response data: {response.data if hasattr(response, 'data') else 'No data attribute'}")
-            
-            # Process the base64 image response
-            if response and hasattr(response, 'data') and response.data and len(response.data) > 0:
-                first_item = response.data[0]
-                print(f"First data item: {first_item}")
-                print(f"First item type: {type(first_item)}")
-                print(f"First item attributes: {[attr for attr in dir(first_item) if not attr.startswith('_')]}")
-                
-                # Handle base64 response from gpt-image-1
-                if hasattr(first_item, 'b64_json') and first_item.b64_json:
-                    print("Processing base64 image from gpt-image-1")
-                    image_url = save_base64_image(first_item.b64_json, image_type)
-                    if not image_url:
-                        return jsonify({'error': 'Failed to save base64 image'}), 500
-                    print(f"Base64 image saved to: {image_url}")
-                elif hasattr(first_item, 'url') and first_item.url:
-                    # Fallback for URL response (shouldn't happen with b64_json format)
-                    image_url = first_item.url
-                    print(f"Found URL (unexpected): {image_url}")
-                else:
-                    print(f"No usable image data found. Available attributes: {[attr for attr in dir(first_item) if not attr.startswith('_')]}")
-                    return jsonify({'error': 'Image generation failed: No usable image data returned'}), 500
-                
-            else:
-                print("ERROR: Invalid response structure from OpenAI API")
-                print(f"Response has data: {hasattr(response, 'data')}")
-                if hasattr(response, 'data'):
-                    print(f"Data length: {len(response.data) if response.data else 'Data is None'}")
-                return jsonify({'error': 'Image generation failed: Invalid API response'}), 500
-            
-        except Exception as openai_error:
-            print(f"OpenAI API error: {str(openai_error)}")
-            return jsonify({'error': f'Image generation failed: {str(openai_error)}'}), 500
-        
-        # Save to database
-        try:
-            generated_image = GeneratedImage(
-                user_id=current_user.id,
-                user_input=user_input,
-                image_type=image_type,
-                image_url=image_url,
-                prompt_used=prompt,
-                image_size=size
-            )
-            
-            db.session.add(generated_image)
-            db.session.commit()
-            
-            print(f"Image saved to database with ID: {generated_image.id}")
-            
-            return jsonify({
-                'success': True,
-                'image': generated_image.to_dict()
-            }), 200
-            
-        except Exception as db_error:
-            db.session.rollback()
-            print(f"Database error: {str(db_error)}")
-            return jsonify({'error': f'Failed to save image: {str(db_error)}'}), 500
+        payload, status = create_image_job(current_user.id, request.get_json(), submit)
+        return jsonify(payload), status
         
     except Exception as e:
-        print(f"General error in generate_image: {str(e)}")
+        db.session.rollback()
+        logger.exception(f"General error in generate_image: {str(e)}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
+@async_login_required
+@async_admission_required('image', cost=variant_cost)
+async def generate_image_async(request):
+    """``generate_image`` for the ASGI stack: variants run as coroutines on the event loop"""
+    
+    user_id = request.principal.id
+    
+    def submit(variant_args, count):
+        return async_image_jobs.submit(user_id, [partial(run_image_variant_async, *variant_args) for _ in range(count)],
+                                       job_id=variant_args[0])
+    
+    try:
+        return await run_sync(create_image_job, user_id, request.json, submit)
+        
+    except Exception as e:
+        logger.exception(f"General error in generate_image: {str(e)}")
+        return {'error': f'Internal server error: {str(e)}'}, 500
+
+@image_bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+@admission_required('read')
+def get_image_job(job_id):
+    """Get status and finished images of an image job"""
+    
+    current_user = current_principal()
+    
+    job = ImageJob.query.get(job_id)
+    if not job or job.user_id != current_user.id:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if not job.finished:
+        expire_stale_jobs(current_user.id)
+        db.session.refresh(job)
+    
+    images = GeneratedImage.query.filter_by(job_id=job.id).order_by(GeneratedImage.id).all()
+    return jsonify({'job': job.to_dict(images)}), 200
+
+def history_scopes(principal):
+    """Data versions the image history depends on"""
+    return [f'image:user:{principal.id}', 'image:bulk']
+
 @image_bp.route('/history', methods=['GET'])
+@login_required
+@admission_required('read')
+@conditional(history_scopes)
 def get_image_history():
     """Get user's image generation history"""
     
-    # Check authentication
-    current_user = get_current_user()
-    if not current_user:
-        return jsonify({'error': 'Authentication required'}), 401
+    current_user = current_principal()
     
     try:
         # Get pagination parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         
+        try:
+            fields = parse_fields(request.args.get('fields'), GeneratedImage.projection_columns())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        cursor = request.args.get('cursor')
+        if cursor is not None and fields and 'created_at' not in fields:
+            # Cursor pagination keys on (created_at, id)
+            fields.append('created_at')
+        
         # Query user's images
-        images_query = GeneratedImage.query.filter_by(user_id=current_user.id).order_by(GeneratedImage.created_at.desc())
+        images_query = GeneratedImage.query.filter_by(user_id=current_user.id)
+        if fields:
+            images_query = project_query(images_query, GeneratedImage.projection_columns(), fields)
+        serialize = (lambda row: row_to_dict(row, fields)) if fields else (lambda image: image.to_dict())
+        
+        # Keyset pagination: constant cost per page, optional totals
+        if cursor is not None:
+            try:
+                items, next_cursor = keyset_page(images_query, GeneratedImage, per_page, cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({
+                'images': [serialize(image) for image in items],
+                'next_cursor': next_cursor,
+                'total': count_total(images_query, request.args.get('total'), ('images', current_user.id)),
+                'per_page': per_page
+            }), 200
+        
+        images_query = images_query.order_by(GeneratedImage.created_at.desc())
         
         # Paginate
         images_paginated = images_query.paginate(
@@ -211,7 +468,7 @@ def get_image_history():
         )
         
         return jsonify({
-            'images': [image.to_dict() for image in images_paginated.items],
+            'images': [serialize(image) for image in images_paginated.items],
             'total': images_paginated.total,
             'pages': images_paginated.pages,
             'current_page': page,
@@ -219,17 +476,15 @@ def get_image_history():
         }), 200
         
     except Exception as e:
-        print(f"Error in get_image_history: {str(e)}")
+        logger.exception(f"Error in get_image_history: {str(e)}")
         return jsonify({'error': f'Failed to get image history: {str(e)}'}), 500
 
 @image_bp.route('/delete/<int:image_id>', methods=['DELETE'])
+@login_required
 def delete_image(image_id):
     """Delete a generated image"""
     
-    # Check authentication
-    current_user = get_current_user()
-    if not current_user:
-        return jsonify({'error': 'Authentication required'}), 401
+    current_user = current_principal()
     
     try:
         # Find the image
@@ -238,14 +493,32 @@ def delete_image(image_id):
         if not image:
             return jsonify({'error': 'Image not found'}), 404
         
-        # Delete from database
+        # Delete from database, then the stored file once nothing references it
+        refs = image_store.image_refs(image)
         db.session.delete(image)
         db.session.commit()
+        image_store.release(*refs)
         
         return jsonify({'success': True, 'message': 'Image deleted successfully'}), 200
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error in delete_image: {str(e)}")
+        logger.exception(f"Error in delete_image: {str(e)}")
         return jsonify({'error': f'Failed to delete image: {str(e)}'}), 500
 
+
+@image_bp.route('/gc', methods=['POST'])
+@admin_required
+def collect_uploads():
+    """Run the upload garbage collector now and report reclaimed space (admin only)"""
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    report = upload_collector.run(dry_run=dry_run)
+    if report is None:
+        return jsonify({'error': 'Garbage collection already running'}), 409
+    return jsonify(report), 200
+
+@image_bp.route('/gc', methods=['GET'])
+@admin_required
+def get_upload_report():
+    """Report of the last garbage collection in this worker (admin only)"""
+    return jsonify({'last_report': upload_collector.last_report}), 200
@@ -1,113 +1,176 @@
-from flask import Blueprint, jsonify, request, session
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from src.models.user import User, SEOResult, db
-import openai
+from src.models.search import fts_available, search_results
+from src.models.projection import parse_fields, project_query, row_to_dict
+from src.models.pagination import keyset_page, count_total
+from src.models.fields import parse_keywords, parse_company_info
+from src.services.domain_index import domain_index
+from src.services.principal import admin_required, login_required, current_principal
+from src.services.export import ENCODERS, FORMATS, gzip_chunks
+from src.services.metrics import track_call
+from src.services.memory import peak_tracked
+from src.services.analysis_timing import StageTimer, stage, record_analysis, stage_percentiles
+from src.services.async_runtime import async_login_required, http_client, openai_client, run_sync
+from src.services.admission import admission_required, async_admission_required
+from src.services.data_versions import conditional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, undefer
+import os
 import json
+import asyncio
 import re
-import requests
-from bs4 import BeautifulSoup
+import socket
 from urllib.parse import urlparse, urljoin
 import time
+import logging
+from datetime import datetime, timedelta
 
 seo_bp = Blueprint('seo', __name__)
 
-def require_admin():
-    """Helper function to check if current user is admin"""
-    if 'user_id' not in session:
-        return False
-    current_user = User.query.get(session['user_id'])
-    return current_user and current_user.role == 'admin'
+# openai, requests, httpx and bs4 are imported on first use: together they
+# are most of the app's import time (see benchmarks/bench_startup.py)
 
-def get_current_user():
-    """Helper function to get current user from session"""
-    if 'user_id' not in session:
+logger = logging.getLogger(__name__)
+
+# Headers mimicking a real browser
+CRAWL_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'de-DE,de;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+CRAWL_TIMEOUT = 10
+
+def crawl_url(url):
+    """Ensure the URL has a protocol"""
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+def resolve_address(url):
+    """Host and port to resolve ahead of a fetch of ``url`` (None if unusable)"""
+    parsed = urlparse(url)
+    if not parsed.hostname:
         return None
-    return User.query.get(session['user_id'])
+    return parsed.hostname, parsed.port or (443 if parsed.scheme == 'https' else 80)
+
+def resolve_host(url):
+    """Resolve the host of ``url`` up front so DNS time is a stage of its own.
 
-def crawl_website(url):
+    The fetch resolves again and then hits the resolver cache; lookup errors
+    are left to the fetch, which reports them.
+    """
+    address = resolve_address(url)
+    if address is None:
+        return
+    try:
+        socket.getaddrinfo(*address, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError):
+        pass
+
+def crawl_website(url, timer=None):
     """Crawl website and extract relevant content"""
+    import requests
+    url = crawl_url(url)
+    if timer is not None:
+        with timer.stage('dns'):
+            resolve_host(url)
     try:
-        # Ensure URL has protocol
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
-        
-        # Set headers to mimic a real browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'de-DE,de;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
+        # Make request with timeout
+        with track_call('crawl'), stage(timer, 'download'):
+            response = requests.get(url, headers=CRAWL_HEADERS, timeout=CRAWL_TIMEOUT, verify=False)
+            response.raise_for_status()
+    except requests.RequestException as e:
+        return {
+            'url': url,
+            'error': f'Failed to fetch website: {str(e)}',
+            'success': False
         }
+    if timer is not None:
+        timer.bytes_fetched = len(response.content)
+    return parse_website(url, response.content, timer)
+
+@peak_tracked('crawl')
+def parse_website(url, content, timer=None):
+    """Extract the relevant content of a fetched page"""
+    from bs4 import BeautifulSoup
+    try:
+        with stage(timer, 'parse'):
+            # Parse HTML
+            soup = BeautifulSoup(content, 'html.parser')
         
-        # Make request with timeout
-        response = requests.get(url, headers=headers, timeout=10, verify=False)
-        response.raise_for_status()
-        
-        # Parse HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Remove only script and style elements (keep footer for opening hours!)
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        # Extract title
-        title = soup.find('title')
-        title_text = title.get_text().strip() if title else ""
-        
-        # Extract meta description
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        meta_description = meta_desc.get('content', '').strip() if meta_desc else ""
-        
-        # Extract main content
-        # Try to find main content areas
-        main_content = ""
-        
-        # Look for main content containers
-        content_selectors = [
-            'main', '[role="main"]', '.main-content', '#main-content',
-            '.content', '#content', '.page-content', '.entry-content',
-            'article', '.article', 'section', '.section'
-        ]
-        
-        for selector in content_selectors:
-            elements = soup.select(selector)
-            if elements:
-                for element in elements[:3]:  # Take first 3 matches
-                    text = element.get_text(separator=' ', strip=True)
-                    if len(text) > 100:  # Only include substantial content
-                        main_content += text + "\n\n"
-                break
-        
-        # If no main content found, extract from body
-        if not main_content:
-            body = soup.find('body')
-            if body:
-                main_content = body.get_text(separator=' ', strip=True)
-        
-        # Extract footer content separately (important for opening hours!)
-        footer_content = ""
-        footer_elements = soup.find_all(['footer', '.footer', '#footer', '.site-footer'])
-        for footer in footer_elements:
-            footer_text = footer.get_text(separator=' ', strip=True)
-            if len(footer_text) > 20:  # Only substantial footer content
-                footer_content += footer_text + "\n\n"
-        
-        # Combine main content with footer
-        full_content = main_content
-        if footer_content:
-            full_content += "\n\n=== FOOTER-INFORMATIONEN ===\n" + footer_content
-        
-        # Clean up text
-        full_content = re.sub(r'\s+', ' ', full_content).strip()
-        
-        # Limit content length to avoid token limits
-        if len(full_content) > 4000:
-            full_content = full_content[:4000] + "..."
-        
-        # Extract contact information and opening hours
-        contact_info = extract_contact_info(soup)
-        opening_hours = extract_opening_hours(soup)
+            # Remove only script and style elements (keep footer for opening hours!)
+            for script in soup(["script", "style"]):
+                script.decompose()
+        
+            # Extract title
+            title = soup.find('title')
+            title_text = title.get_text().strip() if title else ""
+        
+            # Extract meta description
+            meta_desc = soup.find('meta', attrs={'name': 'description'})
+            meta_description = meta_desc.get('content', '').strip() if meta_desc else ""
+        
+            # Extract main content
+            # Try to find main content areas
+            main_content = ""
+        
+            # Look for main content containers
+            content_selectors = [
+                'main', '[role="main"]', '.main-content', '#main-content',
+                '.content', '#content', '.page-content', '.entry-content',
+                'article', '.article', 'section', '.section'
+            ]
+        
+            for selector in content_selectors:
+                elements = soup.select(selector)
+                if elements:
+                    for element in elements[:3]:  # Take first 3 matches
+                        text = element.get_text(separator=' ', strip=True)
+                        if len(text) > 100:  # Only include substantial content
+                            main_content += text + "\n\n"
+                    break
+        
+            # If no main content found, extract from body
+            if not main_content:
+                body = soup.find('body')
+                if body:
+                    main_content = body.get_text(separator=' ', strip=True)
+        
+            # Extract footer content separately (important for opening hours!)
+            footer_content = ""
+            footer_elements = soup.find_all(['footer', '.footer', '#footer', '.site-footer'])
+            for footer in footer_elements:
+                footer_text = footer.get_text(separator=' ', strip=True)
+                if len(footer_text) > 20:  # Only substantial footer content
+                    footer_content += footer_text + "\n\n"
+        
+            # Combine main content with footer
+            full_content = main_content
+            if footer_content:
+                full_content += "\n\n=== FOOTER-INFORMATIONEN ===\n" + footer_content
+        
+            # Clean up text
+            full_content = re.sub(r'\s+', ' ', full_content).strip()
+        
+            # Limit content length to avoid token limits
+            if len(full_content) > 4000:
+                full_content = full_content[:4000] + "..."
+        
+            # Extract contact information
+            contact_info = extract_contact_info(soup)
+        
+        with stage(timer, 'opening_hours'):
+            opening_hours = extract_opening_hours(soup)
+        
+        # Break the tree's parent/sibling reference cycles now; left to the
+        # cyclic GC, parsed pages pile up between collections.
+        # (soup.decompose() stops at the root, its children need their own)
+        for element in list(soup.contents):
+            element.decompose()
         
         return {
             'url': url,
@@ -119,12 +182,6 @@ def crawl_website(url):
             'success': True
         }
         
-    except requests.RequestException as e:
-        return {
-            'url': url,
-            'error': f'Failed to fetch website: {str(e)}',
-            'success': False
-        }
     except Exception as e:
         return {
             'url': url,
@@ -165,8 +222,8 @@ def extract_opening_hours(soup):
     full_text = soup.get_text()
     
     # Debug: Print relevant sections
-    print("=== OPENING HOURS DEBUG ===")
-    print(f"Full text length: {len(full_text)}")
+    logger.debug("=== OPENING HOURS DEBUG ===")
+    logger.debug(f"Full text length: {len(full_text)}")
     
     # NEW: Handle single-line opening hours format FIRST (like Bestattungshaus Schweitzer)
     # "Bürozeiten:Montag, Mittwoch, Donnerstag: 8:00 Uhr – 16:00 UhrDienstag und Freitag: 8:00 Uhr – 17:00 UhrSamstag: 10:00 Uhr – 13:00 Uhr"
@@ -181,7 +238,7 @@ def extract_opening_hours(soup):
     
     if single_line_match:
         opening_text = single_line_match.group(1)
-        print(f"Found single-line opening hours: {opening_text}")
+        logger.debug(f"Found single-line opening hours: {opening_text}")
         
         # Normalize the opening text as well
         opening_text = opening_text.replace('\xa0', ' ')
@@ -208,7 +265,7 @@ def extract_opening_hours(soup):
             if not segment:
                 continue
                 
-            print(f"Processing segment: {segment}")
+            logger.debug(f"Processing segment: {segment}")
             
             # Look for day patterns with times
             # Pattern: "montag, mittwoch, donnerstag: 8:00 uhr – 16:00"
@@ -232,11 +289,11 @@ def extract_opening_hours(soup):
                     day = day.strip()
                     if day in day_patterns:
                         opening_hours[day] = time_str
-                        print(f"Assigned {day}: {time_str}")
+                        logger.debug(f"Assigned {day}: {time_str}")
         
         # If we found opening hours in single-line format, return them
         if opening_hours:
-            print("=== END DEBUG ===")
+            logger.debug("=== END DEBUG ===")
             return opening_hours
     
     # Look for opening hours keywords in full text
@@ -257,16 +314,16 @@ def extract_opening_hours(soup):
             end = min(len(lines), i + 5)
             context_lines = lines[start:end]
             relevant_lines.extend(context_lines)
-            print(f"Found opening hours context around line {i}:")
+            logger.debug(f"Found opening hours context around line {i}:")
             for j, context_line in enumerate(context_lines):
-                print(f"  {start + j}: {context_line.strip()}")
+                logger.debug(f"  {start + j}: {context_line.strip()}")
             break
     
     # Also check footer specifically
     footer_elements = soup.find_all(['footer', '.footer', '#footer', '.contact', '.kontakt'])
     for footer in footer_elements:
         footer_text = footer.get_text()
-        print(f"Footer content: {footer_text}")
+        logger.debug(f"Footer content: {footer_text}")
         relevant_lines.extend(footer_text.split('\n'))
     
     # Look for the specific pattern from screenshot: "Mo - Fr: 10:00 - 13:00 Uhr & 14:00 - 18:00 Uhr"
@@ -287,11 +344,11 @@ def extract_opening_hours(soup):
         r'(mo|montag)\.?\s*bis\s*(sa|samstag)\.?[\s:]*(\d{1,2}):(\d{2})\s*bis\s*(\d{1,2}):(\d{2})',
     ]
     
-    print("Testing patterns on full text...")
+    logger.debug("Testing patterns on full text...")
     for i, pattern in enumerate(patterns_to_test):
         matches = re.findall(pattern, full_text_lower)
-        print(f"Pattern {i+1}: {pattern}")
-        print(f"Matches: {matches}")
+        logger.debug(f"Pattern {i+1}: {pattern}")
+        logger.debug(f"Matches: {matches}")
         
         if matches:
             match = matches[0]
@@ -299,10 +356,10 @@ def extract_opening_hours(soup):
             # Handle different match group lengths
             if len(match) >= 8:  # Double time range (&)
                 time_str = f"{match[0]}:{match[1]} - {match[2]}:{match[3]} & {match[4]}:{match[5]} - {match[6]}:{match[7]}"
-                print(f"SUCCESS: Found double time range: {time_str}")
+                logger.debug(f"SUCCESS: Found double time range: {time_str}")
                 for day in ['montag', 'dienstag', 'mittwoch', 'donnerstag', 'freitag']:
                     opening_hours[day] = time_str
-                print("=== END DEBUG ===")
+                logger.debug("=== END DEBUG ===")
                 return opening_hours
             elif len(match) >= 6:  # Day range with bis (Mo bis Sa)
                 # Extract time from the match
@@ -313,11 +370,11 @@ def extract_opening_hours(soup):
                     end_hour = match[4] if len(match) > 4 else match[-2]
                     end_min = match[5] if len(match) > 5 else match[-1]
                     time_str = f"{start_hour}:{start_min} - {end_hour}:{end_min}"
-                    print(f"SUCCESS: Found Mo bis Sa range: {time_str}")
+                    logger.debug(f"SUCCESS: Found Mo bis Sa range: {time_str}")
                     # Apply to all days Monday to Saturday
                     for day in ['montag', 'dienstag', 'mittwoch', 'donnerstag', 'freitag', 'samstag']:
                         opening_hours[day] = time_str
-                    print("=== END DEBUG ===")
+                    logger.debug("=== END DEBUG ===")
                     return opening_hours
             elif len(match) >= 4:  # Simple time range
                 start_hour = match[-4] if len(match) >= 4 else match[0]
@@ -325,7 +382,7 @@ def extract_opening_hours(soup):
                 end_hour = match[-2] if len(match) >= 4 else match[2]
                 end_min = match[-1] if len(match) >= 4 else match[3]
                 time_str = f"{start_hour}:{start_min} - {end_hour}:{end_min}"
-                print(f"SUCCESS: Found simple time range: {time_str}")
+                logger.debug(f"SUCCESS: Found simple time range: {time_str}")
                 # Check if this is a Mo bis Sa pattern by looking at the original text
                 if 'mo' in full_text_lower and 'bis' in full_text_lower and 'sa' in full_text_lower:
                     for day in ['montag', 'dienstag', 'mittwoch', 'donnerstag', 'freitag', 'samstag']:
@@ -333,12 +390,12 @@ def extract_opening_hours(soup):
                 else:
                     for day in ['montag', 'dienstag', 'mittwoch', 'donnerstag', 'freitag']:
                         opening_hours[day] = time_str
-                print("=== END DEBUG ===")
+                logger.debug("=== END DEBUG ===")
                 return opening_hours
     
     # Fallback to original logic if patterns don't work
-    print("No double patterns matched, falling back to original logic...")
-    print("=== END DEBUG ===")
+    logger.debug("No double patterns matched, falling back to original logic...")
+    logger.debug("=== END DEBUG ===")
     
     # German day names and their variations
     day_patterns = {
@@ -424,7 +481,7 @@ def extract_opening_hours(soup):
                         day = day.strip()
                         if day in day_patterns:
                             opening_hours[day] = formatted_time
-                            print(f"Found complex pattern for {day}: {formatted_time}")
+                            logger.debug(f"Found complex pattern for {day}: {formatted_time}")
                     break
             continue
             
@@ -554,6 +611,26 @@ def normalize_domain(domain):
     parsed = urlparse(domain)
     return parsed.netloc.lower()
 
+def results_query(fields=None):
+    """Build the base query for result listings.
+
+    With a ``fields`` projection only those columns are selected (username
+    via a join); otherwise full rows are loaded with their user eagerly.
+    Returns the query and a function serializing one item of it.
+    """
+    if fields:
+        query = project_query(SEOResult.query, SEOResult.projection_columns(), fields)
+        if 'username' in fields:
+            query = query.outerjoin(User, User.id == SEOResult.user_id)
+        decoders = SEOResult.projection_decoders()
+        return query, lambda row: row_to_dict(row, fields, decoders)
+    query = SEOResult.query.options(
+        joinedload(SEOResult.user),
+        undefer(SEOResult.raw_response_compressed),
+        undefer(SEOResult.raw_response_text)
+    )
+    return query, lambda result: result.to_dict()
+
 def parse_seo_response(response_text):
     """Parse the structured SEO response from GPT"""
     result = {
@@ -565,9 +642,9 @@ def parse_seo_response(response_text):
     }
     
     try:
-        print("=== PARSING DEBUG ===")
-        print(f"Response text length: {len(response_text)}")
-        print(f"First 500 chars: {response_text[:500]}")
+        logger.debug("=== PARSING DEBUG ===")
+        logger.debug(f"Response text length: {len(response_text)}")
+        logger.debug(f"First 500 chars: {response_text[:500]}")
         
         # Extract sections using regex patterns for the new format
         sections = {
@@ -593,16 +670,16 @@ def parse_seo_response(response_text):
             match = re.search(pattern, response_text, re.DOTALL | re.IGNORECASE)
             if match:
                 result[key] = match.group(1).strip()
-                print(f"Found {key} (new format): {result[key][:100]}...")
+                logger.debug(f"Found {key} (new format): {result[key][:100]}...")
             else:
                 # Try old format
                 old_pattern = sections[f'{key}_old']
                 match = re.search(old_pattern, response_text, re.DOTALL | re.IGNORECASE)
                 if match:
                     result[key] = match.group(1).strip()
-                    print(f"Found {key} (old format): {result[key][:100]}...")
+                    logger.debug(f"Found {key} (old format): {result[key][:100]}...")
                 else:
-                    print(f"No match found for {key}")
+                    logger.debug(f"No match found for {key}")
         
         # Additional parsing for Leistungen (services) if present
         services_pattern = r'Leistungen:\s*\n((?:–[^\n]+\n?)+)'
@@ -612,54 +689,18 @@ def parse_seo_response(response_text):
             # Append services to long description if found
             if result['long_description']:
                 result['long_description'] += f"\n\nLeistungen:\n{services}"
-            print(f"Found services: {services[:100]}...")
+            logger.debug(f"Found services: {services[:100]}...")
         
-        print("=== END PARSING DEBUG ===")
+        logger.debug("=== END PARSING DEBUG ===")
     
     except Exception as e:
-        print(f"Error parsing SEO response: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error parsing SEO response: {e}")
     
     return result
 
-@seo_bp.route('/analyze', methods=['POST'])
-def analyze_domain():
-    """Analyze a domain using OpenAI GPT-4"""
-    # Check authentication
-    if 'user_id' not in session:
-        return jsonify({'error': 'Authentication required'}), 401
-    
-    current_user = User.query.get(session['user_id'])
-    if not current_user:
-        session.clear()
-        return jsonify({'error': 'User not found'}), 404
-    
-    data = request.json
-    if not data or not data.get('domain'):
-        return jsonify({'error': 'Domain is required'}), 400
-    
-    domain = normalize_domain(data['domain'])
-    
-    # Check if analysis already exists for this domain
-    existing_result = SEOResult.query.filter_by(domain=domain).first()
-    if existing_result:
-        return jsonify({
-            'message': 'Analysis already exists for this domain',
-            'result': existing_result.to_dict()
-        }), 200
-    
-    # Crawl the website first
-    print(f"Crawling website: {domain}")
-    crawl_result = crawl_website(domain)
-    
-    if not crawl_result['success']:
-        return jsonify({
-            'error': f'Failed to crawl website: {crawl_result["error"]}'
-        }), 400
-    
-    # Prepare the GPT prompt with real website content
-    prompt = f"""ROLLE
+def build_analysis_prompt(crawl_result):
+    """Build the GPT prompt with the real website content"""
+    return f"""ROLLE
 Du bist ein erfahrener SEO-Texter und Experte für Google-Unternehmensprofile.
 
 ZIEL
@@ -735,83 +776,289 @@ Klare, informative und überzeugende Formulierungen. Qualität vor Quantität.
 
 Unternehmenssprache beibehalten: „Wir" statt dritte Person."""
 
+# Chat completion settings of an analysis
+ANALYSIS_OPTIONS = {
+    'model': 'gpt-4',
+    'max_tokens': 2000,
+    'temperature': 0.7
+}
+
+def analysis_messages(prompt):
+    return [
+        {"role": "system", "content": "Du bist ein erfahrener SEO-Experte und Texter für Google-Unternehmensprofile."},
+        {"role": "user", "content": prompt}
+    ]
+
+def existing_analysis(domain):
+    """Stored result of ``domain`` as a dict, or None"""
+    existing_result = SEOResult.query.filter_by(domain=domain).first()
+    return existing_result.to_dict() if existing_result else None
+
+def store_analysis(domain, raw_response, user_id, timer=None):
+    """Parse and save a GPT response; returns the response payload and status"""
+    # Parse the structured response
+    with stage(timer, 'parse_response'):
+        parsed_data = parse_seo_response(raw_response)
+    
+    # Save to database
+    seo_result = SEOResult(
+        domain=domain,
+        short_description=parsed_data['short_description'],
+        long_description=parsed_data['long_description'],
+        keywords=parse_keywords(parsed_data['keywords']),
+        opening_hours=parsed_data['opening_hours'],
+        company_info=parse_company_info(parsed_data['company_info']),
+        raw_response=raw_response,
+        user_id=user_id
+    )
+    
+    db.session.add(seo_result)
+    try:
+        with stage(timer, 'db'):
+            db.session.commit()
+    except IntegrityError:
+        # Another request stored this domain while we were analyzing it
+        db.session.rollback()
+        existing = existing_analysis(domain)
+        if not existing:
+            raise
+        return {
+            'message': 'Analysis already exists for this domain',
+            'result': existing
+        }, 200
+    
+    return {
+        'message': 'Domain analysis completed successfully',
+        'result': seo_result.to_dict()
+    }, 201
+
+def timed_lookup(timer, domain):
+    with timer.stage('lookup'):
+        return existing_analysis(domain)
+
+def timed_response(timer, payload, status):
+    """JSON response with the stage timings in a ``Server-Timing`` header"""
+    response = jsonify(payload)
+    response.headers['Server-Timing'] = timer.server_timing()
+    return response, status
+
+@seo_bp.route('/analyze', methods=['POST'])
+@login_required
+@admission_required('analyze')
+def analyze_domain():
+    """Analyze a domain using OpenAI GPT-4"""
+    current_user = current_principal()
+    
+    data = request.json
+    if not data or not data.get('domain'):
+        return jsonify({'error': 'Domain is required'}), 400
+    
+    domain = normalize_domain(data['domain'])
+    timer = StageTimer()
+    
+    # Check if analysis already exists for this domain
+    with timer.stage('lookup'):
+        existing = existing_analysis(domain)
+    if existing:
+        return timed_response(timer, {
+            'message': 'Analysis already exists for this domain',
+            'result': existing
+        }, 200)
+    
+    # Crawl the website first
+    logger.info(f"Crawling website: {domain}")
+    crawl_result = crawl_website(domain, timer)
+    
+    if not crawl_result['success']:
+        record_analysis(timer, domain, current_user.id, 'crawl_failed')
+        return timed_response(timer, {
+            'error': f'Failed to crawl website: {crawl_result["error"]}'
+        }, 400)
+    
+    prompt = build_analysis_prompt(crawl_result)
+
     try:
         # Call OpenAI API
-        import os
         api_key = os.environ.get('OPENAI_API_KEY')
         if not api_key:
             return jsonify({'error': 'OpenAI API key not configured'}), 500
         
+        import openai
         client = openai.OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Du bist ein erfahrener SEO-Experte und Texter für Google-Unternehmensprofile."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=2000,
-            temperature=0.7
-        )
+        with track_call('llm'), timer.stage('llm'):
+            response = client.chat.completions.create(messages=analysis_messages(prompt), **ANALYSIS_OPTIONS)
+        timer.record_usage(response)
         
         raw_response = response.choices[0].message.content
+        payload, status = store_analysis(domain, raw_response, current_user.id, timer)
+        record_analysis(timer, domain, current_user.id, 'ok', payload['result']['id'])
+        return timed_response(timer, payload, status)
         
-        # Parse the structured response
-        parsed_data = parse_seo_response(raw_response)
+    except Exception as e:
+        logger.exception(f"SEO Analysis Error: {str(e)}")
+        db.session.rollback()
+        record_analysis(timer, domain, current_user.id, 'failed')
+        return timed_response(timer, {'error': f'Analysis failed: {str(e)}'}, 500)
+
+async def crawl_website_async(url, timer=None):
+    """Async ``crawl_website``: fetch with httpx, parse on the thread pool"""
+    import httpx
+    url = crawl_url(url)
+    address = resolve_address(url)
+    if timer is not None and address is not None:
+        with timer.stage('dns'):
+            try:
+                await asyncio.get_running_loop().getaddrinfo(*address, type=socket.SOCK_STREAM)
+            except (OSError, UnicodeError):
+                pass
+    try:
+        with track_call('crawl'), stage(timer, 'download'):
+            response = await http_client().get(url, headers=CRAWL_HEADERS, timeout=CRAWL_TIMEOUT)
+            response.raise_for_status()
+    except httpx.HTTPError as e:
+        return {
+            'url': url,
+            'error': f'Failed to fetch website: {str(e)}',
+            'success': False
+        }
+    if timer is not None:
+        timer.bytes_fetched = len(response.content)
+    # Parsing is CPU work, keep it off the event loop
+    return await run_sync(parse_website, url, response.content, timer)
+
+@async_login_required
+@async_admission_required('analyze')
+async def analyze_domain_async(request):
+    """``analyze_domain`` for the ASGI stack (see src/asgi.py).
+
+    The lookup of an existing result and the crawl run concurrently; the
+    crawl is cancelled if the domain was analyzed before.
+    """
+    data = request.json
+    if not data or not data.get('domain'):
+        return {'error': 'Domain is required'}, 400
+    
+    domain = normalize_domain(data['domain'])
+    user_id = request.principal.id
+    timer = StageTimer()
+    
+    logger.info(f"Crawling website: {domain}")
+    lookup = asyncio.ensure_future(run_sync(timed_lookup, timer, domain))
+    crawl = asyncio.ensure_future(crawl_website_async(domain, timer))
+    try:
+        existing = await lookup
+    except BaseException:
+        crawl.cancel()
+        raise
+    if existing:
+        crawl.cancel()
+        return {
+            'message': 'Analysis already exists for this domain',
+            'result': existing
+        }, 200, {'Server-Timing': timer.server_timing()}
+    
+    crawl_result = await crawl
+    if not crawl_result['success']:
+        await run_sync(record_analysis, timer, domain, user_id, 'crawl_failed')
+        return {
+            'error': f'Failed to crawl website: {crawl_result["error"]}'
+        }, 400, {'Server-Timing': timer.server_timing()}
+    
+    prompt = build_analysis_prompt(crawl_result)
+
+    try:
+        if not os.environ.get('OPENAI_API_KEY'):
+            return {'error': 'OpenAI API key not configured'}, 500
         
-        # Save to database
-        seo_result = SEOResult(
-            domain=domain,
-            short_description=parsed_data['short_description'],
-            long_description=parsed_data['long_description'],
-            keywords=parsed_data['keywords'],
-            opening_hours=parsed_data['opening_hours'],
-            company_info=parsed_data['company_info'],
-            raw_response=raw_response,
-            user_id=current_user.id
-        )
-        
-        db.session.add(seo_result)
-        db.session.commit()
+        with track_call('llm'), timer.stage('llm'):
+            response = await openai_client().chat.completions.create(
+                messages=analysis_messages(prompt), **ANALYSIS_OPTIONS
+            )
+        timer.record_usage(response)
         
-        return jsonify({
-            'message': 'Domain analysis completed successfully',
-            'result': seo_result.to_dict()
-        }), 201
+        raw_response = response.choices[0].message.content
+        payload, status = await run_sync(store_analysis, domain, raw_response, user_id, timer)
+        await run_sync(record_analysis, timer, domain, user_id, 'ok', payload['result']['id'])
+        return payload, status, {'Server-Timing': timer.server_timing()}
         
     except Exception as e:
-        print(f"SEO Analysis Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
+        logger.exception(f"SEO Analysis Error: {str(e)}")
+        await run_sync(record_analysis, timer, domain, user_id, 'failed')
+        return {'error': f'Analysis failed: {str(e)}'}, 500, {'Server-Timing': timer.server_timing()}
+
+def result_scopes(principal):
+    """Data versions the results endpoints depend on (usernames are part of the results)"""
+    owner = 'seo_result:all' if principal.is_admin else f'seo_result:user:{principal.id}'
+    return [owner, 'seo_result:bulk', 'user:all']
 
 @seo_bp.route('/results', methods=['GET'])
+@login_required
+@admission_required('read')
+@conditional(result_scopes)
 def get_results():
     """Get SEO results with optional search and filtering"""
-    # Check authentication
-    if 'user_id' not in session:
-        return jsonify({'error': 'Authentication required'}), 401
-    
-    current_user = User.query.get(session['user_id'])
-    if not current_user:
-        session.clear()  # Clear invalid session
-        return jsonify({'error': 'User not found'}), 401
+    current_user = current_principal()
     
     # Get query parameters
     search = request.args.get('search', '').strip()
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
-    
-    # Build query
-    query = SEOResult.query
+    try:
+        fields = parse_fields(request.args.get('fields'), SEOResult.projection_columns())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    cursor = request.args.get('cursor')
+    if cursor is not None and fields and 'created_at' not in fields:
+        # Cursor pagination keys on (created_at, id)
+        fields.append('created_at')
+    
+    query, serialize = results_query(fields)
+    
+    # Ranked full-text search over domain, descriptions, keywords and Impressum
+    if search and fts_available():
+        if cursor is not None:
+            return jsonify({'error': 'Cursor pagination is not supported for search'}), 400
+        user_id = None if current_user.role == 'admin' else current_user.id
+        hits, total = search_results(search, user_id=user_id, page=page, per_page=per_page)
+        rows = {r.id: r for r in query.filter(SEOResult.id.in_([h[0] for h in hits])).all()}
+        results = []
+        for result_id, snippet, rank in hits:
+            if result_id in rows:
+                item = serialize(rows[result_id])
+                item['snippet'] = snippet
+                item['rank'] = rank
+                results.append(item)
+        return jsonify({
+            'results': results,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page if per_page > 0 else 0,
+            'current_page': page,
+            'per_page': per_page
+        }), 200
     
     # If not admin, only show user's own results
     if current_user.role != 'admin':
-        query = query.filter_by(user_id=current_user.id)
+        query = query.filter(SEOResult.user_id == current_user.id)
     
-    # Apply search filter
+    # Apply search filter (fallback for databases without FTS)
     if search:
         query = query.filter(SEOResult.domain.contains(search))
     
+    # Keyset pagination: constant cost per page, optional totals
+    if cursor is not None:
+        try:
+            items, next_cursor = keyset_page(query, SEOResult, per_page, cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        cache_key = ('seo_results', None if current_user.role == 'admin' else current_user.id, search)
+        return jsonify({
+            'results': [serialize(result) for result in items],
+            'next_cursor': next_cursor,
+            'total': count_total(query, request.args.get('total'), cache_key),
+            'per_page': per_page
+        }), 200
+    
     # Order by creation date (newest first)
     query = query.order_by(SEOResult.created_at.desc())
     
@@ -823,7 +1070,7 @@ def get_results():
     )
     
     return jsonify({
-        'results': [result.to_dict() for result in results.items],
+        'results': [serialize(result) for result in results.items],
         'total': results.total,
         'pages': results.pages,
         'current_page': page,
@@ -831,16 +1078,12 @@ def get_results():
     }), 200
 
 @seo_bp.route('/results/<int:result_id>', methods=['GET'])
+@login_required
+@admission_required('read')
+@conditional(result_scopes)
 def get_result(result_id):
     """Get specific SEO result"""
-    # Check authentication
-    if 'user_id' not in session:
-        return jsonify({'error': 'Authentication required'}), 401
-    
-    current_user = User.query.get(session['user_id'])
-    if not current_user:
-        session.clear()
-        return jsonify({'error': 'User not found'}), 404
+    current_user = current_principal()
     
     result = SEOResult.query.get_or_404(result_id)
     
@@ -851,43 +1094,114 @@ def get_result(result_id):
     return jsonify(result.to_dict()), 200
 
 @seo_bp.route('/results/<int:result_id>', methods=['DELETE'])
+@admin_required
 def delete_result(result_id):
     """Delete SEO result (admin only)"""
-    if not require_admin():
-        return jsonify({'error': 'Admin access required'}), 403
-    
     result = SEOResult.query.get_or_404(result_id)
     db.session.delete(result)
     db.session.commit()
     
     return '', 204
 
+# Longest window of the stage statistics (hours)
+STATS_MAX_HOURS = 24 * 90
+
+@seo_bp.route('/stats/stages', methods=['GET'])
+@admin_required
+def get_stage_stats():
+    """Percentiles per analysis stage over the last ?hours= (default 24, admin only)"""
+    try:
+        hours = float(request.args.get('hours', 24))
+    except ValueError:
+        return jsonify({'error': 'hours must be a number'}), 400
+    if not 0 < hours <= STATS_MAX_HOURS:
+        return jsonify({'error': f'hours must be between 0 and {STATS_MAX_HOURS}'}), 400
+    return jsonify(stage_percentiles(hours)), 200
+
+# Columns exported when no ?fields= is given (raw GPT output is opt-in)
+EXPORT_FIELDS = ['id', 'domain', 'short_description', 'long_description', 'keywords',
+                 'opening_hours', 'company_info', 'created_at', 'user_id', 'username']
+
+# Rows fetched per round-trip while streaming an export
+EXPORT_BATCH_SIZE = 1000
+
+def parse_export_date(value, end=False):
+    """Parse a YYYY-MM-DD (or ISO datetime) filter; date-only ``end`` values include the whole day"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+@seo_bp.route('/export', methods=['GET'])
+@admin_required
+def export_results():
+    """Stream all SEO results as CSV, NDJSON or XLSX (admin only)"""
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ENCODERS:
+        return jsonify({'error': f"Unsupported format: {export_format}"}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'), SEOResult.projection_columns()) or EXPORT_FIELDS
+        date_from = parse_export_date(request.args.get('from'))
+        date_to = parse_export_date(request.args.get('to'), end=True)
+        user_id = request.args.get('user_id', type=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query, serialize = results_query(fields)
+    if user_id is not None:
+        query = query.filter(SEOResult.user_id == user_id)
+    if date_from:
+        query = query.filter(SEOResult.created_at >= date_from)
+    if date_to:
+        query = query.filter(SEOResult.created_at < date_to)
+    domain = request.args.get('domain', '').strip().lower()
+    if domain:
+        query = query.filter(SEOResult.domain.contains(domain))
+    
+    # Server-side cursor: rows are fetched and encoded batch by batch
+    query = query.order_by(SEOResult.id).yield_per(EXPORT_BATCH_SIZE)
+    rows = (serialize(row) for row in query)
+    chunks = ENCODERS[export_format](rows, fields)
+    
+    mimetype, extension = FORMATS[export_format]
+    filename = f"seo-profile-{datetime.utcnow():%Y%m%d-%H%M%S}.{extension}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if request.args.get('gzip') in ('1', 'true'):
+        chunks = gzip_chunks(chunks)
+        headers['Content-Disposition'] = f'attachment; filename="{filename}.gz"'
+        mimetype = 'application/gzip'
+    
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
 @seo_bp.route('/domains/autocomplete', methods=['GET'])
+@login_required
+@admission_required('read')
 def autocomplete_domains():
     """Get domain suggestions for autocomplete"""
-    # Check authentication
-    if 'user_id' not in session:
-        return jsonify({'error': 'Authentication required'}), 401
-    
-    current_user = User.query.get(session['user_id'])
-    if not current_user:
-        session.clear()
-        return jsonify({'error': 'User not found'}), 404
+    current_user = current_principal()
     
     search = request.args.get('q', '').strip()
     
     if not search:
         return jsonify([]), 200
     
-    # Build query
-    query = SEOResult.query
-    
     # If not admin, only show user's own results
-    if current_user.role != 'admin':
-        query = query.filter_by(user_id=current_user_id)
+    user_id = None if current_user.role == 'admin' else current_user.id
+    
+    # Serve from the in-memory index once it is built
+    domains = domain_index.search(search, user_id=user_id, limit=10)
+    if domains is not None:
+        return jsonify(domains), 200
+    
+    # Index still cold: query the database
+    query = SEOResult.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
     
     # Filter by domain containing search term
-    domains = query.filter(SEOResult.domain.contains(search)).with_entities(SEOResult.domain).distinct().limit(10).all()
+    domains = query.filter(SEOResult.domain.contains(search.lower())).with_entities(SEOResult.domain).order_by(SEOResult.domain).limit(10).all()
     
     return jsonify([domain[0] for domain in domains]), 200
 
@@ -1,30 +1,22 @@
-from flask import Blueprint, jsonify, request, session
+from flask import Blueprint, jsonify, request
 from src.models.user import User, db
+from src.models.image import GeneratedImage, ImageJob
+from src.services import image_store
+from src.services.principal import admin_required, invalidate_principal
 
 user_bp = Blueprint('user', __name__)
 
-def require_admin():
-    """Helper function to check if current user is admin"""
-    if 'user_id' not in session:
-        return False
-    current_user = User.query.get(session['user_id'])
-    return current_user and current_user.role == 'admin'
-
 @user_bp.route('/users', methods=['GET'])
+@admin_required
 def get_users():
     """Get all users (admin only)"""
-    if not require_admin():
-        return jsonify({'error': 'Admin access required'}), 403
-    
     users = User.query.all()
     return jsonify([user.to_dict() for user in users])
 
 @user_bp.route('/users', methods=['POST'])
+@admin_required
 def create_user():
     """Create new user (admin only)"""
-    if not require_admin():
-        return jsonify({'error': 'Admin access required'}), 403
-    
     data = request.json
     
     if not data or not all(k in data for k in ['username', 'email', 'password']):
@@ -49,20 +41,16 @@ def create_user():
     return jsonify(user.to_dict()), 201
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
+@admin_required
 def get_user(user_id):
     """Get specific user (admin only)"""
-    if not require_admin():
-        return jsonify({'error': 'Admin access required'}), 403
-    
     user = User.query.get_or_404(user_id)
     return jsonify(user.to_dict())
 
 @user_bp.route('/users/<int:user_id>', methods=['PUT'])
+@admin_required
 def update_user(user_id):
     """Update user (admin only)"""
-    if not require_admin():
-        return jsonify({'error': 'Admin access required'}), 403
-    
     user = User.query.get_or_404(user_id)
     data = request.json
     
@@ -84,14 +72,13 @@ def update_user(user_id):
         user.set_password(data['password'])
     
     db.session.commit()
+    invalidate_principal(user.id)
     return jsonify(user.to_dict())
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
+@admin_required
 def delete_user(user_id):
     """Delete user (admin only)"""
-    if not require_admin():
-        return jsonify({'error': 'Admin access required'}), 403
-    
     user = User.query.get_or_404(user_id)
     
     # Prevent deleting the last admin
@@ -100,6 +87,16 @@ def delete_user(user_id):
         if admin_count <= 1:
             return jsonify({'error': 'Cannot delete the last admin user'}), 400
     
+    # Remove the user's images with them; files go once unreferenced
+    images = GeneratedImage.query.filter_by(user_id=user_id).all()
+    refs = [image_store.image_refs(image) for image in images]
+    for image in images:
+        db.session.delete(image)
+    ImageJob.query.filter_by(user_id=user_id).delete()
+    
     db.session.delete(user)
     db.session.commit()
+    invalidate_principal(user_id)
+    for content_hash, urls in refs:
+        image_store.release(content_hash, urls)
     return '', 204
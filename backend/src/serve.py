@@ -0,0 +1,285 @@
+"""Production entry point: runs the app under gunicorn.
+
+Worker model and tuning come from the environment, command line flags
+override them::
+
+    python src/serve.py                          # SERVER_WORKER_CLASS etc.
+    python src/serve.py --worker-class gevent --workers 2
+
+Worker models:
+
+* ``sync``: one request per process (gunicorn default),
+* ``gthread``: a thread pool per process (``SERVER_THREADS``),
+* ``gevent`` / ``eventlet``: greenlets, outbound HTTP (crawling, OpenAI)
+  yields instead of blocking a worker (``SERVER_WORKER_CONNECTIONS``),
+* ``asgi``: uvicorn workers; analyze and image generation are async
+  (``src/asgi.py``), the other routes run on ``SERVER_THREADS`` threads,
+* ``dev``: the Flask development server (single process, no gunicorn).
+
+The master creates tables and runs migrations once before starting the
+workers and gives them a shared ``METRICS_DIR`` for ``/metrics``. With
+``SERVER_PRELOAD`` the app is built once in the master and forked;
+database connections and background threads are then set up per worker.
+Besides ``SERVER_MAX_REQUESTS``, ``SERVER_MAX_RSS_MB`` recycles a worker
+whose memory grew past the limit. The number of analyses a worker runs
+and queues follows its model (``src/services/admission.py``).
+
+Work per deploy stays in the master as well: the schema check (skipped
+entirely while the schema fingerprint matches, see
+``src/models/storage.py``) and precompressing the React bundle. Workers
+import openai, requests and bs4 only when needed and warm them up in the
+background after boot (``src/services/warmup.py``).
+"""
+import os
+import sys
+import signal
+import logging
+import argparse
+
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+logger = logging.getLogger(__name__)
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'gevent': 'gevent',
+    'eventlet': 'eventlet',
+    'asgi': 'uvicorn.workers.UvicornWorker',
+}
+
+# Packages a worker model needs besides gunicorn
+WORKER_REQUIREMENTS = {
+    'gevent': ['gevent'],
+    'eventlet': ['eventlet'],
+    'asgi': ['uvicorn'],
+}
+
+
+def _env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def parse_args(argv=None):
+    """Server settings from the environment, overridden by ``argv``"""
+    parser = argparse.ArgumentParser(description='Run the SEO profile generator')
+    parser.add_argument('--worker-class', choices=sorted(WORKER_CLASSES) + ['dev'],
+                        default=os.environ.get('SERVER_WORKER_CLASS', 'gthread'))
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=_env_int('PORT', 5000))
+    parser.add_argument('--workers', type=int, default=_env_int('WEB_CONCURRENCY', 2))
+    parser.add_argument('--threads', type=int, default=_env_int('SERVER_THREADS', 4))
+    parser.add_argument('--worker-connections', type=int,
+                        default=_env_int('SERVER_WORKER_CONNECTIONS', 100))
+    parser.add_argument('--timeout', type=int, default=_env_int('SERVER_TIMEOUT', 120))
+    parser.add_argument('--graceful-timeout', type=int, default=_env_int('SERVER_GRACEFUL_TIMEOUT', 30))
+    parser.add_argument('--keepalive', type=int, default=_env_int('SERVER_KEEPALIVE', 5))
+    parser.add_argument('--max-requests', type=int, default=_env_int('SERVER_MAX_REQUESTS', 1000))
+    parser.add_argument('--max-requests-jitter', type=int,
+                        default=_env_int('SERVER_MAX_REQUESTS_JITTER', 100))
+    parser.add_argument('--max-rss-mb', type=int, default=_env_int('SERVER_MAX_RSS_MB', 0),
+                        help='Restart a worker whose memory exceeds this after a request (0 = never)')
+    parser.add_argument('--preload', action=argparse.BooleanOptionalAction,
+                        default=_env_bool('SERVER_PRELOAD'))
+    parser.add_argument('--log-level', default=os.environ.get('SERVER_LOG_LEVEL', 'info'))
+    return parser.parse_args(argv)
+
+
+def _require(worker_class):
+    """Exit with a readable message if the packages for ``worker_class`` are missing"""
+    missing = []
+    for module in ['gunicorn'] + WORKER_REQUIREMENTS.get(worker_class, []):
+        try:
+            __import__(module)
+        except ImportError:
+            missing.append(module)
+    if missing:
+        sys.exit(f"Worker class '{worker_class}' needs: pip install {' '.join(missing)}")
+
+
+def _monkey_patch(worker_class):
+    """Patch the stdlib before anything opens sockets (needed when preloading)"""
+    if worker_class == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+    elif worker_class == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+
+
+def gunicorn_options(args):
+    """gunicorn settings for ``args``"""
+    options = {
+        'bind': f"{args.host}:{args.port}",
+        'workers': args.workers,
+        'worker_class': WORKER_CLASSES[args.worker_class],
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': args.keepalive,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests_jitter,
+        'preload_app': args.preload,
+        'loglevel': args.log_level,
+        # Access lines come from the app (JSON, sampled; src/services/access_log.py)
+        'accesslog': None,
+        'errorlog': '-',
+    }
+    if args.worker_class == 'gthread':
+        options['threads'] = args.threads
+    if args.worker_class in ('gevent', 'eventlet'):
+        options['worker_connections'] = args.worker_connections
+    return options
+
+
+def load_app(args):
+    """Build the application callable for the worker model"""
+    from src.main import create_app
+    from src.services import admission, change_feed
+    # Concurrent analyses and waiting change feeds per worker, leaving room for the cheap endpoints
+    admission.configure(args.worker_class, args.threads, args.worker_connections)
+    change_feed.configure(args.worker_class, args.threads, args.worker_connections)
+    # Preloaded apps start their background threads after the fork;
+    # the schema was already set up by prepare_database in the master
+    return wrap_app(create_app(start_services=not args.preload, setup_schema=False), args)
+
+
+def wrap_app(app, args):
+    """Adapt the Flask app to the worker model (ASGI needs an adapter)"""
+    if args.worker_class != 'asgi':
+        return app
+    # Async analyze/generate endpoints, the rest of the app on SERVER_THREADS threads
+    from src.asgi import create_asgi_app
+    return create_asgi_app(app, args.threads)
+
+
+def prepare_database():
+    """Create tables and run migrations once, before any worker starts"""
+    from flask import Flask
+    from src.models.user import db
+    from src.models.storage import init_database, init_schema
+    app = Flask(__name__)
+    init_database(app)
+    with app.app_context():
+        init_schema()
+        db.engine.dispose()
+
+
+def prepare_static():
+    """Precompress the React bundle once, so workers load the variants instead of compressing"""
+    from src.services.static_manifest import precompress
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    if not os.path.isdir(root):
+        return
+    try:
+        written = precompress(root)
+    except OSError as e:
+        # Read-only bundle: every worker compresses in memory instead
+        logger.warning(f"Could not precompress static files: {str(e)}")
+        return
+    if written:
+        logger.info(f"Precompressed {written} static file variants")
+
+
+def prepare_uploads():
+    """Adopt images of the former default upload directories once, before any worker starts"""
+    from src.services import image_store
+    image_store.adopt_legacy_uploads()
+
+
+def prepare_metrics_dir():
+    """Give the workers a shared, empty METRICS_DIR so /metrics covers all of them"""
+    directory = os.environ.get('METRICS_DIR')
+    if not directory:
+        import tempfile
+        directory = os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='seo-metrics-')
+    os.makedirs(directory, exist_ok=True)
+    # Values of a previous server run are stale
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            os.remove(os.path.join(directory, name))
+
+
+def _post_fork(server, worker):
+    """Give each forked worker its own connections and background threads"""
+    from src.main import start_background_services
+    from src.models.user import db
+    app = server.app.flask_app
+    with app.app_context():
+        # Connections opened in the master must not be shared across processes
+        db.engine.dispose(close=False)
+    start_background_services(app)
+
+
+def _rss_limit_hook(max_rss_mb):
+    """post_worker_init hook restarting the worker gracefully above ``max_rss_mb``"""
+    def post_worker_init(worker):
+        from src.services import memory
+        # SIGTERM: gunicorn (and uvicorn) finish in-flight requests, the master forks a new worker
+        memory.enable_recycling(max_rss_mb * 2 ** 20, lambda: os.kill(os.getpid(), signal.SIGTERM))
+    return post_worker_init
+
+
+def configure_logging():
+    """The app's log format (src/main.py) for the master, which logs before importing the app"""
+    logging.basicConfig(
+        level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        stream=sys.stdout
+    )
+
+
+def run(args):
+    if args.worker_class == 'dev':
+        from src.main import create_app
+        create_app().run(host=args.host, port=args.port, debug=False, threaded=True)
+        return
+
+    _require(args.worker_class)
+    prepare_metrics_dir()
+    prepare_static()
+    prepare_uploads()
+    if args.preload:
+        _monkey_patch(args.worker_class)
+    prepare_database()
+
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            self.application = None
+            self.flask_app = None
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+            if args.preload:
+                self.cfg.set('post_fork', _post_fork)
+            if args.max_rss_mb:
+                self.cfg.set('post_worker_init', _rss_limit_hook(args.max_rss_mb))
+
+        def load(self):
+            if self.application is None:
+                self.application = load_app(args)
+                # The Flask app behind an ASGI adapter
+                self.flask_app = getattr(self.application, 'wsgi_application', self.application)
+            return self.application
+
+    logger.info(f"Starting {args.worker_class} server on {args.host}:{args.port} "
+                f"({args.workers} workers, preload={args.preload})")
+    Server(gunicorn_options(args)).run()
+
+
+if __name__ == '__main__':
+    configure_logging()
+    run(parse_args())
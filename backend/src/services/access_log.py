@@ -0,0 +1,178 @@
+"""Request instrumentation: JSON access log lines and HTTP metrics.
+
+Every request is measured from the first byte handed to the app until its
+body is fully sent (streamed exports included) and recorded in the
+``http_*`` metrics. One JSON line per request goes to the ``access``
+logger::
+
+    {"ts": "...", "method": "GET", "path": "/api/seo/results", "route": "/api/seo/results",
+     "status": 200, "duration_ms": 12.4, "bytes": 5321, "remote_addr": "...", "user_id": 1,
+     "rss_mb": 182.4}
+
+``rss_mb`` is the worker's resident memory after the request
+(``src/services/memory.py``).
+
+``ACCESS_LOG_SAMPLE_RATE`` (0-1) keeps only a share of the lines; server
+errors and requests slower than ``ACCESS_LOG_SLOW_MS`` are always logged.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+from datetime import datetime, timezone
+from flask import Response, g, request
+from src.services import memory, metrics
+
+ACCESS_LOG_SAMPLE_RATE = float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', 1))
+ACCESS_LOG_SLOW_MS = float(os.environ.get('ACCESS_LOG_SLOW_MS', 1000))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Label for requests that matched no route (keeps label values bounded)
+UNMATCHED_ROUTE = 'unmatched'
+
+access_logger = logging.getLogger('access')
+
+
+class JsonFormatter(logging.Formatter):
+    """Log records as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+        }
+        if isinstance(record.msg, dict):
+            entry.update(record.msg)
+        else:
+            entry['message'] = record.getMessage()
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging():
+    """JSON lines for the access log (stdout, not propagated to the root logger)"""
+    if access_logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    access_logger.addHandler(handler)
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
+
+
+def record_request(method, path, route, status, duration, size=None, remote_addr=None, user_id=None):
+    """Update the HTTP metrics and write the (sampled) access log line"""
+    metrics.http_requests.inc(method=method, route=route, status=str(status))
+    metrics.http_duration.observe(duration, method=method, route=route)
+    if status >= 500:
+        metrics.app_errors.inc(route=route)
+    rss = memory.after_request()
+    metrics.flush()
+
+    duration_ms = duration * 1000
+    if status < 500 and duration_ms < ACCESS_LOG_SLOW_MS and random.random() >= ACCESS_LOG_SAMPLE_RATE:
+        return
+    access_logger.info({
+        'method': method,
+        'path': path,
+        'route': route,
+        'status': status,
+        'duration_ms': round(duration_ms, 1),
+        'bytes': size,
+        'remote_addr': remote_addr,
+        'user_id': user_id,
+        'rss_mb': round(rss / 2 ** 20, 1),
+    })
+
+
+class _Body:
+    """Response iterable that records the request once the body is sent"""
+
+    def __init__(self, body, finish):
+        self._body = body
+        self._finish = finish
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self._body:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._finish(self.size)
+
+
+class InstrumentationMiddleware:
+    """WSGI middleware measuring each request around the Flask app"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        metrics.http_in_flight.inc()
+        state = {'status': 500, 'length': None}
+
+        def _start_response(status, headers, exc_info=None):
+            state['status'] = int(status.split(' ', 1)[0])
+            for name, value in headers:
+                if name.lower() == 'content-length':
+                    state['length'] = int(value)
+            return start_response(status, headers, exc_info)
+
+        def finish(size):
+            metrics.http_in_flight.dec()
+            record_request(
+                environ['REQUEST_METHOD'], environ.get('PATH_INFO', ''),
+                environ.get('app.route', UNMATCHED_ROUTE), state['status'],
+                time.perf_counter() - started, size,
+                environ.get('HTTP_X_FORWARDED_FOR', environ.get('REMOTE_ADDR')),
+                environ.get('app.user_id')
+            )
+
+        try:
+            body = self.wsgi_app(environ, _start_response)
+        except BaseException:
+            finish(None)
+            raise
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+            # Keep the server's sendfile path; the transfer itself is not timed
+            finish(state['length'])
+            return body
+        return _Body(body, finish)
+
+
+def metrics_view():
+    """Prometheus scrape endpoint (``Authorization: Bearer <METRICS_TOKEN>`` if set)"""
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    configure_logging()
+    app.wsgi_app = InstrumentationMiddleware(app.wsgi_app)
+
+    @app.before_request
+    def remember_route():
+        environ = request.environ
+        environ['app.route'] = request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE
+
+    @app.after_request
+    def remember_user(response):
+        # Only if the request resolved it anyway; reading the session here
+        # would add "Vary: Cookie" to every response
+        principal = g.get('principal')
+        request.environ['app.user_id'] = principal.id if principal else None
+        return response
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,378 @@
+"""Admission control for the API.
+
+Every budget has a per-user and a global token bucket (``rate`` tokens per
+minute, up to ``burst`` saved up); a request takes one token from each, an
+image request one per variant. Budgets:
+
+* ``analyze``: ``POST /api/seo/analyze`` (crawl plus a GPT call),
+* ``image``: ``POST /api/images/generate`` (charged per variant),
+* ``read``: the cheap GET endpoints, with a separate, generous per-user
+  bucket and no queue, so they keep working while the expensive budgets
+  are exhausted.
+
+Analyses are also limited in concurrency per worker process: up to
+``slots`` run at once, up to ``queue`` more wait at most
+``ADMISSION_QUEUE_TIMEOUT`` seconds for a slot. Image generation already
+runs in the bounded queue of ``image_jobs``. Everything that is turned away
+gets 429 with ``Retry-After``.
+
+Buckets of the expensive budgets live in the ``rate_limit_buckets`` table
+(``ADMISSION_STORE=database``, the default), so the limits hold across all
+worker processes; each take is a single conditional UPDATE. With
+``ADMISSION_STORE=memory`` every process keeps its own buckets (the limits
+then apply per worker). Read buckets are always kept in memory: a database
+write per read would cost more than the read. If the database store fails,
+requests are admitted.
+
+Settings per budget, ``<B>`` being ``ANALYZE``, ``IMAGE`` or ``READ``:
+``ADMISSION_<B>_USER_RATE`` / ``_USER_BURST`` / ``_GLOBAL_RATE`` /
+``_GLOBAL_BURST`` (0 disables a bucket), for analyses additionally
+``ADMISSION_ANALYZE_CONCURRENCY`` / ``ADMISSION_ANALYZE_QUEUE`` (default:
+derived from the worker model, see ``configure``).
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+from functools import wraps
+from flask import jsonify, request
+from sqlalchemy import func, select, update
+from src.models.user import db
+from src.models.rate_limit import RateLimitBucket
+from src.models.storage import dialect_insert
+from src.services import metrics
+from src.services.principal import current_principal
+from src.services.async_runtime import run_sync
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_STORE = os.environ.get('ADMISSION_STORE', 'database')
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 10))
+
+rejections = metrics.Counter('admission_rejections_total', 'Requests turned away with 429 per budget and reason')
+queue_waiting = metrics.Gauge('admission_queue_waiting', 'Requests waiting for an analysis slot')
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _env_int(name, default=None):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+class Rejected(Exception):
+    def __init__(self, budget, reason, message, retry_after):
+        super().__init__(message)
+        self.budget = budget
+        self.reason = reason
+        self.message = message
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class MemoryBucketStore:
+    """Token buckets of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> [tokens, updated_at]
+
+    def take(self, key, rate, burst, cost):
+        """Take ``cost`` tokens; returns 0 or the seconds until they are available"""
+        now = time.time()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            if tokens >= cost:
+                self._buckets[key] = [tokens - cost, now]
+                return 0
+            self._buckets[key] = [tokens, now]
+        return (cost - tokens) / rate
+
+    def give_back(self, key, burst, cost):
+        with self._lock:
+            if key in self._buckets:
+                self._buckets[key][0] = min(burst, self._buckets[key][0] + cost)
+
+
+class DatabaseBucketStore:
+    """Token buckets in ``rate_limit_buckets``, shared by all processes (needs an app context)"""
+
+    table = RateLimitBucket.__table__
+
+    def _least(self, *values):
+        # SQLite's two-argument min() is PostgreSQL's least()
+        return func.least(*values) if db.engine.dialect.name == 'postgresql' else func.min(*values)
+
+    def take(self, key, rate, burst, cost):
+        c = self.table.c
+        now = time.time()
+        tokens = self._least(burst, c.tokens + (now - c.updated_at) * rate)
+        with db.engine.begin() as conn:
+            for _ in range(2):
+                # Refill and take in one statement: atomic across processes
+                taken = conn.execute(update(self.table).where(c.key == key, tokens >= cost)
+                                     .values(tokens=tokens - cost, updated_at=now))
+                if taken.rowcount:
+                    return 0
+                available = conn.execute(select(tokens).where(c.key == key)).scalar()
+                if available is not None and available < cost:
+                    return (cost - available) / rate
+                if available is not None:
+                    continue  # Refilled by another process meanwhile
+                created = conn.execute(dialect_insert(self.table, conn.dialect)
+                                       .values(key=key, tokens=burst - cost, updated_at=now)
+                                       .on_conflict_do_nothing(index_elements=['key']))
+                if created.rowcount:
+                    return 0
+        return cost / rate
+
+    def give_back(self, key, burst, cost):
+        c = self.table.c
+        with db.engine.begin() as conn:
+            conn.execute(update(self.table).where(c.key == key).values(tokens=self._least(burst, c.tokens + cost)))
+
+
+class Budget:
+    def __init__(self, name, user_rate, user_burst, global_rate=0, global_burst=0, store=None):
+        prefix = f'ADMISSION_{name.upper()}'
+        self.name = name
+        # Rates are configured per minute and kept per second
+        self.user_rate = _env_float(f'{prefix}_USER_RATE', user_rate) / 60
+        self.user_burst = _env_float(f'{prefix}_USER_BURST', user_burst)
+        self.global_rate = _env_float(f'{prefix}_GLOBAL_RATE', global_rate) / 60
+        self.global_burst = _env_float(f'{prefix}_GLOBAL_BURST', global_burst)
+        self._store = store
+
+    @property
+    def store(self):
+        return self._store or (database_store if ADMISSION_STORE == 'database' else memory_store)
+
+    def buckets(self, user_id):
+        if self.user_rate and self.user_burst:
+            yield f'{self.name}:user:{user_id}', self.user_rate, self.user_burst, 'user'
+        if self.global_rate and self.global_burst:
+            yield f'{self.name}:global', self.global_rate, self.global_burst, 'global'
+
+    def admit(self, user_id, cost=1):
+        """Take ``cost`` tokens from the buckets of ``user_id``; raises Rejected.
+
+        Returns what was taken, for ``refund``.
+        """
+        taken = []
+        try:
+            for key, rate, burst, scope in self.buckets(user_id):
+                # A request larger than the burst could never pass
+                amount = min(cost, burst)
+                wait = self.store.take(key, rate, burst, amount)
+                if wait:
+                    self.refund(taken)
+                    message = ('Rate limit exceeded, please try again later' if scope == 'user'
+                               else 'Server is busy, please try again later')
+                    raise Rejected(self.name, f'{scope}_rate', message, wait)
+                taken.append((key, burst, amount))
+        except Rejected:
+            raise
+        except Exception as e:
+            logger.warning(f"Admission store failed, admitting request: {str(e)}")
+        return taken
+
+    def refund(self, taken):
+        """Return tokens of a request that was turned away after all"""
+        for key, burst, amount in taken:
+            self.store.give_back(key, burst, amount)
+
+
+class ConcurrencyLimit:
+    """At most ``slots`` holders at once, at most ``queue`` more waiting (threads)"""
+
+    def __init__(self, budget, slots, queue):
+        self.budget = budget
+        self.slots = slots
+        self.queue = queue
+        self.active = 0
+        self.waiting = 0
+        self.mean_seconds = 1.0
+        self._cond = threading.Condition()
+
+    def rejected(self, reason, message):
+        # Expected wait: the requests ahead of us, served ``slots`` at a time
+        return Rejected(self.budget, reason, message, self.mean_seconds * (self.waiting + 1) / self.slots)
+
+    def acquire(self, timeout):
+        with self._cond:
+            if self.active < self.slots:
+                self.active += 1
+                return
+            if self.waiting >= self.queue:
+                raise self.rejected('queue_full', 'Too many analyses in progress, please try again later')
+            self.waiting += 1
+            queue_waiting.inc()
+            try:
+                deadline = time.monotonic() + timeout
+                while self.active >= self.slots:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self.rejected('queue_timeout', 'Too many analyses in progress, please try again later')
+                    self._cond.wait(remaining)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+                queue_waiting.dec()
+
+    def release(self, seconds):
+        with self._cond:
+            self.active -= 1
+            self.mean_seconds = 0.8 * self.mean_seconds + 0.2 * seconds
+            self._cond.notify()
+
+
+class AsyncConcurrencyLimit(ConcurrencyLimit):
+    """``ConcurrencyLimit`` for coroutines on one event loop"""
+
+    def __init__(self, budget, slots, queue):
+        super().__init__(budget, slots, queue)
+        self._cond = None
+
+    async def acquire(self, timeout):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            if self.active < self.slots:
+                self.active += 1
+                return
+            if self.waiting >= self.queue:
+                raise self.rejected('queue_full', 'Too many analyses in progress, please try again later')
+            self.waiting += 1
+            queue_waiting.inc()
+            try:
+                await asyncio.wait_for(self._cond.wait_for(lambda: self.active < self.slots), timeout)
+            except asyncio.TimeoutError:
+                raise self.rejected('queue_timeout', 'Too many analyses in progress, please try again later')
+            finally:
+                self.waiting -= 1
+                queue_waiting.dec()
+            self.active += 1
+
+    async def release(self, seconds):
+        async with self._cond:
+            self.active -= 1
+            self.mean_seconds = 0.8 * self.mean_seconds + 0.2 * seconds
+            self._cond.notify()
+
+
+memory_store = MemoryBucketStore()
+database_store = DatabaseBucketStore()
+
+BUDGETS = {
+    'analyze': Budget('analyze', user_rate=6, user_burst=3, global_rate=60, global_burst=20),
+    'image': Budget('image', user_rate=8, user_burst=8, global_rate=60, global_burst=20),
+    'read': Budget('read', user_rate=600, user_burst=120, store=memory_store),
+}
+
+# Analysis slots per process, for threads and for the event loop (set by ``configure``)
+limits = {}
+async_limits = {}
+
+
+def default_slots(worker_class, threads=4, connections=100):
+    """(slots, queue) for analyses under a worker model.
+
+    With threads, a waiting request holds a thread as well: of the threads
+    beside the slots, one stays free for the cheap endpoints, the queue
+    takes half of the others and waiting change feeds the rest
+    (``change_feed.default_slots``).
+    """
+    if worker_class == 'sync':
+        return 1, 0
+    if worker_class in ('gevent', 'eventlet'):
+        return max(1, connections // 4), max(1, connections // 2)
+    if worker_class == 'asgi':
+        return 50, 100
+    slots = max(1, threads // 2)
+    spare = max(0, threads - slots - 1)
+    return slots, (spare + 1) // 2
+
+
+def configure(worker_class='gthread', threads=4, connections=100):
+    """Set up the analysis slots for the worker model (``src/serve.py``)"""
+    slots, queue = default_slots(worker_class, threads, connections)
+    slots = _env_int('ADMISSION_ANALYZE_CONCURRENCY', slots)
+    queue = _env_int('ADMISSION_ANALYZE_QUEUE', queue)
+    limits['analyze'] = ConcurrencyLimit('analyze', slots, queue)
+    async_limits['analyze'] = AsyncConcurrencyLimit('analyze', slots, queue)
+
+
+# Development server and plain WSGI use; src/serve.py configures its worker model
+configure()
+
+
+def rejection(e):
+    """Payload, status and headers of a 429 for ``e``"""
+    rejections.inc(budget=e.budget, reason=e.reason)
+    logger.debug(f"Admission rejected ({e.budget}, {e.reason}), retry after {e.retry_after}s")
+    return {'error': e.message, 'retry_after': e.retry_after}, 429, {'Retry-After': str(e.retry_after)}
+
+
+def admission_required(budget_name, cost=None):
+    """Admit a Flask view through ``budget_name`` (below ``login_required``).
+
+    ``cost(json_body)`` returns the tokens a request takes (default 1).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            budget = BUDGETS[budget_name]
+            limit = limits.get(budget_name)
+            try:
+                taken = budget.admit(current_principal().id, cost(request.get_json(silent=True)) if cost else 1)
+                if limit is not None:
+                    try:
+                        limit.acquire(ADMISSION_QUEUE_TIMEOUT)
+                    except Rejected:
+                        budget.refund(taken)
+                        raise
+            except Rejected as e:
+                payload, status, headers = rejection(e)
+                return jsonify(payload), status, headers
+            if limit is None:
+                return view(*args, **kwargs)
+            started = time.monotonic()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                limit.release(time.monotonic() - started)
+        return wrapper
+    return decorator
+
+
+def async_admission_required(budget_name, cost=None):
+    """Async counterpart of ``admission_required`` (below ``async_login_required``)"""
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapper(request):
+            budget = BUDGETS[budget_name]
+            limit = async_limits.get(budget_name)
+            try:
+                taken = await run_sync(budget.admit, request.principal.id, cost(request.json) if cost else 1)
+                if limit is not None:
+                    try:
+                        await limit.acquire(ADMISSION_QUEUE_TIMEOUT)
+                    except Rejected:
+                        await run_sync(budget.refund, taken)
+                        raise
+            except Rejected as e:
+                return rejection(e)
+            if limit is None:
+                return await handler(request)
+            started = time.monotonic()
+            try:
+                return await handler(request)
+            finally:
+                await limit.release(time.monotonic() - started)
+        return wrapper
+    return decorator
@@ -0,0 +1,135 @@
+"""Per-stage timing of domain analyses.
+
+``analyze_domain`` measures its stages with a ``StageTimer``::
+
+    lookup, dns, download, parse, opening_hours, llm, parse_response, db
+
+returns them in a ``Server-Timing`` header and keeps one ``AnalysisStats``
+row per analysis (stage durations, bytes fetched, prompt/completion
+tokens). ``stage_percentiles`` aggregates those rows for the admin
+endpoint ``GET /api/seo/stats/stages``.
+"""
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from src.models.user import db
+from src.models.analysis_stats import AnalysisStats
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class StageTimer:
+    """Durations (ms) of the stages of one analysis, in order of first use"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.bytes_fetched = None
+        self.prompt_tokens = None
+        self.completion_tokens = None
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def record_usage(self, response):
+        """Token counts of a chat completion response"""
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            self.prompt_tokens = usage.prompt_tokens
+            self.completion_tokens = usage.completion_tokens
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        """``Server-Timing`` header value, stages plus ``total``"""
+        entries = [f'{name};dur={ms:.1f}' for name, ms in self.stages.items()]
+        entries.append(f'total;dur={self.total_ms():.1f}')
+        return ', '.join(entries)
+
+
+def stage(timer, name):
+    """``timer.stage(name)``, or a no-op without a timer"""
+    if timer is None:
+        return _untimed()
+    return timer.stage(name)
+
+
+@contextmanager
+def _untimed():
+    yield
+
+
+def record_analysis(timer, domain, user_id, status, seo_result_id=None):
+    """Store the stats row of an analysis; failures are only logged"""
+    try:
+        db.session.add(AnalysisStats(
+            seo_result_id=seo_result_id,
+            user_id=user_id,
+            domain=domain,
+            status=status,
+            bytes_fetched=timer.bytes_fetched,
+            prompt_tokens=timer.prompt_tokens,
+            completion_tokens=timer.completion_tokens,
+            total_ms=round(timer.total_ms(), 1),
+            stages={name: round(ms, 1) for name, ms in timer.stages.items()}
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Could not store analysis stats for {domain}: {str(e)}")
+
+
+def _summary(values):
+    """count, mean, max and nearest-rank percentiles of ``values``"""
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+    summary = {'count': len(values), 'mean': round(sum(values) / len(values), 1)}
+    for p in PERCENTILES:
+        rank = max(1, -(-p * len(values) // 100))
+        summary[f'p{p}'] = values[rank - 1]
+    summary['max'] = values[-1]
+    return summary
+
+
+def stage_percentiles(hours):
+    """Percentiles per stage of the analyses of the last ``hours`` hours"""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    rows = db.session.query(
+        AnalysisStats.status, AnalysisStats.total_ms, AnalysisStats.stages,
+        AnalysisStats.bytes_fetched, AnalysisStats.prompt_tokens, AnalysisStats.completion_tokens
+    ).filter(AnalysisStats.created_at >= since).yield_per(1000)
+
+    by_status = {}
+    stages = {}
+    totals = []
+    sizes = {'bytes_fetched': [], 'prompt_tokens': [], 'completion_tokens': []}
+    for status, total_ms, row_stages, bytes_fetched, prompt_tokens, completion_tokens in rows:
+        by_status[status] = by_status.get(status, 0) + 1
+        totals.append(total_ms)
+        for name, ms in (row_stages or {}).items():
+            stages.setdefault(name, []).append(ms)
+        for name, value in (('bytes_fetched', bytes_fetched), ('prompt_tokens', prompt_tokens),
+                            ('completion_tokens', completion_tokens)):
+            if value is not None:
+                sizes[name].append(value)
+
+    return {
+        'since': since.isoformat(),
+        'hours': hours,
+        'analyses': len(totals),
+        'by_status': by_status,
+        'stages_ms': {name: _summary(values) for name, values in stages.items()},
+        'total_ms': _summary(totals),
+        **{name: _summary(values) for name, values in sizes.items()}
+    }
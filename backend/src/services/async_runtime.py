@@ -0,0 +1,134 @@
+"""Runtime for the async handlers of the ASGI stack (``src/asgi.py``).
+
+* ``run_sync`` runs blocking work (SQLAlchemy, HTML parsing, image
+  processing) on the server's thread pool inside an app context, so the
+  event loop only ever waits on the network.
+* ``http_client`` / ``openai_client`` are shared per process: one
+  connection pool for all in-flight requests instead of one per call.
+* ``AsyncRequest`` is the little a handler needs of the HTTP request (JSON
+  body, session user); handlers return ``(payload, status)`` like the Flask
+  views return ``jsonify(...), status``, optionally with a dict of extra
+  response headers as third item.
+"""
+import os
+import json
+import asyncio
+import functools
+from http.cookies import SimpleCookie
+from itsdangerous import BadSignature
+from src.services.principal import load_principal
+
+_app = None
+_executor = None
+_http_client = None
+_openai_client = None
+
+# Simultaneous connections of the shared HTTP client (website crawls)
+ASYNC_HTTP_CONNECTIONS = int(os.environ.get('ASYNC_HTTP_CONNECTIONS', 200))
+
+
+def configure(app, executor):
+    """Use ``app`` for app contexts and ``executor`` for ``run_sync``"""
+    global _app, _executor
+    _app = app
+    _executor = executor
+
+
+def _in_app_context(func, args, kwargs):
+    with _app.app_context():
+        return func(*args, **kwargs)
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run blocking ``func`` on the thread pool within an app context"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(_in_app_context, func, args, kwargs))
+
+
+def http_client():
+    """Shared ``httpx.AsyncClient`` for crawling (created on first use)"""
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.AsyncClient(
+            verify=False,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=ASYNC_HTTP_CONNECTIONS,
+                                max_keepalive_connections=ASYNC_HTTP_CONNECTIONS // 4),
+        )
+    return _http_client
+
+
+def openai_client():
+    """Shared ``openai.AsyncOpenAI`` client (created on first use)"""
+    global _openai_client
+    if _openai_client is None:
+        import openai
+        _openai_client = openai.AsyncOpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+    return _openai_client
+
+
+async def aclose():
+    """Close the shared clients (server shutdown)"""
+    global _http_client, _openai_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+
+
+class AsyncRequest:
+    """HTTP request as seen by an async handler"""
+
+    def __init__(self, app, scope, body):
+        self.app = app
+        self.scope = scope
+        self.body = body
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope.get('headers', [])}
+        self.principal = None
+
+    @functools.cached_property
+    def json(self):
+        """Parsed JSON body, or None if the body is not JSON"""
+        if not self.headers.get('content-type', '').startswith('application/json'):
+            return None
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+    @functools.cached_property
+    def user_id(self):
+        """User id of the Flask session cookie (None if absent or invalid)"""
+        cookie = SimpleCookie()
+        try:
+            cookie.load(self.headers.get('cookie', ''))
+        except Exception:
+            return None
+        morsel = cookie.get(self.app.config['SESSION_COOKIE_NAME'])
+        serializer = self.app.session_interface.get_signing_serializer(self.app)
+        if morsel is None or serializer is None:
+            return None
+        try:
+            session = serializer.loads(
+                morsel.value, max_age=int(self.app.permanent_session_lifetime.total_seconds())
+            )
+        except BadSignature:
+            return None
+        return session.get('user_id')
+
+
+def async_login_required(handler):
+    """Async counterpart of ``login_required``; sets ``request.principal``"""
+    @functools.wraps(handler)
+    async def wrapper(request):
+        if request.user_id is None:
+            return {'error': 'Authentication required'}, 401
+        request.principal = await run_sync(load_principal, request.user_id)
+        if request.principal is None:
+            return {'error': 'User not found'}, 401
+        return await handler(request)
+    return wrapper
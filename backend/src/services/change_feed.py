@@ -0,0 +1,283 @@
+"""Change feed of SEO results and generated images.
+
+Every flush that inserts or deletes an SEOResult or a GeneratedImage
+appends a ``change_events`` row in the same transaction; a bulk DELETE
+(whose rows are unknown) appends a ``reset`` event for the entity instead.
+The event position (``seq``) is the cursor: clients resume with
+``since=<seq>`` (or the ``Last-Event-ID`` of an EventSource) and apply the
+events to the list they already have instead of fetching whole pages again.
+
+Positions are handed out after commit (``sequence``), not at insert: on
+PostgreSQL ids come from a sequence, so a transaction holding a lower id can
+commit after a higher id was read, and a cursor on ids would skip its event.
+
+Visibility matches the list endpoints: results of all users for admins,
+otherwise the caller's own; images always the caller's own. Insert events
+carry the row as the list endpoints serialize it, restricted to the
+``fields`` projection of its entity if one was given.
+
+Events are polled from the database every ``CHANGE_FEED_POLL_INTERVAL``
+seconds; a commit in the same process wakes waiting feeds at once.
+Events older than ``CHANGE_FEED_RETENTION_HOURS`` are pruned; a cursor
+from before that (or from another database) gets a ``reset`` with
+``entity: null``, meaning: reload everything.
+
+Open streams and waiting long-polls each hold a worker thread (or
+greenlet), so their number per process is limited, see ``configure``.
+Feed reads end their transaction with a rollback rather than removing the
+session, so the request's own objects stay attached.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, delete, event, func, insert, or_, select, update
+from src.models.user import db, SEOResult
+from src.models.image import GeneratedImage
+from src.models.change_event import ChangeEvent
+from src.models.projection import project_query, row_to_dict
+from src.services import admission
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_POLL_INTERVAL = float(os.environ.get('CHANGE_FEED_POLL_INTERVAL', 1))
+CHANGE_FEED_RETENTION_HOURS = float(os.environ.get('CHANGE_FEED_RETENTION_HOURS', 24))
+CHANGE_FEED_BATCH = int(os.environ.get('CHANGE_FEED_BATCH', 100))
+
+# Model -> entity name
+ENTITIES = {SEOResult: 'seo_result', GeneratedImage: 'image'}
+
+PRUNE_INTERVAL = 3600
+# PostgreSQL advisory lock serializing ``sequence`` across processes
+SEQUENCE_LOCK = 0x6368616e
+# Events given a position per ``sequence`` call
+SEQUENCE_BATCH = 1000
+
+_changed = threading.Condition()
+_slots_lock = threading.Lock()
+_open = 0
+_last_prune = 0.0
+max_waiters = 0
+
+
+def _event(entity, op, entity_id=None, user_id=None):
+    return {'entity': entity, 'op': op, 'entity_id': entity_id, 'user_id': user_id,
+            'created_at': datetime.utcnow()}
+
+
+@event.listens_for(db.session, 'after_flush')
+def _after_flush(session, flush_context):
+    events = [_event(ENTITIES[type(obj)], 'insert', obj.id, obj.user_id)
+              for obj in session.new if type(obj) in ENTITIES]
+    events += [_event(ENTITIES[type(obj)], 'delete', obj.id, obj.user_id)
+               for obj in session.deleted if type(obj) in ENTITIES]
+    if events:
+        session.connection().execute(insert(ChangeEvent.__table__), events)
+        session.info['change_feed'] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _bulk_delete(state):
+    if not state.is_delete or state.bind_mapper is None:
+        return
+    entity = ENTITIES.get(state.bind_mapper.class_)
+    if entity is not None:
+        state.session.connection().execute(insert(ChangeEvent.__table__), [_event(entity, 'reset')])
+        state.session.info['change_feed'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('change_feed', False):
+        with _changed:
+            _changed.notify_all()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('change_feed', False)
+
+
+def default_slots(worker_class, threads=4, connections=100, analyze_slots=0, analyze_queue=0):
+    """Feeds that may wait at once per process by default.
+
+    Analyses and queued analyses hold threads (or greenlets) as well; all
+    three together leave at least one for the other endpoints. A sync worker
+    has none to spare and long-polls return at once.
+    """
+    if worker_class == 'sync':
+        return 0
+    if worker_class == 'asgi':
+        # Analyses wait on the event loop; feeds hold request threads
+        return threads // 2
+    capacity = connections if worker_class in ('gevent', 'eventlet') else threads
+    return max(0, capacity - analyze_slots - analyze_queue - 1)
+
+
+def configure(worker_class='gthread', threads=4, connections=100):
+    """Set ``max_waiters`` for the worker model, after ``admission.configure``"""
+    analyze = admission.limits['analyze']
+    slots = default_slots(worker_class, threads, connections, analyze.slots, analyze.queue)
+    global max_waiters
+    max_waiters = int(os.environ.get('CHANGE_FEED_MAX_STREAMS') or slots)
+
+
+# Development server and plain WSGI use; src/serve.py configures its worker model
+configure()
+
+
+def acquire_slot():
+    """Reserve a waiting feed; False if the process has none left"""
+    global _open
+    with _slots_lock:
+        if _open >= max_waiters:
+            return False
+        _open += 1
+        return True
+
+
+def release_slot():
+    global _open
+    with _slots_lock:
+        _open -= 1
+
+
+def wait(timeout):
+    """Sleep until a local commit recorded events or ``timeout`` passed"""
+    with _changed:
+        _changed.wait(timeout)
+
+
+def _visible(query, principal):
+    """Resets, the caller's own rows and, for admins, all results"""
+    conditions = [ChangeEvent.op == 'reset', ChangeEvent.user_id == principal.id]
+    if principal.is_admin:
+        conditions.append(ChangeEvent.entity == 'seo_result')
+    return query.filter(or_(*conditions))
+
+
+def sequence():
+    """Give committed events without a position the next ones; returns how many.
+
+    Positions are taken under a lock held until commit, so a position becomes
+    visible only after all lower ones; events still uncommitted get theirs
+    once they are.
+    """
+    table = ChangeEvent.__table__
+    with db.engine.begin() as conn:
+        if conn.execute(select(table.c.id).where(table.c.seq.is_(None)).limit(1)).first() is None:
+            return 0
+        if conn.dialect.name == 'sqlite':
+            # The write lock, before the highest position is read
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+        elif not conn.execute(select(func.pg_try_advisory_xact_lock(SEQUENCE_LOCK))).scalar():
+            # Another process is sequencing right now
+            return 0
+        top = conn.execute(select(func.max(table.c.seq))).scalar() or 0
+        pending = conn.execute(select(table.c.id).where(table.c.seq.is_(None))
+                               .order_by(table.c.id).limit(SEQUENCE_BATCH)).scalars().all()
+        if pending:
+            conn.execute(update(table).where(table.c.id == bindparam('event_id')).values(seq=bindparam('position')),
+                         [{'event_id': event_id, 'position': top + n} for n, event_id in enumerate(pending, 1)])
+        return len(pending)
+
+
+def prune():
+    """Delete events past the retention, always keeping the newest (it anchors the cursors)"""
+    cutoff = datetime.utcnow() - timedelta(hours=CHANGE_FEED_RETENTION_HOURS)
+    latest = db.session.query(func.max(ChangeEvent.seq)).scalar()
+    if latest is None:
+        return 0
+    # Events still waiting for a position (seq NULL) are kept as well
+    deleted = db.session.execute(
+        delete(ChangeEvent).where(ChangeEvent.created_at < cutoff, ChangeEvent.seq < latest)
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+
+def _maybe_prune():
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune < PRUNE_INTERVAL:
+        return
+    _last_prune = now
+    try:
+        removed = prune()
+        if removed:
+            logger.info(f"Change feed: pruned {removed} events")
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Change feed pruning failed: {str(e)}")
+
+
+def latest_cursor():
+    try:
+        sequence()
+        return db.session.query(func.max(ChangeEvent.seq)).scalar() or 0
+    finally:
+        db.session.rollback()
+
+
+def _rows(events, fields):
+    """Current rows of the insert events, by (entity, id); ``fields`` maps entity -> projection"""
+    from src.routes.seo import results_query
+
+    rows = {}
+    ids = {}
+    for change in events:
+        if change.op == 'insert':
+            ids.setdefault(change.entity, []).append(change.entity_id)
+    if ids.get('seo_result'):
+        query, to_dict = results_query(fields.get('seo_result'))
+        query = query.filter(SEOResult.id.in_(ids['seo_result']))
+        rows.update((('seo_result', row.id), to_dict(row)) for row in query)
+    if ids.get('image'):
+        image_fields = fields.get('image')
+        query = GeneratedImage.query.filter(GeneratedImage.id.in_(ids['image']))
+        if image_fields:
+            query = project_query(query, GeneratedImage.projection_columns(), image_fields)
+            rows.update((('image', row.id), row_to_dict(row, image_fields)) for row in query)
+        else:
+            rows.update((('image', image.id), image.to_dict()) for image in query)
+    return rows
+
+
+def serialize(change, rows):
+    return {
+        'id': change.seq,
+        'entity': change.entity,
+        'op': change.op,
+        'entity_id': change.entity_id,
+        'created_at': change.created_at.isoformat(),
+        # None if the row is gone again (its delete event follows)
+        'data': rows.get((change.entity, change.entity_id)) if change.op == 'insert' else None
+    }
+
+
+def fetch(principal, since, fields=None):
+    """Visible events after ``since``; returns (events, new cursor).
+
+    ``fields`` maps an entity to the ``?fields=`` projection of its rows.
+
+    Ends the session's transaction, so the next call sees new commits.
+    """
+    try:
+        sequence()
+        _maybe_prune()
+        oldest, latest = db.session.query(func.min(ChangeEvent.seq), func.max(ChangeEvent.seq)).one()
+        latest = latest or 0
+        if since > latest or (oldest is not None and since < oldest - 1):
+            # Events since the cursor are gone (pruned, or another database)
+            return [{'id': latest, 'entity': None, 'op': 'reset', 'entity_id': None,
+                     'created_at': datetime.utcnow().isoformat(), 'data': None}], latest
+        if since == latest:
+            return [], since
+        events = _visible(ChangeEvent.query.filter(ChangeEvent.seq > since, ChangeEvent.seq <= latest),
+                          principal).order_by(ChangeEvent.seq).limit(CHANGE_FEED_BATCH).all()
+        rows = _rows(events, fields or {})
+        cursor = events[-1].seq if len(events) == CHANGE_FEED_BATCH else latest
+        return [serialize(change, rows) for change in events], cursor
+    finally:
+        db.session.rollback()
@@ -0,0 +1,57 @@
+"""Compression of JSON API responses.
+
+JSON bodies of at least ``API_COMPRESS_MIN_BYTES`` are sent Brotli- or
+gzip-compressed, whichever the client accepts (Brotli first, if the
+``brotli`` package is installed). Levels are chosen for speed, the body is
+compressed per request: ``API_COMPRESS_BROTLI_QUALITY`` (default 4) and
+``API_COMPRESS_GZIP_LEVEL`` (default 6).
+
+Streamed responses (the export) and responses that already carry a
+``Content-Encoding`` are left alone.
+"""
+import os
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+API_COMPRESS_MIN_BYTES = int(os.environ.get('API_COMPRESS_MIN_BYTES', 1024))
+API_COMPRESS_BROTLI_QUALITY = int(os.environ.get('API_COMPRESS_BROTLI_QUALITY', 4))
+API_COMPRESS_GZIP_LEVEL = int(os.environ.get('API_COMPRESS_GZIP_LEVEL', 6))
+
+
+def _encoding():
+    """Best content encoding the client accepts, or None"""
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    if (response.status_code != 200 or response.mimetype != 'application/json'
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < API_COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _encoding()
+    if encoding is None:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=API_COMPRESS_BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=API_COMPRESS_GZIP_LEVEL, mtime=0)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -0,0 +1,152 @@
+"""Change counters behind the ETags of the list endpoints.
+
+Every flush that inserts, changes or deletes an SEOResult or a
+GeneratedImage (or renames a user, whose name is part of the results)
+increments the counters of the affected scopes in ``data_versions``, in
+the same transaction:
+
+* ``<entity>:user:<id>``: rows of one user (for ``user``: the user itself),
+* ``<entity>:bulk``: bulk UPDATE/DELETE statements, whose rows are unknown.
+
+There is no counter for all rows of an entity: writers of different users
+would queue behind its row lock until they commit. ``<entity>:all`` (admins
+see all results) is derived when read, from the sum, number and latest
+change of the per-user counters.
+
+``conditional`` derives a weak ETag and Last-Modified for a response from
+the counters it depends on. They are read before the view runs, so a 304
+skips the query and the serialization; a change racing with the request
+only makes the next request miss, never serve stale data.
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import Response, make_response, request
+from sqlalchemy import event, func, inspect
+from src.models.user import db, User, SEOResult
+from src.models.image import GeneratedImage
+from src.models.data_version import DataVersion
+from src.models.storage import dialect_insert
+from src.services.principal import current_principal
+
+# Model -> entity name
+TRACKED = {SEOResult: 'seo_result', GeneratedImage: 'image', User: 'user'}
+
+
+def _changed(session, obj):
+    if isinstance(obj, User):
+        # Only the name shows up in other entities
+        return inspect(obj).attrs.username.history.has_changes()
+    return session.is_modified(obj, include_collections=False)
+
+
+def scopes_of(obj):
+    entity = TRACKED[type(obj)]
+    owner = obj.id if isinstance(obj, User) else obj.user_id
+    return {f'{entity}:user:{owner}'}
+
+
+def bump(connection, scopes):
+    """Increment the counters of ``scopes`` on ``connection``"""
+    table = DataVersion.__table__
+    now = datetime.utcnow()
+    for scope in sorted(scopes):
+        statement = dialect_insert(table, connection.dialect).values(scope=scope, version=1, changed_at=now)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['scope'],
+            set_={'version': table.c.version + 1, 'changed_at': now}
+        ))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _after_flush(session, flush_context):
+    scopes = set()
+    for obj in session.new | session.deleted:
+        if type(obj) in TRACKED:
+            scopes |= scopes_of(obj)
+    for obj in session.dirty:
+        if type(obj) in TRACKED and _changed(session, obj):
+            scopes |= scopes_of(obj)
+    if scopes:
+        bump(session.connection(), scopes)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _bulk_statement(state):
+    if not (state.is_update or state.is_delete) or state.bind_mapper is None:
+        return
+    entity = TRACKED.get(state.bind_mapper.class_)
+    if entity is not None:
+        bump(state.session.connection(), {f'{entity}:bulk'})
+
+
+def _all_of(scope):
+    """(version, latest change) of an ``<entity>:all`` scope, from its per-user counters"""
+    # Prefix range instead of LIKE, so the primary key index is used (';' follows ':')
+    prefix = scope[:-len('all')] + 'user:'
+    total, count, changed_at = db.session.query(
+        func.sum(DataVersion.version), func.count(), func.max(DataVersion.changed_at)
+    ).filter(DataVersion.scope >= prefix, DataVersion.scope < prefix[:-1] + ';').one()
+    return f'{total or 0}.{count}', changed_at
+
+
+def current(scopes):
+    """(versions by scope, latest change) of ``scopes``"""
+    derived = [scope for scope in scopes if scope.endswith(':all')]
+    stored = [scope for scope in scopes if scope not in derived]
+    rows = DataVersion.query.filter(DataVersion.scope.in_(stored)).all() if stored else []
+    versions = {row.scope: row.version for row in rows}
+    changes = [row.changed_at for row in rows]
+    for scope in derived:
+        versions[scope], changed_at = _all_of(scope)
+        changes.append(changed_at)
+    changed_at = max((change for change in changes if change is not None), default=None)
+    return versions, changed_at
+
+
+def validators(scopes, principal):
+    """Weak ETag and Last-Modified of the current request over ``scopes``"""
+    versions, changed_at = current(scopes)
+    state = '|'.join([request.full_path, str(principal.id)] +
+                     [f'{scope}={versions.get(scope, 0)}' for scope in sorted(scopes)])
+    return hashlib.sha256(state.encode()).hexdigest()[:32], changed_at
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    # Second precision: only a change in an earlier second is safe to compare
+    since = request.if_modified_since
+    return bool(since and last_modified and last_modified.replace(microsecond=0) < since.replace(tzinfo=None))
+
+
+def _cache_headers(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Revalidate on every use, never stored by shared caches
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+def conditional(scopes_for):
+    """ETag/Last-Modified and 304 for a view (below ``login_required``).
+
+    ``scopes_for(principal)`` lists the counters the response depends on.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            principal = current_principal()
+            scopes = scopes_for(principal)
+            etag, last_modified = validators(scopes, principal)
+            if _not_modified(etag, last_modified):
+                return _cache_headers(Response(status=304), etag, last_modified)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _cache_headers(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,279 @@
+"""In-memory domain index for /seo/domains/autocomplete.
+
+Keeps every stored (normalized) domain in memory together with its owner:
+
+* a sorted key list per user and a global one for prefix lookups via bisect
+  (domains starting with ``www.`` are indexed with and without it),
+* trigram posting lists for substring matches of three or more characters.
+
+The index is built in a background thread when the app starts; until it is
+ready, callers fall back to the database. It is updated from committed
+sessions in this process, picks up rows written by other workers by id
+every few seconds, and is rebuilt periodically to drop rows deleted
+elsewhere.
+"""
+import bisect
+import threading
+import time
+import logging
+from array import array
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from src.models.user import db, SEOResult
+
+logger = logging.getLogger(__name__)
+
+# Catch up with rows inserted by other workers at most this often
+SYNC_INTERVAL = 5.0
+# Full rebuild interval (drops domains deleted by other workers)
+REBUILD_INTERVAL = 600.0
+# Below this size a user's own domains are scanned instead of using trigrams
+USER_SCAN_LIMIT = 5000
+
+
+def _keys(domain):
+    if domain.startswith('www.') and len(domain) > 4:
+        return (domain, domain[4:])
+    return (domain,)
+
+
+def _trigrams(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class _DomainTable:
+    """Index data structures; only accessed under DomainIndex's lock"""
+
+    def __init__(self):
+        self.domains = []           # id -> domain (None once deleted)
+        self.owners = []            # id -> user_id
+        self.ids = {}               # domain -> id
+        self.keys = []              # sorted prefix keys (all users)
+        self.key_ids = {}           # key -> list of ids
+        self.user_keys = {}         # user_id -> sorted prefix keys
+        self.user_ids = {}          # user_id -> list of live ids
+        self.trigrams = {}          # trigram -> array of ids
+        self.max_id = 0             # highest seo_result.id seen
+
+    def load(self, rows):
+        """Bulk-load ``(id, domain, user_id)`` rows, sorting key lists once"""
+        for row_id, domain, user_id in rows:
+            self.add(domain, user_id, row_id, keep_sorted=False)
+        self.keys.sort()
+        for user_keys in self.user_keys.values():
+            user_keys.sort()
+
+    def add(self, domain, user_id, row_id=None, keep_sorted=True):
+        if domain in self.ids:
+            self.remove(domain)
+        if row_id:
+            self.max_id = max(self.max_id, row_id)
+        domain_id = len(self.domains)
+        self.domains.append(domain)
+        self.owners.append(user_id)
+        self.ids[domain] = domain_id
+        self.user_ids.setdefault(user_id, []).append(domain_id)
+        user_keys = self.user_keys.setdefault(user_id, [])
+        for key in _keys(domain):
+            ids = self.key_ids.get(key)
+            if ids is None:
+                self.key_ids[key] = [domain_id]
+                if keep_sorted:
+                    bisect.insort(self.keys, key)
+                else:
+                    self.keys.append(key)
+            else:
+                ids.append(domain_id)
+            if keep_sorted:
+                bisect.insort(user_keys, key)
+            else:
+                user_keys.append(key)
+        for trigram in _trigrams(domain):
+            postings = self.trigrams.get(trigram)
+            if postings is None:
+                postings = self.trigrams[trigram] = array('I')
+            postings.append(domain_id)
+
+    def remove(self, domain):
+        domain_id = self.ids.pop(domain, None)
+        if domain_id is None:
+            return
+        user_id = self.owners[domain_id]
+        # Trigram postings keep the stale id; lookups skip deleted ids and
+        # the next rebuild compacts them away.
+        self.domains[domain_id] = None
+        self.user_ids[user_id].remove(domain_id)
+        user_keys = self.user_keys[user_id]
+        for key in _keys(domain):
+            ids = self.key_ids[key]
+            ids.remove(domain_id)
+            if not ids:
+                del self.key_ids[key]
+                del self.keys[bisect.bisect_left(self.keys, key)]
+            del user_keys[bisect.bisect_left(user_keys, key)]
+
+    def search(self, query, user_id, limit):
+        matches = []
+        seen = set()
+
+        def visible(domain_id):
+            domain = self.domains[domain_id]
+            if domain is None or domain in seen:
+                return None
+            if user_id is not None and self.owners[domain_id] != user_id:
+                return None
+            return domain
+
+        # Prefix matches
+        keys = self.keys if user_id is None else self.user_keys.get(user_id, [])
+        pos = bisect.bisect_left(keys, query)
+        while pos < len(keys) and keys[pos].startswith(query):
+            for domain_id in self.key_ids[keys[pos]]:
+                domain = visible(domain_id)
+                if domain:
+                    seen.add(domain)
+                    matches.append(domain)
+                    if len(matches) >= limit:
+                        return matches
+            pos += 1
+
+        # Substring matches
+        own_ids = self.user_ids.get(user_id, []) if user_id is not None else None
+        if own_ids is not None and len(own_ids) <= USER_SCAN_LIMIT:
+            candidates = own_ids
+        elif len(query) >= 3:
+            postings = [self.trigrams.get(t) for t in _trigrams(query)]
+            if not all(postings):
+                return matches
+            candidates = min(postings, key=len)
+        else:
+            return matches
+
+        # Stop at the first hits instead of verifying every candidate
+        substring = []
+        wanted = limit - len(matches)
+        for domain_id in candidates:
+            domain = visible(domain_id)
+            if domain and query in domain:
+                substring.append(domain)
+                if len(substring) >= wanted:
+                    break
+        matches.extend(sorted(substring))
+        return matches
+
+
+class DomainIndex:
+    """Prefix/trigram index of normalized domains with per-user visibility"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._app = None
+        self._table = None
+        self._loading = False
+        self._synced_at = 0.0
+        self._built_at = 0.0
+
+    def init_app(self, app):
+        """Remember the app and start building the index in the background"""
+        self._app = app
+        self.start_build()
+
+    @property
+    def ready(self):
+        return self._table is not None
+
+    def start_build(self):
+        with self._lock:
+            if self._loading or self._app is None:
+                return
+            self._loading = True
+        threading.Thread(target=self._build, name='domain-index-build', daemon=True).start()
+
+    def _build(self):
+        try:
+            with self._app.app_context():
+                rows = db.session.query(SEOResult.id, SEOResult.domain, SEOResult.user_id).all()
+                db.session.remove()
+            table = _DomainTable()
+            table.load(rows)
+            with self._lock:
+                self._table = table
+                self._synced_at = self._built_at = time.monotonic()
+            logger.info(f"Domain index built with {len(rows)} domains")
+        except Exception as e:
+            logger.exception(f"Error building domain index: {str(e)}")
+        finally:
+            self._loading = False
+
+    def _sync(self):
+        """Pick up rows inserted by other workers since the last sync"""
+        now = time.monotonic()
+        if now - self._built_at > REBUILD_INTERVAL:
+            self.start_build()
+        if now - self._synced_at < SYNC_INTERVAL:
+            return
+        self._synced_at = now
+        rows = db.session.query(SEOResult.id, SEOResult.domain, SEOResult.user_id).filter(
+            SEOResult.id > self._table.max_id
+        ).all()
+        with self._lock:
+            for row_id, domain, user_id in rows:
+                self._table.add(domain, user_id, row_id)
+
+    def add(self, domain, user_id, row_id=None):
+        with self._lock:
+            if self._table is not None:
+                self._table.add(domain, user_id, row_id)
+
+    def remove(self, domain):
+        with self._lock:
+            if self._table is not None:
+                self._table.remove(domain)
+
+    def search(self, query, user_id=None, limit=10):
+        """Return up to ``limit`` domains matching ``query``.
+
+        Prefix matches (also ignoring a leading ``www.``) come first, then
+        substring matches. ``user_id=None`` searches all users' domains.
+        Returns None while the index is not ready.
+        """
+        if self._table is None:
+            self.start_build()
+            return None
+        query = query.strip().lower()
+        if not query:
+            return []
+        self._sync()
+        with self._lock:
+            return self._table.search(query, user_id, limit)
+
+
+domain_index = DomainIndex()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_seo_result_changes(session, flush_context):
+    pending = session.info.setdefault('domain_index_pending', [])
+    for obj in session.new:
+        if isinstance(obj, SEOResult):
+            pending.append(('add', obj.domain, obj.user_id, obj.id))
+    for obj in session.deleted:
+        if isinstance(obj, SEOResult):
+            pending.append(('remove', obj.domain, obj.user_id, obj.id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_seo_result_changes(session):
+    pending = session.info.pop('domain_index_pending', None)
+    if not pending:
+        return
+    for action, domain, user_id, row_id in pending:
+        if action == 'add':
+            domain_index.add(domain, user_id, row_id)
+        else:
+            domain_index.remove(domain)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_seo_result_changes(session):
+    session.info.pop('domain_index_pending', None)
@@ -0,0 +1,62 @@
+"""Compressed derivatives of generated images.
+
+gpt-image-1 returns PNGs of several MB. After an image is saved, this
+writes next to it
+
+* ``<name>.webp``        full size WebP (what the UI displays),
+* ``<name>.avif``        full size AVIF, if ``IMAGE_AVIF`` is enabled and
+                         Pillow was built with AVIF support,
+* ``<name>_thumb.webp``  thumbnail for the history grid.
+
+The original PNG is kept for downloads.
+"""
+import os
+import logging
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+WEBP_QUALITY = int(os.environ.get('IMAGE_WEBP_QUALITY', 80))
+AVIF_QUALITY = int(os.environ.get('IMAGE_AVIF_QUALITY', 60))
+AVIF_ENABLED = os.environ.get('IMAGE_AVIF', '').lower() in ('1', 'true', 'yes')
+THUMBNAIL_WIDTH = int(os.environ.get('IMAGE_THUMB_WIDTH', 480))
+THUMBNAIL_QUALITY = int(os.environ.get('IMAGE_THUMB_QUALITY', 70))
+
+
+def _save(image, path, image_format, **options):
+    image.save(path, image_format, **options)
+    return os.path.getsize(path)
+
+
+def create_derivatives(path, url):
+    """Write the derivatives of the image at ``path`` (served under ``url``).
+
+    Returns the GeneratedImage fields to store (URLs and byte sizes); an
+    empty dict if the image could not be converted.
+    """
+    base_path = os.path.splitext(path)[0]
+    base_url = os.path.splitext(url)[0]
+    fields = {'image_bytes': os.path.getsize(path)}
+    try:
+        with Image.open(path) as image:
+            image.load()
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+            fields['webp_url'] = f"{base_url}.webp"
+            fields['webp_bytes'] = _save(image, f"{base_path}.webp", 'WEBP', quality=WEBP_QUALITY, method=4)
+
+            if AVIF_ENABLED and features.check('avif'):
+                fields['avif_url'] = f"{base_url}.avif"
+                fields['avif_bytes'] = _save(image, f"{base_path}.avif", 'AVIF', quality=AVIF_QUALITY)
+
+            thumbnail = image.copy()
+            # Bound by width only; header and kachel images differ in height
+            thumbnail.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4), Image.LANCZOS)
+            fields['thumbnail_url'] = f"{base_url}_thumb.webp"
+            fields['thumbnail_bytes'] = _save(thumbnail, f"{base_path}_thumb.webp", 'WEBP',
+                                              quality=THUMBNAIL_QUALITY, method=4)
+    except Exception as e:
+        logger.exception(f"Error creating image derivatives for {path}: {str(e)}")
+        return {'image_bytes': fields['image_bytes']}
+    return fields
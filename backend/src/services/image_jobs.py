@@ -0,0 +1,237 @@
+"""In-process runner for background image generation.
+
+Tasks (one per requested variant) are queued per user and executed by a
+fixed pool of worker threads:
+
+* at most ``IMAGE_GLOBAL_CONCURRENCY`` tasks run at once per process,
+* at most ``IMAGE_USER_CONCURRENCY`` of them belong to the same user,
+* users are served round-robin, so one large job does not starve others,
+* at most ``IMAGE_QUEUE_LIMIT`` tasks may wait; ``submit`` refuses more.
+
+Job state lives in the database (``ImageJob``), so any worker process can
+answer status polls; the runner only executes the tasks. Tasks do not
+survive their process: when a worker exits (restart, ``max_requests`` or
+RSS recycling), ``fail_unfinished_jobs`` closes the jobs it still owed
+variants to. Jobs of a killed process are expired after ``IMAGE_JOB_TIMEOUT``.
+
+``AsyncImageJobRunner`` is the counterpart for the ASGI stack: tasks are
+coroutines on the event loop, limited by semaphores instead of threads.
+"""
+import os
+import atexit
+import asyncio
+import threading
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+IMAGE_GLOBAL_CONCURRENCY = int(os.environ.get('IMAGE_GLOBAL_CONCURRENCY', 4))
+IMAGE_USER_CONCURRENCY = int(os.environ.get('IMAGE_USER_CONCURRENCY', 2))
+IMAGE_QUEUE_LIMIT = int(os.environ.get('IMAGE_QUEUE_LIMIT', 50))
+
+
+def _task_done(jobs, job_id):
+    jobs[job_id] -= 1
+    if not jobs[job_id]:
+        del jobs[job_id]
+
+
+class ImageJobRunner:
+    def __init__(self, global_limit=IMAGE_GLOBAL_CONCURRENCY, user_limit=IMAGE_USER_CONCURRENCY,
+                 queue_limit=IMAGE_QUEUE_LIMIT):
+        self.app = None
+        self.global_limit = global_limit
+        self.user_limit = user_limit
+        self.queue_limit = queue_limit
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()  # user_id -> deque of tasks
+        self._running = {}  # user_id -> running task count
+        self._queued = 0
+        self._jobs = {}  # job_id -> unfinished task count
+        self._stopped = False
+        self._threads = []
+
+    def init_app(self, app):
+        self.app = app
+
+    def submit(self, user_id, tasks, job_id=None):
+        """Queue callables for ``user_id``; returns False if the queue is full"""
+        with self._cond:
+            if self._stopped or self._queued + len(tasks) > self.queue_limit:
+                return False
+            self._pending.setdefault(user_id, deque()).extend((job_id, task) for task in tasks)
+            self._queued += len(tasks)
+            self._jobs[job_id] = self._jobs.get(job_id, 0) + len(tasks)
+            self._start_workers()
+            self._cond.notify_all()
+        return True
+
+    def stop(self):
+        """Start no further tasks; returns the jobs with unfinished tasks"""
+        with self._cond:
+            self._stopped = True
+            return [job_id for job_id in self._jobs if job_id is not None]
+
+    def stats(self):
+        with self._cond:
+            return {'queued': self._queued, 'running': sum(self._running.values())}
+
+    def _start_workers(self):
+        # Threads are started on first use so imports (scripts, benchmarks)
+        # do not spawn them
+        while len(self._threads) < self.global_limit:
+            thread = threading.Thread(target=self._work, name=f'image-job-{len(self._threads)}', daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_task(self):
+        if self._stopped:
+            return None
+        for user_id in list(self._pending):
+            if self._running.get(user_id, 0) >= self.user_limit:
+                continue
+            queue = self._pending.pop(user_id)
+            task = queue.popleft()
+            if queue:
+                # Re-append at the end: next pick prefers other users
+                self._pending[user_id] = queue
+            return user_id, task
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                picked = self._next_task()
+                while picked is None:
+                    self._cond.wait()
+                    picked = self._next_task()
+                user_id, (job_id, task) = picked
+                self._queued -= 1
+                self._running[user_id] = self._running.get(user_id, 0) + 1
+            try:
+                with self.app.app_context():
+                    task()
+            except Exception as e:
+                logger.exception(f"Image job task failed: {str(e)}")
+            finally:
+                with self._cond:
+                    self._running[user_id] -= 1
+                    if not self._running[user_id]:
+                        del self._running[user_id]
+                    _task_done(self._jobs, job_id)
+                    self._cond.notify_all()
+
+
+class AsyncImageJobRunner:
+    """Runs coroutine tasks on the server's event loop with the same limits.
+
+    A user's tasks first wait for one of their ``user_limit`` slots, so at
+    most that many of them compete for the global slots, which are handed
+    out in arrival order.
+    """
+
+    def __init__(self, global_limit=IMAGE_GLOBAL_CONCURRENCY, user_limit=IMAGE_USER_CONCURRENCY,
+                 queue_limit=IMAGE_QUEUE_LIMIT):
+        self.loop = None
+        self.global_limit = global_limit
+        self.user_limit = user_limit
+        self.queue_limit = queue_limit
+        self._lock = threading.Lock()
+        self._global = None
+        self._users = {}  # user_id -> [semaphore, task count]
+        self._queued = 0
+        self._running = 0
+        self._jobs = {}  # job_id -> unfinished task count
+
+    def bind(self, loop):
+        """Run tasks on ``loop`` (call from the loop, once per process)"""
+        if self.loop is None:
+            self.loop = loop
+            self._global = asyncio.Semaphore(self.global_limit)
+
+    def submit(self, user_id, factories, job_id=None):
+        """Schedule coroutine factories for ``user_id``; returns False if the queue is full.
+
+        Safe to call from any thread.
+        """
+        with self._lock:
+            if self.loop is None or self._queued + len(factories) > self.queue_limit:
+                return False
+            self._queued += len(factories)
+            self._jobs[job_id] = self._jobs.get(job_id, 0) + len(factories)
+        for factory in factories:
+            asyncio.run_coroutine_threadsafe(self._run(user_id, job_id, factory), self.loop)
+        return True
+
+    def unfinished_jobs(self):
+        with self._lock:
+            return [job_id for job_id in self._jobs if job_id is not None]
+
+    def stats(self):
+        with self._lock:
+            return {'queued': self._queued, 'running': self._running}
+
+    async def _run(self, user_id, job_id, factory):
+        slot = self._users.setdefault(user_id, [asyncio.Semaphore(self.user_limit), 0])
+        slot[1] += 1
+        try:
+            async with slot[0], self._global:
+                with self._lock:
+                    self._queued -= 1
+                    self._running += 1
+                try:
+                    await factory()
+                except Exception as e:
+                    logger.exception(f"Image job task failed: {str(e)}")
+                finally:
+                    with self._lock:
+                        self._running -= 1
+        finally:
+            with self._lock:
+                _task_done(self._jobs, job_id)
+            slot[1] -= 1
+            if not slot[1]:
+                del self._users[user_id]
+
+
+image_jobs = ImageJobRunner()
+async_image_jobs = AsyncImageJobRunner()
+
+
+def fail_unfinished_jobs():
+    """Close the jobs whose variants this process will not finish (at exit).
+
+    Variants still running are cut off with the process; a job ends as
+    ``done`` if some variants were stored, ``failed`` otherwise.
+    """
+    job_ids = set(image_jobs.stop()) | set(async_image_jobs.unfinished_jobs())
+    if not job_ids or image_jobs.app is None:
+        return 0
+    from sqlalchemy import case, update
+    from src.models.user import db
+    from src.models.image import ImageJob
+    with image_jobs.app.app_context():
+        try:
+            closed = db.session.execute(
+                update(ImageJob)
+                .where(ImageJob.id.in_(job_ids), ImageJob.status.in_(('queued', 'running')))
+                .values(status=case((ImageJob.completed > 0, 'done'), else_='failed'),
+                        failed=ImageJob.variants - ImageJob.completed,
+                        error='Worker stopped before the job finished',
+                        finished_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Could not close unfinished image jobs: {str(e)}")
+            return 0
+        finally:
+            db.session.remove()
+    if closed:
+        logger.warning(f"Worker exiting: closed {closed} unfinished image job(s)")
+    return closed
+
+
+atexit.register(fail_unfinished_jobs)
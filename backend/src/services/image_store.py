@@ -0,0 +1,222 @@
+"""Content-addressed storage for generated images.
+
+Files are named by the SHA-256 of their bytes and sharded into two levels
+of sub-directories of ``static/uploads`` (``ab/cd/abcd….png``), so
+identical images are stored once. Derivatives (WebP, AVIF, thumbnail) live
+next to the original under the same hash.
+
+``GeneratedImage.content_hash`` is the reference: the files of a hash are
+removed by ``release`` once no row references it anymore. Images stored
+before the content store (random file names, no hash) own their files.
+
+A new row referencing existing files is committed under ``content_lock``
+after checking that the files are still there; ``release`` checks for rows
+and deletes under the same lock, so it never removes files a row is about
+to reference.
+"""
+import os
+import base64
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+from contextlib import ExitStack, contextmanager
+from src.models.image import GeneratedImage
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_URL_PREFIX = '/static/uploads'
+
+# GeneratedImage columns pointing at stored files
+URL_FIELDS = ('image_url', 'webp_url', 'avif_url', 'thumbnail_url')
+
+# Sub-directory of partial writes
+TMP_DIR = 'tmp'
+
+# Base64 characters decoded per step (multiple of 4)
+DECODE_CHUNK = 256 * 1024
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Directory generated images are written to: UPLOAD_DIR or backend/static/uploads,
+# independent of the directory the server is started from
+UPLOAD_ROOT = os.path.abspath(os.environ.get('UPLOAD_DIR') or os.path.join(BACKEND_DIR, 'static', 'uploads'))
+
+# Defaults of earlier versions (static/uploads in the working directory,
+# the repository root on Render), adopted by ``adopt_legacy_uploads``
+LEGACY_UPLOAD_ROOTS = (
+    os.path.join(os.path.dirname(BACKEND_DIR), 'static', 'uploads'),
+    os.path.join(os.getcwd(), 'static', 'uploads'),
+)
+
+
+def upload_root():
+    """Directory generated images are written to (served as /static/uploads)"""
+    return UPLOAD_ROOT
+
+
+def adopt_legacy_uploads():
+    """Move images from the former default upload directories into ``upload_root()``.
+
+    Their URLs (``/static/uploads/<relative path>``) stay valid. Does nothing
+    if ``UPLOAD_DIR`` is set; returns the number of files moved.
+    """
+    if os.environ.get('UPLOAD_DIR'):
+        return 0
+    root = upload_root()
+    moved = 0
+    for legacy in dict.fromkeys(os.path.abspath(path) for path in LEGACY_UPLOAD_ROOTS):
+        if legacy == root or not os.path.isdir(legacy):
+            continue
+        for directory, _, names in os.walk(legacy):
+            relative = os.path.relpath(directory, legacy)
+            if relative.split(os.sep)[0] in (TMP_DIR, '..'):
+                continue
+            for name in names:
+                if name.startswith('.'):
+                    continue
+                target = os.path.normpath(os.path.join(root, relative, name))
+                if os.path.exists(target):
+                    # Same content hash already in the new directory
+                    continue
+                try:
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.move(os.path.join(directory, name), target)
+                    moved += 1
+                except OSError as e:
+                    logger.warning(f"Could not move legacy upload {os.path.join(directory, name)}: {str(e)}")
+    if moved:
+        logger.info(f"Moved {moved} images from former upload directories to {root}")
+    return moved
+
+
+def shard_dir(content_hash):
+    return os.path.join(upload_root(), content_hash[:2], content_hash[2:4])
+
+
+def url_for_path(path):
+    relative = os.path.relpath(path, upload_root()).replace(os.sep, '/')
+    return f"{UPLOAD_URL_PREFIX}/{relative}"
+
+
+def path_for_url(url):
+    """Local path of a /static/uploads URL (None for external URLs)"""
+    if not url or not url.startswith(UPLOAD_URL_PREFIX + '/'):
+        return None
+    return os.path.join(upload_root(), *url[len(UPLOAD_URL_PREFIX) + 1:].split('/'))
+
+
+def _lock_path(content_hash):
+    # One lock per hash prefix (256 files); dot-files are neither served nor collected
+    return os.path.join(upload_root(), f'.content-{content_hash[:2]}.lock')
+
+
+@contextmanager
+def content_lock(content_hash):
+    """Exclusive lock (across processes) on the files of ``content_hash``"""
+    os.makedirs(upload_root(), exist_ok=True)
+    with open(_lock_path(content_hash), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def content_locks(content_hashes):
+    """``content_lock`` for several hashes (None ignored), taken in a fixed order"""
+    stack = ExitStack()
+    paths = {_lock_path(content_hash): content_hash for content_hash in content_hashes if content_hash}
+    for path in sorted(paths):
+        stack.enter_context(content_lock(paths[path]))
+    return stack
+
+
+def is_stored(url):
+    """False if ``url`` is an upload whose file is gone (external URLs count as stored)"""
+    path = path_for_url(url)
+    return path is None or os.path.isfile(path)
+
+
+def store_base64(b64_string, extension='png'):
+    """Decode ``b64_string`` into the store chunk by chunk.
+
+    Returns ``(content_hash, path, created)``; ``created`` is False if the
+    same bytes were already stored.
+    """
+    tmp_dir = os.path.join(upload_root(), TMP_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for start in range(0, len(b64_string), DECODE_CHUNK):
+                data = base64.b64decode(b64_string[start:start + DECODE_CHUNK])
+                digest.update(data)
+                f.write(data)
+        content_hash = digest.hexdigest()
+        path = os.path.join(shard_dir(content_hash), f"{content_hash}.{extension}")
+        if os.path.exists(path):
+            try:
+                # Fresh mtime: the orphan collector's grace period covers it until the row exists
+                os.utime(path)
+                os.remove(tmp_path)
+                return content_hash, path, False
+            except FileNotFoundError:
+                pass  # Released just now: store this copy
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return content_hash, path, True
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def stored_files(content_hash):
+    """Paths of the original and all derivatives of ``content_hash``"""
+    directory = shard_dir(content_hash)
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in os.listdir(directory)
+            if name.startswith(content_hash)]
+
+
+def remove_files(content_hash):
+    """Delete all files of ``content_hash``; returns the bytes freed"""
+    freed = 0
+    for path in stored_files(content_hash):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            freed += size
+        except FileNotFoundError:
+            pass
+    return freed
+
+
+def image_refs(image):
+    """What ``release`` needs to know about ``image``; take it before deleting the row"""
+    return image.content_hash, [getattr(image, name) for name in URL_FIELDS]
+
+
+def release(content_hash, urls=()):
+    """Drop the files of a deleted image unless another GeneratedImage references them.
+
+    Returns the bytes freed (0 while the content is still referenced).
+    """
+    if content_hash:
+        with content_lock(content_hash):
+            if GeneratedImage.query.filter_by(content_hash=content_hash).first():
+                return 0
+            return remove_files(content_hash)
+    # Legacy image: its files belong to this row only
+    freed = 0
+    for url in urls:
+        path = path_for_url(url)
+        if path and os.path.isfile(path):
+            freed += os.path.getsize(path)
+            os.remove(path)
+    return freed
@@ -0,0 +1,238 @@
+"""Memory diagnostics for long-running workers.
+
+* ``rss_bytes`` is read after every request: it goes into the access log
+  line (``rss_mb``) and the ``process_resident_memory_bytes`` gauge, and a
+  worker above ``SERVER_MAX_RSS_MB`` (``src/serve.py``) restarts gracefully.
+* tracemalloc can be started and stopped at runtime (or from the start
+  with ``PYTHONTRACEMALLOC=<frames>``); named snapshots are kept in the
+  process for top allocation sites and diffs between two points.
+* ``track_peak`` records the peak allocation of HTML parsing (``crawl``)
+  and image storage (``image``) while tracemalloc is tracing. Requests
+  running concurrently in the same process share the peak, so the figure
+  is an upper bound there.
+
+All of this is per process: the diagnostics endpoints answer for the
+worker that handles them (``pid`` in every response).
+"""
+import os
+import gc
+import sys
+import time
+import logging
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from src.services import metrics
+
+logger = logging.getLogger(__name__)
+
+MEMORY_MAX_SNAPSHOTS = int(os.environ.get('MEMORY_MAX_SNAPSHOTS', 10))
+
+# Peak allocation buckets (bytes): 1 MB to 512 MB
+PEAK_BUCKETS = tuple(2 ** i * 1024 * 1024 for i in range(10))
+
+rss_gauge = metrics.Gauge('process_resident_memory_bytes', 'Resident memory of the worker processes')
+peak_histogram = metrics.Histogram('memory_peak_bytes', 'Peak allocation while parsing pages (crawl) '
+                                   'and storing images (image), with tracemalloc on', PEAK_BUCKETS)
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+_lock = threading.Lock()
+_snapshots = {}  # id -> (label, taken_at, snapshot, traced bytes)
+_next_snapshot_id = 1
+_peaks = {}  # kind -> {count, total, max, last}
+_active_peaks = 0
+_max_rss = None
+_recycle = None
+_recycling = False
+
+
+def rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        # No procfs: peak instead of current RSS (KB on Linux, bytes on macOS)
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def enable_recycling(max_rss, recycle):
+    """Call ``recycle`` once when RSS exceeds ``max_rss`` bytes after a request"""
+    global _max_rss, _recycle
+    _max_rss = max_rss
+    _recycle = recycle
+
+
+def after_request():
+    """Measure RSS after a request; returns it in bytes"""
+    global _recycling
+    rss = rss_bytes()
+    rss_gauge.set(rss)
+    if _max_rss and rss > _max_rss and not _recycling:
+        _recycling = True
+        logger.warning(f"RSS {rss / 2 ** 20:.0f} MB above {_max_rss / 2 ** 20:.0f} MB, restarting worker {os.getpid()}")
+        _recycle()
+    return rss
+
+
+@contextmanager
+def track_peak(kind):
+    """Record the peak traced allocation of the block under ``kind``"""
+    global _active_peaks
+    if not tracemalloc.is_tracing():
+        yield
+        return
+    with _lock:
+        if not _active_peaks:
+            tracemalloc.reset_peak()
+        _active_peaks += 1
+    start = tracemalloc.get_traced_memory()[0]
+    try:
+        yield
+    finally:
+        peak = max(0, tracemalloc.get_traced_memory()[1] - start)
+        with _lock:
+            _active_peaks -= 1
+            stats = _peaks.setdefault(kind, {'count': 0, 'total': 0, 'max': 0, 'last': 0})
+            stats['count'] += 1
+            stats['total'] += peak
+            stats['max'] = max(stats['max'], peak)
+            stats['last'] = peak
+        peak_histogram.observe(peak, kind=kind)
+
+
+def peak_tracked(kind):
+    """Decorator form of ``track_peak``"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track_peak(kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_tracing(frames):
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames)
+    return True
+
+
+def stop_tracing():
+    """Stop tracemalloc and drop the snapshots"""
+    with _lock:
+        _snapshots.clear()
+    if not tracemalloc.is_tracing():
+        return False
+    tracemalloc.stop()
+    return True
+
+
+def current_snapshot():
+    """Traced allocations now, without tracemalloc's and the import system's own"""
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    ))
+
+
+def take_snapshot(label=None):
+    """Store a snapshot of the traced allocations (tracemalloc must be on)"""
+    global _next_snapshot_id
+    snapshot = current_snapshot()
+    traced = sum(trace.size for trace in snapshot.traces)
+    with _lock:
+        snapshot_id = _next_snapshot_id
+        _next_snapshot_id += 1
+        _snapshots[snapshot_id] = (label or f'snapshot {snapshot_id}', datetime.utcnow(), snapshot, traced)
+        for old_id in sorted(_snapshots)[:-MEMORY_MAX_SNAPSHOTS]:
+            del _snapshots[old_id]
+        return _snapshot_info(snapshot_id)
+
+
+def get_snapshot(snapshot_id):
+    with _lock:
+        entry = _snapshots.get(snapshot_id)
+    return entry[2] if entry else None
+
+
+def _snapshot_info(snapshot_id):
+    label, taken_at, _, traced = _snapshots[snapshot_id]
+    return {
+        'id': snapshot_id,
+        'label': label,
+        'taken_at': taken_at.isoformat(),
+        'traced_bytes': traced
+    }
+
+
+def _location(stat, group_by):
+    frames = stat.traceback if group_by == 'traceback' else stat.traceback[:1]
+    return [f'{frame.filename}:{frame.lineno}' for frame in frames]
+
+
+def top_allocations(snapshot, group_by='lineno', limit=20):
+    """Largest allocation sites of ``snapshot``"""
+    return [{
+        'location': _location(stat, group_by),
+        'size': stat.size,
+        'count': stat.count
+    } for stat in snapshot.statistics(group_by)[:limit]]
+
+
+def diff(old, new, group_by='lineno', limit=20):
+    """Allocation sites that grew most from ``old`` to ``new``"""
+    return [{
+        'location': _location(stat, group_by),
+        'size_diff': stat.size_diff,
+        'count_diff': stat.count_diff,
+        'size': stat.size,
+        'count': stat.count
+    } for stat in new.compare_to(old, group_by)[:limit]]
+
+
+def collect_garbage():
+    """Run a full collection; RSS before and after tells cycles from leaks"""
+    before = rss_bytes()
+    started = time.perf_counter()
+    collected = gc.collect()
+    return {
+        'collected': collected,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+        'rss_before': before,
+        'rss_after': rss_bytes(),
+        'uncollectable': len(gc.garbage)
+    }
+
+
+def status():
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (None, None)
+    with _lock:
+        snapshots = [_snapshot_info(snapshot_id) for snapshot_id in sorted(_snapshots)]
+        peaks = {kind: {
+            'count': stats['count'],
+            'mean': stats['total'] // stats['count'],
+            'max': stats['max'],
+            'last': stats['last']
+        } for kind, stats in _peaks.items()}
+    return {
+        'pid': os.getpid(),
+        'rss': rss_bytes(),
+        'max_rss': _max_rss,
+        'tracing': tracing,
+        'traceback_limit': tracemalloc.get_traceback_limit() if tracing else None,
+        'traced_current': current,
+        'traced_peak': peak,
+        'tracemalloc_overhead': tracemalloc.get_tracemalloc_memory() if tracing else None,
+        'gc_counts': gc.get_count(),
+        'snapshots': snapshots,
+        'peaks': peaks
+    }
@@ -0,0 +1,276 @@
+"""Prometheus metrics, rendered in the text exposition format at ``/metrics``.
+
+A small in-process registry (counters, gauges, histograms with labels)
+instead of ``prometheus_client``. With several worker processes every
+process writes its values to ``METRICS_DIR/<pid>.json`` (at most every
+``METRICS_FLUSH_INTERVAL`` seconds) and a scrape sums the files of all
+processes; counters of exited workers are folded into an archive file so
+totals survive worker recycling. Without ``METRICS_DIR`` a scrape shows the
+answering process only.
+"""
+import os
+import json
+import time
+import fcntl
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+
+# Request latency buckets (seconds)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Outbound calls: crawls take seconds, image generation up to a minute or two
+CALL_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+ARCHIVE_FILE = '_archive.json'
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+def _key(labels):
+    return json.dumps(labels, sort_keys=True) if labels else ''
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        _metrics[name] = self
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Sum of all live processes (e.g. requests in flight)"""
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = _key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with _lock:
+            self.values[_key(labels)] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets):
+        super().__init__(name, documentation)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = _key(labels)
+        with _lock:
+            # Per bucket counts (not cumulative), then sum and count
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+
+http_requests = Counter('http_requests_total', 'HTTP requests by route and status')
+http_duration = Histogram('http_request_duration_seconds', 'HTTP request latency by route', HTTP_BUCKETS)
+http_in_flight = Gauge('http_requests_in_flight', 'HTTP requests being handled')
+call_duration = Histogram('upstream_call_duration_seconds',
+                          'Latency of outbound calls (crawl, llm, image)', CALL_BUCKETS)
+call_errors = Counter('upstream_call_errors_total', 'Failed outbound calls (crawl, llm, image)')
+app_errors = Counter('app_errors_total', 'Unhandled errors by route')
+
+
+class _Call:
+    ok = True
+
+
+@contextmanager
+def track_call(kind):
+    """Time an outbound call; exceptions (or ``call.ok = False``) count as errors"""
+    call = _Call()
+    started = time.perf_counter()
+    try:
+        yield call
+    except BaseException:
+        call.ok = False
+        raise
+    finally:
+        call_duration.observe(time.perf_counter() - started, kind=kind)
+        if not call.ok:
+            call_errors.inc(kind=kind)
+
+
+def snapshot():
+    with _lock:
+        return {name: {key: list(value) if isinstance(value, list) else value
+                       for key, value in metric.values.items()}
+                for name, metric in _metrics.items()}
+
+
+_last_flush = 0.0
+_flusher_pid = None
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        flush(force=True)
+
+
+def flush(force=False):
+    """Write this process's values to ``METRICS_DIR`` (throttled).
+
+    The first call in a process also creates the directory and starts a
+    thread writing them periodically, so values of idle workers reach the
+    scrape too. Write errors are logged, never raised.
+    """
+    global _last_flush, _flusher_pid
+    if not METRICS_DIR:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < METRICS_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    try:
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+            # Only src/serve.py prepares it; the dev server and plain WSGI do not
+            os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics: {str(e)}")
+
+
+atexit.register(lambda: flush(force=True))
+
+
+def _merge(target, values, include_gauges=True):
+    for name, series in values.items():
+        metric = _metrics.get(name)
+        if metric is None or (metric.type == 'gauge' and not include_gauges):
+            continue
+        merged = target.setdefault(name, {})
+        for key, value in series.items():
+            if isinstance(value, list):
+                current = merged.setdefault(key, [0] * len(value))
+                for i, v in enumerate(value):
+                    current[i] += v
+            else:
+                merged[key] = merged.get(key, 0) + value
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def collect():
+    """Values of all processes (or of this one without ``METRICS_DIR``)"""
+    if not METRICS_DIR:
+        return snapshot()
+    flush(force=True)
+    try:
+        return _collect_dir()
+    except OSError as e:
+        logger.warning(f"Could not read metrics of other processes: {str(e)}")
+        return snapshot()
+
+
+def _collect_dir():
+    total = {}
+    with open(os.path.join(METRICS_DIR, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = os.path.join(METRICS_DIR, ARCHIVE_FILE)
+        archive = _read(archive_path)
+        archived = False
+        for name in os.listdir(METRICS_DIR):
+            if not name.endswith('.json') or name == ARCHIVE_FILE:
+                continue
+            path = os.path.join(METRICS_DIR, name)
+            values = _read(path)
+            if _alive(int(name[:-5])):
+                _merge(total, values)
+            else:
+                # Keep the counts of exited workers, drop their gauges
+                _merge(archive, values, include_gauges=False)
+                os.remove(path)
+                archived = True
+        if archived:
+            with open(archive_path, 'w') as f:
+                json.dump(archive, f)
+        _merge(total, archive, include_gauges=False)
+    return total
+
+
+def _labels(key, extra=None):
+    labels = json.loads(key) if key else {}
+    if extra:
+        labels.update(extra)
+    if not labels:
+        return ''
+    body = ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"'))
+                    for name, value in labels.items())
+    return '{' + body + '}'
+
+
+def render():
+    """All metrics in the Prometheus text format"""
+    values = collect()
+    lines = []
+    for name, metric in _metrics.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for key, value in sorted(values.get(name, {}).items()):
+            if metric.type != 'histogram':
+                lines.append(f'{name}{_labels(key)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets, value):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(key, {"le": bound})} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(key, {"le": "+Inf"})} {value[-1]}')
+            lines.append(f'{name}_sum{_labels(key)} {value[-2]}')
+            lines.append(f'{name}_count{_labels(key)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
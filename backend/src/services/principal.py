@@ -0,0 +1,112 @@
+"""Authenticated principal for the current request.
+
+The logged-in user is resolved once per request into ``g.principal``. A
+small per-process TTL cache keyed by user id avoids the user lookup on
+most requests; ``invalidate_principal`` drops an entry when an admin
+changes or deletes the user. Other worker processes keep their entry for
+up to ``AUTH_CACHE_TTL`` seconds, so admins are never cached: their role
+is read from the database on every request, and a demoted or deleted
+admin loses admin rights at once on all workers. A deleted regular user
+may keep access on another worker for up to the TTL.
+
+Routes use the ``login_required`` / ``admin_required`` decorators and read
+the user via ``current_principal()``; code outside a Flask request (the
+async ASGI handlers) calls ``load_principal`` with the session's user id.
+"""
+import os
+import time
+import threading
+from functools import wraps
+from flask import g, jsonify, session
+from src.models.user import db, User
+
+# Seconds a cached (non-admin) principal is trusted before it is loaded again
+PRINCIPAL_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', 30))
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class Principal:
+    """Read-only snapshot of a user, safe to share between requests"""
+
+    __slots__ = ('id', 'username', 'email', 'role', 'created_at')
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.role = user.role
+        self.created_at = user.created_at
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email,
+            'role': self.role,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+def invalidate_principal(user_id):
+    """Forget the cached principal of ``user_id`` (role/user changed)"""
+    with _cache_lock:
+        _cache.pop(user_id, None)
+
+
+def load_principal(user_id):
+    """Principal of ``user_id`` from the cache or the database (needs an app context)"""
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(user_id)
+    if cached and cached[1] > now:
+        return cached[0]
+    user = db.session.get(User, user_id)
+    if not user:
+        invalidate_principal(user_id)
+        return None
+    principal = Principal(user)
+    if principal.is_admin:
+        # Admin rights are checked against the database on every request
+        invalidate_principal(user_id)
+        return principal
+    with _cache_lock:
+        _cache[user_id] = (principal, now + PRINCIPAL_CACHE_TTL)
+    return principal
+
+
+def current_principal():
+    """Return the logged-in principal (or None), resolving it once per request"""
+    if 'principal' not in g:
+        user_id = session.get('user_id')
+        g.principal = load_principal(user_id) if user_id is not None else None
+    return g.principal
+
+
+def login_required(view):
+    """Reject requests without a valid session with 401"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({'error': 'Authentication required'}), 401
+        if current_principal() is None:
+            session.clear()  # Clear invalid session
+            return jsonify({'error': 'User not found'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def admin_required(view):
+    """Reject requests from anyone but a logged-in admin with 403"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        principal = current_principal()
+        if not principal or not principal.is_admin:
+            return jsonify({'error': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,191 @@
+"""On-demand request profiling.
+
+An admin profiles a single request with the header ``X-Profile`` or the
+query flag ``?_profile=`` (value ``sample`` or ``1`` for the sampling
+profiler, ``cprofile`` for deterministic cProfile). ``PROFILE_SAMPLE_RATE``
+additionally profiles that share of all requests with the sampler and keeps
+those slower than ``PROFILE_SAMPLE_MIN_MS`` - cheap enough to leave on in
+production to catch pathological pages.
+
+Output goes to ``PROFILE_DIR`` (oldest files beyond ``PROFILE_MAX_FILES``
+are removed); the response names it in an ``X-Profile`` header:
+
+* ``*.folded``: collapsed stacks, for flamegraph.pl or speedscope.app
+* ``*.pstats``: cProfile data, for ``python -m pstats`` or snakeviz
+
+Only the Flask view is profiled (WSGI requests); the async ASGI handlers
+of ``src/asgi.py`` are not. Under gevent the sampler thread is a greenlet
+and only samples when the request yields, prefer ``cprofile`` there.
+"""
+import os
+import re
+import sys
+import time
+import uuid
+import random
+import cProfile
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from flask import g, request
+from src.services.principal import current_principal
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.path.abspath(os.environ.get('PROFILE_DIR') or
+                              os.path.join(tempfile.gettempdir(), 'seo-generator-profiles'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SAMPLE_MIN_MS = float(os.environ.get('PROFILE_SAMPLE_MIN_MS', 1000))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+
+MODES = {'1': 'sample', 'sample': 'sample', 'cprofile': 'cprofile'}
+EXTENSIONS = {'sample': 'folded', 'cprofile': 'pstats'}
+
+
+class StackSampler:
+    """Samples the stack of one thread every ``interval`` seconds"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f'{stack} {count}\n')
+
+
+class _Profile:
+    def __init__(self, mode, sampled):
+        self.mode = mode
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        if mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+            self.profiler.start()
+
+    def stop(self):
+        if self.mode == 'cprofile':
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+        return (time.perf_counter() - self.started) * 1000
+
+    def write(self, path):
+        if self.mode == 'cprofile':
+            self.profiler.dump_stats(path)
+        else:
+            self.profiler.write(path)
+
+
+def requested_mode():
+    """Profiling mode asked for by the request, or None"""
+    value = request.headers.get('X-Profile') or request.args.get('_profile')
+    return MODES.get(value.lower()) if value else None
+
+
+def artifact_name(mode, duration_ms):
+    """``<timestamp>-<duration>ms-<method>-<path>-<id>.<ext>``"""
+    path = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_')[:60] or 'root'
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+    return f'{stamp}-{duration_ms:.0f}ms-{request.method}-{path}-{uuid.uuid4().hex[:8]}.{EXTENSIONS[mode]}'
+
+
+def list_artifacts():
+    """Stored profiles, newest first"""
+    try:
+        entries = [entry for entry in os.scandir(PROFILE_DIR)
+                   if entry.is_file() and entry.name.rsplit('.', 1)[-1] in EXTENSIONS.values()]
+    except FileNotFoundError:
+        return []
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    return [{
+        'name': entry.name,
+        'format': entry.name.rsplit('.', 1)[-1],
+        'size': entry.stat().st_size,
+        'created_at': datetime.utcfromtimestamp(entry.stat().st_mtime).isoformat()
+    } for entry in entries]
+
+
+def rotate():
+    """Remove the oldest profiles beyond ``PROFILE_MAX_FILES``"""
+    for artifact in list_artifacts()[PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, artifact['name']))
+        except FileNotFoundError:
+            pass  # Removed by another worker
+
+
+def _start():
+    mode = requested_mode()
+    if mode:
+        principal = current_principal()
+        if principal is None or not principal.is_admin:
+            return
+        g._profile = _Profile(mode, sampled=False)
+    elif PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        g._profile = _Profile('sample', sampled=True)
+
+
+def _finish(response):
+    profile = g.pop('_profile', None)
+    if profile is None:
+        return response
+    duration_ms = profile.stop()
+    if profile.sampled and duration_ms < PROFILE_SAMPLE_MIN_MS:
+        return response
+    name = artifact_name(profile.mode, duration_ms)
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile.write(os.path.join(PROFILE_DIR, name))
+        rotate()
+    except OSError as e:
+        logger.warning(f"Could not write profile {name}: {str(e)}")
+        return response
+    logger.info(f"Profiled {request.method} {request.path} ({duration_ms:.0f} ms): {name}")
+    if not profile.sampled:
+        response.headers['X-Profile'] = name
+    return response
+
+
+def _cleanup(exc):
+    # after_request is skipped if the response could not be built
+    profile = g.pop('_profile', None)
+    if profile is not None:
+        profile.stop()
+
+
+def init_app(app):
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_cleanup)
@@ -0,0 +1,190 @@
+"""In-memory manifest of the React build in ``src/static``.
+
+Built once at startup: every file is read, hashed (ETag) and, if it is
+compressible, paired with ``.br``/``.gz`` variants, taken from precompressed
+siblings when the build ships them or compressed here otherwise (Brotli
+only if the ``brotli`` package is installed). Requests are answered from
+memory; the request path never touches the filesystem.
+
+``precompress`` writes those siblings once per deploy (``src/serve.py``
+runs it in the master), so workers do not each spend the Brotli time on
+every boot. Siblings older than their file are ignored.
+
+Caching:
+
+* Vite's hashed assets (``assets/index-3f9c2a1b.js``) are immutable.
+* Everything else, especially ``index.html``, is ``no-cache`` so a deploy
+  is picked up at once (revalidated with the ETag, usually a 304).
+"""
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+import logging
+from datetime import datetime, timezone
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+HASHED_ASSET_MAX_AGE = 365 * 24 * 3600
+
+# Vite appends a content hash of 8+ characters: name-<hash>.ext
+_hashed_re = re.compile(r'[-.][A-Za-z0-9_-]{8,}\.[a-z0-9]+$')
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'application/manifest+json', 'image/x-icon', 'image/vnd.microsoft.icon')
+
+# Smaller files are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+# Directories next to the bundle that are not part of it
+SKIP_DIRS = {'uploads'}
+
+
+class StaticFile:
+    __slots__ = ('body', 'variants', 'mimetype', 'etag', 'last_modified', 'immutable')
+
+    def __init__(self, body, mimetype, last_modified, immutable):
+        self.body = body
+        self.variants = {}  # content encoding -> compressed body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.last_modified = last_modified
+        self.immutable = immutable
+
+
+def _compressible(mimetype):
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _fresh(sibling, path):
+    """Whether the precompressed ``sibling`` of ``path`` exists and is current"""
+    try:
+        return os.path.getmtime(sibling) >= os.path.getmtime(path)
+    except OSError:
+        return False
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=11)
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def _walk(root):
+    """(path, name, sibling names) of the bundle's files, without precompressed siblings"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        names = set(filenames)
+        for name in filenames:
+            if name.endswith(('.br', '.gz')) and name[:-3] in names:
+                continue  # Precompressed sibling, attached to its file
+            yield os.path.join(dirpath, name), name, names
+
+
+def precompress(root):
+    """Write missing or stale ``.br``/``.gz`` siblings; returns the number written"""
+    written = 0
+    encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+    for path, name, _ in _walk(root):
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if not _compressible(mimetype) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+            continue
+        body = None
+        for encoding in encodings:
+            sibling = f"{path}.{'br' if encoding == 'br' else 'gz'}"
+            if _fresh(sibling, path):
+                continue
+            body = body if body is not None else _read(path)
+            compressed = _compress(body, encoding)
+            if len(compressed) >= len(body):
+                continue
+            tmp_path = f'{sibling}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, sibling)
+            written += 1
+    return written
+
+
+class StaticManifest:
+    def __init__(self):
+        self.files = {}
+
+    def init_app(self, app):
+        if app.static_folder:
+            self.build(app.static_folder)
+
+    def build(self, root):
+        """Read ``root`` into memory; returns the number of files"""
+        files = {}
+        for path, name, names in _walk(root):
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            entry = StaticFile(
+                _read(path), mimetype,
+                datetime.fromtimestamp(os.path.getmtime(path), timezone.utc),
+                relative.startswith('assets/') and bool(_hashed_re.search(name))
+            )
+            if _compressible(mimetype) and len(entry.body) >= MIN_COMPRESS_SIZE:
+                self._add_variants(entry, path, names, name)
+            files[relative] = entry
+        self.files = files
+        logger.info(f"Static manifest built with {len(files)} files")
+        return len(files)
+
+    @staticmethod
+    def _add_variants(entry, path, names, name):
+        if f"{name}.br" in names and _fresh(f"{path}.br", path):
+            entry.variants['br'] = _read(f"{path}.br")
+        elif brotli is not None:
+            entry.variants['br'] = _compress(entry.body, 'br')
+        if f"{name}.gz" in names and _fresh(f"{path}.gz", path):
+            entry.variants['gzip'] = _read(f"{path}.gz")
+        else:
+            entry.variants['gzip'] = _compress(entry.body, 'gzip')
+        # Keep only variants that are actually smaller
+        for encoding in list(entry.variants):
+            if len(entry.variants[encoding]) >= len(entry.body):
+                del entry.variants[encoding]
+
+    def lookup(self, path):
+        """Manifest entry for ``path``; unknown paths get index.html (SPA routes)"""
+        return self.files.get(path) or self.files.get('index.html')
+
+    def response(self, entry):
+        encoding = None
+        for candidate in ('br', 'gzip'):
+            if candidate in entry.variants and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+        body = entry.variants[encoding] if encoding else entry.body
+
+        response = Response(body, mimetype=entry.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if entry.variants:
+            response.vary.add('Accept-Encoding')
+        response.set_etag(f"{entry.etag}-{encoding}" if encoding else entry.etag)
+        response.last_modified = entry.last_modified
+        if entry.immutable:
+            response.cache_control.public = True
+            response.cache_control.max_age = HASHED_ASSET_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+
+static_manifest = StaticManifest()
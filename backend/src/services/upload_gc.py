@@ -0,0 +1,215 @@
+"""Garbage collection and disk quotas for generated images.
+
+A background thread runs ``collect`` every ``IMAGE_GC_INTERVAL`` seconds
+(one process at a time, guarded by a lock file):
+
+1. Orphans: files in ``static/uploads`` that no GeneratedImage URL points
+   at are removed once they are older than ``IMAGE_GC_GRACE`` seconds
+   (younger files may belong to an image that is still being saved).
+2. Per-user quota (``IMAGE_QUOTA_USER_MB``): users above it lose their
+   oldest images until they fit. Shared files count for every user
+   referencing them.
+3. Global quota (``IMAGE_QUOTA_TOTAL_MB``): while the uploads directory is
+   larger, the oldest images of all users are evicted.
+
+Eviction is least-recently-used by creation time: reusing an image via the
+prompt cache creates a new row, so a shared file stays as long as its
+newest reference. Evicted images are deleted like via the API (row first,
+then the files once unreferenced). A quota of 0 disables it.
+"""
+import os
+import time
+import fcntl
+import threading
+import logging
+from sqlalchemy import func
+from src.models.user import db
+from src.models.image import GeneratedImage
+from src.services import image_store
+
+logger = logging.getLogger(__name__)
+
+IMAGE_GC_INTERVAL = int(os.environ.get('IMAGE_GC_INTERVAL', 3600))
+IMAGE_GC_GRACE = int(os.environ.get('IMAGE_GC_GRACE', 3600))
+IMAGE_QUOTA_USER_MB = int(os.environ.get('IMAGE_QUOTA_USER_MB', 0))
+IMAGE_QUOTA_TOTAL_MB = int(os.environ.get('IMAGE_QUOTA_TOTAL_MB', 0))
+
+LOCK_FILE = '.gc.lock'
+
+# Bytes a row accounts for (original plus derivatives)
+ROW_BYTES = (
+    func.coalesce(GeneratedImage.image_bytes, 0) + func.coalesce(GeneratedImage.webp_bytes, 0) +
+    func.coalesce(GeneratedImage.avif_bytes, 0) + func.coalesce(GeneratedImage.thumbnail_bytes, 0)
+)
+
+
+def _referenced_paths():
+    paths = set()
+    columns = [getattr(GeneratedImage, name) for name in image_store.URL_FIELDS]
+    for row in db.session.query(*columns).yield_per(1000):
+        for url in row:
+            path = image_store.path_for_url(url)
+            if path:
+                paths.add(os.path.normpath(path))
+    return paths
+
+
+def remove_orphans(report, grace=IMAGE_GC_GRACE, dry_run=False):
+    """Delete unreferenced files older than ``grace`` seconds; returns the bytes left on disk"""
+    root = image_store.upload_root()
+    if not os.path.isdir(root):
+        return 0
+    referenced = _referenced_paths()
+    cutoff = time.time() - grace
+    disk_bytes = 0
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        for name in filenames:
+            if name.startswith('.'):
+                continue
+            path = os.path.normpath(os.path.join(dirpath, name))
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if path in referenced or stat.st_mtime > cutoff:
+                disk_bytes += stat.st_size
+                continue
+            report['orphans_removed'] += 1
+            report['orphan_bytes'] += stat.st_size
+            if not dry_run:
+                os.remove(path)
+            else:
+                disk_bytes += stat.st_size
+        if dirpath != root and not dry_run:
+            try:
+                # Only succeeds for empty shard directories; skip ones just created
+                if os.stat(dirpath).st_mtime < cutoff:
+                    os.rmdir(dirpath)
+            except OSError:
+                pass
+    return disk_bytes
+
+
+def _evict(images, report, dry_run):
+    """Delete ``images`` (rows, then their files); returns the bytes freed"""
+    freed = 0
+    for image in images:
+        if dry_run:
+            report['evicted_images'] += 1
+            freed += image.row_bytes
+            continue
+        row = db.session.get(GeneratedImage, image.id)
+        if row is None:
+            # Deleted by its owner meanwhile
+            continue
+        report['evicted_images'] += 1
+        refs = image_store.image_refs(row)
+        # One row, not a bulk DELETE: a per-user change event and data version
+        db.session.delete(row)
+        db.session.commit()
+        freed += image_store.release(*refs)
+    report['evicted_bytes'] += freed
+    return freed
+
+
+def _oldest(query, excess):
+    """Oldest images of ``query`` whose rows add up to at least ``excess`` bytes"""
+    columns = [GeneratedImage.id, GeneratedImage.content_hash, ROW_BYTES.label('row_bytes')]
+    columns += [getattr(GeneratedImage, name) for name in image_store.URL_FIELDS]
+    selected = []
+    for row in query.with_entities(*columns).order_by(
+            GeneratedImage.created_at, GeneratedImage.id).yield_per(500):
+        if excess <= 0:
+            break
+        selected.append(row)
+        excess -= row.row_bytes
+    return selected
+
+
+def enforce_user_quota(report, quota_bytes, dry_run=False):
+    usage = db.session.query(GeneratedImage.user_id, func.sum(ROW_BYTES)).group_by(
+        GeneratedImage.user_id
+    ).having(func.sum(ROW_BYTES) > quota_bytes).all()
+    for user_id, used in usage:
+        images = _oldest(GeneratedImage.query.filter_by(user_id=user_id), used - quota_bytes)
+        _evict(images, report, dry_run)
+
+
+def enforce_total_quota(report, quota_bytes, disk_bytes, dry_run=False):
+    """Evict the oldest images until ``disk_bytes`` fit; returns the bytes left"""
+    # Shared files may not be freed by one eviction, so re-check the disk
+    for _ in range(3):
+        if disk_bytes <= quota_bytes:
+            break
+        freed = _evict(_oldest(GeneratedImage.query, disk_bytes - quota_bytes), report, dry_run)
+        if dry_run or not freed:
+            break
+        disk_bytes -= freed
+    return disk_bytes
+
+
+def collect(grace=IMAGE_GC_GRACE, user_quota_mb=IMAGE_QUOTA_USER_MB,
+            total_quota_mb=IMAGE_QUOTA_TOTAL_MB, dry_run=False):
+    """Run one GC pass (needs an app context) and return its report.
+
+    Returns None if another process is collecting at the moment.
+    """
+    root = image_store.upload_root()
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK_FILE), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+
+        started = time.perf_counter()
+        report = {
+            'dry_run': dry_run,
+            'orphans_removed': 0,
+            'orphan_bytes': 0,
+            'evicted_images': 0,
+            'evicted_bytes': 0,
+        }
+        if user_quota_mb:
+            enforce_user_quota(report, user_quota_mb * 1024 * 1024, dry_run)
+        disk_bytes = remove_orphans(report, grace, dry_run)
+        if total_quota_mb:
+            disk_bytes = enforce_total_quota(report, total_quota_mb * 1024 * 1024, disk_bytes, dry_run)
+        report['reclaimed_bytes'] = report['orphan_bytes'] + report['evicted_bytes']
+        report['disk_bytes'] = disk_bytes
+        report['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return report
+
+
+class UploadCollector:
+    """Runs ``collect`` periodically on a background thread"""
+
+    def __init__(self):
+        self._app = None
+        self.last_report = None
+
+    def init_app(self, app):
+        self._app = app
+        if IMAGE_GC_INTERVAL > 0:
+            threading.Thread(target=self._loop, name='upload-gc', daemon=True).start()
+
+    def run(self, **options):
+        report = collect(**options)
+        if report is not None:
+            self.last_report = report
+            logger.info(f"Upload GC: removed {report['orphans_removed']} orphans ({report['orphan_bytes']} bytes), "
+                        f"evicted {report['evicted_images']} images ({report['evicted_bytes']} bytes), "
+                        f"{report['disk_bytes']} bytes on disk")
+        return report
+
+    def _loop(self):
+        while True:
+            time.sleep(IMAGE_GC_INTERVAL)
+            try:
+                with self._app.app_context():
+                    self.run()
+            except Exception as e:
+                logger.exception(f"Error in upload GC: {str(e)}")
+
+
+upload_collector = UploadCollector()
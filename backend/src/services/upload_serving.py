@@ -0,0 +1,77 @@
+"""HTTP delivery of generated images from ``static/uploads``.
+
+Upload file names never change content (content hashes, formerly uuid4),
+so responses are cacheable forever: ``Cache-Control: immutable`` with a
+strong ETag (the content hash, or size and mtime for legacy files).
+Conditional requests get 304 and ranges 206 via Werkzeug.
+
+``UPLOAD_ACCEL`` hands the transfer to a front proxy instead:
+
+* ``nginx``: ``X-Accel-Redirect: <UPLOAD_ACCEL_PREFIX>/<file>`` (an
+  ``internal`` location aliased to the uploads directory),
+* ``sendfile``: ``X-Sendfile: <absolute path>`` (Apache, lighttpd).
+"""
+import os
+import re
+import stat as stat_mode
+import mimetypes
+from flask import Response, abort, request, send_file
+from werkzeug.security import safe_join
+from src.services import image_store
+
+UPLOAD_MAX_AGE = int(os.environ.get('UPLOAD_MAX_AGE', 365 * 24 * 3600))
+UPLOAD_ACCEL = os.environ.get('UPLOAD_ACCEL', '').lower()
+UPLOAD_ACCEL_PREFIX = os.environ.get('UPLOAD_ACCEL_PREFIX', '/protected-uploads').rstrip('/')
+
+_content_hash_re = re.compile(r'^[0-9a-f]{64}(?:_thumb)?\.')
+
+
+def upload_etag(filename, stat):
+    """Strong ETag of an upload; derivatives get their own tag"""
+    name = os.path.basename(filename)
+    if _content_hash_re.match(name):
+        # The name is the content hash (plus derivative suffix)
+        return name
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def _cache_headers(response, etag):
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = UPLOAD_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+def send_upload(filename):
+    """Response for ``/static/uploads/<filename>``"""
+    parts = filename.split('/')
+    # Partial writes (tmp/*.part) and lock files are not uploads
+    if parts[0] == image_store.TMP_DIR or any(part.startswith('.') for part in parts):
+        abort(404)
+    root = image_store.upload_root()
+    path = safe_join(root, filename)
+    if path is None:
+        abort(404)
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        abort(404)
+    if not stat_mode.S_ISREG(stat.st_mode):
+        abort(404)
+    etag = upload_etag(filename, stat)
+
+    if UPLOAD_ACCEL in ('nginx', 'sendfile'):
+        if request.if_none_match.contains(etag):
+            return _cache_headers(Response(status=304), etag)
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        if UPLOAD_ACCEL == 'nginx':
+            response.headers['X-Accel-Redirect'] = f"{UPLOAD_ACCEL_PREFIX}/{filename}"
+        else:
+            response.headers['X-Sendfile'] = path
+        return _cache_headers(response, etag)
+
+    response = send_file(path, etag=etag, conditional=True, max_age=UPLOAD_MAX_AGE,
+                         last_modified=stat.st_mtime)
+    response.accept_ranges = 'bytes'
+    return _cache_headers(response, etag)
@@ -0,0 +1,83 @@
+"""Warm-up of a freshly started worker.
+
+Startup only does what the first request needs; everything else is paid
+here, in a background thread right after boot, instead of by the first
+analysis: importing openai, requests and bs4 (deferred in the routes),
+running the page and response parsers once so their regular expressions
+are compiled, and opening the first database connection.
+
+``STARTUP_WARMUP=0`` turns it off.
+"""
+import os
+import time
+import logging
+import threading
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+STARTUP_WARMUP = os.environ.get('STARTUP_WARMUP', '1').lower() not in ('0', 'false', 'no')
+
+# Small page touching the contact, opening hours and footer extraction
+SAMPLE_PAGE = """<!DOCTYPE html><html><head><title>Beispiel GmbH</title>
+<meta name="description" content="Backwaren aus Meisterhand"></head>
+<body><main><h1>Willkommen</h1><p>Wir backen seit 1950 Brot, Brötchen und Kuchen
+nach traditionellen Rezepten mit regionalen Zutaten für unsere Kunden.</p></main>
+<footer>Beispiel GmbH, Hauptstraße 1, 12345 Musterstadt, Tel. 030 1234567,
+info@beispiel.de. Öffnungszeiten: Mo-Fr 7:00-18:00 Uhr, Sa 7:00-12:00 Uhr</footer>
+</body></html>""".encode()
+
+SAMPLE_RESPONSE = """Kurzbeschreibung (max. 150 Zeichen)
+Wir backen Brot.
+
+Langbeschreibung (ca. 750 Zeichen)
+Wir backen seit 1950.
+
+Keywords
+– Bäckerei, Brot
+
+Öffnungszeiten
+– Mo–Fr: 7:00–18:00
+
+Impressum
+Unternehmen: Beispiel GmbH"""
+
+
+def warm_up(app):
+    """Run the warm-up steps; returns their durations in ms"""
+    timings = {}
+
+    started = time.perf_counter()
+    import openai  # noqa: F401
+    import requests  # noqa: F401
+    import bs4  # noqa: F401
+    timings['imports'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    from src.routes.seo import parse_website, parse_seo_response
+    parse_website('https://beispiel.de', SAMPLE_PAGE)
+    parse_seo_response(SAMPLE_RESPONSE)
+    timings['parsers'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    from src.models.user import db
+    with app.app_context():
+        db.session.execute(text('SELECT 1'))
+        db.session.remove()
+    timings['database'] = time.perf_counter() - started
+
+    return {step: round(seconds * 1000, 1) for step, seconds in timings.items()}
+
+
+def _run(app):
+    try:
+        timings = warm_up(app)
+        logger.info(f"Warm-up finished: {timings}")
+    except Exception as e:
+        logger.warning(f"Warm-up failed: {str(e)}")
+
+
+def init_app(app):
+    """Start the warm-up in the background (once per worker)"""
+    if STARTUP_WARMUP:
+        threading.Thread(target=_run, args=(app,), name='warm-up', daemon=True).start()
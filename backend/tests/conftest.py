@@ -0,0 +1,28 @@
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+# Settings are read at import time: point the app at a scratch database and upload directory first
+_scratch = tempfile.mkdtemp(prefix='seo-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_scratch, 'test.db')}"
+os.environ['UPLOAD_DIR'] = os.path.join(_scratch, 'uploads')
+os.environ.pop('METRICS_DIR', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app():
+    from src.main import create_app
+    app = create_app(start_services=False)
+    app.config['TESTING'] = True
+    yield app
+    shutil.rmtree(_scratch, ignore_errors=True)
+
+
+@pytest.fixture
+def admin(app):
+    from src.models.user import User
+    with app.app_context():
+        return User.query.filter_by(username='admin').one().id
@@ -0,0 +1,129 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from src.asgi import PooledWsgiToAsgi
+
+
+def http_scope(path='/', method='GET', headers=()):
+    return {'type': 'http', 'method': method, 'path': path, 'root_path': '', 'query_string': b'a=1',
+            'http_version': '1.1', 'headers': list(headers), 'server': ('testserver', 80),
+            'client': ('127.0.0.1', 5000)}
+
+
+async def call(app, scope, body=b''):
+    """Run one request; returns (status, headers, body chunks)"""
+    messages = [{'type': 'http.request', 'body': body[:3], 'more_body': True},
+                {'type': 'http.request', 'body': body[3:]}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = sent[0]
+    chunks = [m.get('body', b'') for m in sent[1:]]
+    assert not sent[-1].get('more_body')
+    return start['status'], dict(start['headers']), chunks
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(4) as executor:
+        yield executor
+
+
+def test_requests_run_in_parallel_on_the_pool(executor):
+    threads = set()
+
+    def slow(environ, start_response):
+        threads.add(threading.current_thread().name)
+        time.sleep(0.3)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    adapter = PooledWsgiToAsgi(slow, executor)
+
+    async def both():
+        return await asyncio.gather(call(adapter, http_scope()), call(adapter, http_scope()))
+
+    started = time.perf_counter()
+    results = asyncio.run(both())
+    assert time.perf_counter() - started < 0.55
+    assert [status for status, _, _ in results] == [200, 200]
+    assert len(threads) == 2
+
+
+def test_environ_body_and_streamed_chunks(executor):
+    closed = []
+    seen = {}
+
+    class Body:
+        def __iter__(self):
+            yield b'one,'
+            yield b'two'
+
+        def close(self):
+            closed.append(True)
+
+    def app(environ, start_response):
+        seen.update(environ)
+        seen['body'] = environ['wsgi.input'].read()
+        start_response('201 Created', [('Content-Type', 'text/plain'), ('X-Test', 'yes')])
+        return Body()
+
+    scope = http_scope('/api/x', 'POST', [(b'content-type', b'application/json'), (b'x-a', b'1'), (b'x-a', b'2')])
+    status, headers, chunks = asyncio.run(call(PooledWsgiToAsgi(app, executor), scope, b'{"k": 1}'))
+
+    assert status == 201
+    assert headers[b'x-test'] == b'yes'
+    assert chunks[:2] == [b'one,', b'two']
+    assert closed == [True]
+    assert seen['body'] == b'{"k": 1}'
+    assert (seen['PATH_INFO'], seen['QUERY_STRING'], seen['CONTENT_TYPE']) == ('/api/x', 'a=1', 'application/json')
+    assert seen['HTTP_X_A'] == '1,2'
+    assert seen['REMOTE_ADDR'] == '127.0.0.1'
+
+
+def test_content_length_truncates_body(executor):
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Length', '3')])
+        return [b'abcdef']
+
+    _, _, chunks = asyncio.run(call(PooledWsgiToAsgi(app, executor), http_scope()))
+    assert b''.join(chunks) == b'abc'
+
+
+def test_too_many_duplicate_headers(executor):
+    adapter = PooledWsgiToAsgi(lambda environ, start_response: [], executor, duplicate_header_limit=2)
+    status, _, _ = asyncio.run(call(adapter, http_scope(headers=[(b'x-a', b'1')] * 3)))
+    assert status == 400
+
+
+def test_async_handlers_go_through_after_request(app):
+    import gzip
+    from src.asgi import AsgiApp
+
+    async def handler(request):
+        return {'items': ['x' * 100] * 50}, 200, {'X-Handler': 'yes'}
+
+    asgi_app = AsgiApp(app, 2)
+    asgi_app.routes = {('POST', '/api/test/async'): handler}
+    scope = http_scope('/api/test/async', 'POST', [(b'origin', b'https://app.example.com'),
+                                                   (b'accept-encoding', b'gzip')])
+    try:
+        status, headers, chunks = asyncio.run(call(asgi_app, scope, b'{}'))
+    finally:
+        asgi_app.executor.shutdown()
+
+    assert status == 200
+    assert headers[b'x-handler'] == b'yes'
+    assert headers[b'access-control-allow-origin'] == b'https://app.example.com'
+    assert headers[b'content-encoding'] == b'gzip'
+    body = b''.join(chunks)
+    assert int(headers[b'content-length']) == len(body)
+    assert gzip.decompress(body).startswith(b'{"items"')
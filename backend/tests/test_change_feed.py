@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import insert, inspect
+from src.models.user import db, User
+from src.models.change_event import ChangeEvent
+from src.services import admission, change_feed
+
+
+@pytest.fixture
+def feed(app, admin):
+    with app.app_context():
+        ChangeEvent.query.delete()
+        db.session.commit()
+        yield SimpleNamespace(id=admin, is_admin=True)
+        db.session.remove()
+
+
+def commit_event(event_id, user_id):
+    """A writer committing the event ``event_id`` (ids are handed out before commit on PostgreSQL)"""
+    with db.engine.begin() as conn:
+        conn.execute(insert(ChangeEvent.__table__), [
+            dict(change_feed._event('image', 'delete', event_id, user_id), id=event_id)
+        ])
+
+
+def test_late_commit_of_a_lower_id_is_not_skipped(feed):
+    since = change_feed.latest_cursor()
+    # Writer A took id 1001 but commits after writer B (id 1002) was already read
+    commit_event(1002, feed.id)
+    events, cursor = change_feed.fetch(feed, since)
+    assert [e['entity_id'] for e in events] == [1002]
+
+    commit_event(1001, feed.id)
+    events, cursor = change_feed.fetch(feed, cursor)
+
+    assert [e['entity_id'] for e in events] == [1001]
+    assert change_feed.fetch(feed, cursor) == ([], cursor)
+
+
+def test_fetch_keeps_request_objects_attached(feed):
+    user = db.session.get(User, feed.id)
+    change_feed.fetch(feed, change_feed.latest_cursor())
+
+    assert not inspect(user).detached
+    assert user.username == 'admin'
+
+
+@pytest.mark.parametrize('worker_class', ['gthread', 'gevent', 'eventlet', 'asgi'])
+def test_feeds_and_analyses_leave_a_thread_free(worker_class):
+    for capacity in range(3, 200):
+        slots, queue = admission.default_slots(worker_class, capacity, capacity)
+        feeds = change_feed.default_slots(worker_class, capacity, capacity, slots, queue)
+        if worker_class == 'asgi':
+            # Analyses wait on the event loop, not on request threads
+            slots = queue = 0
+        assert slots + queue + feeds < capacity, capacity
@@ -0,0 +1,71 @@
+import pytest
+from src.models.user import db, User, SEOResult
+from src.models.data_version import DataVersion
+
+
+@pytest.fixture
+def users(app):
+    with app.app_context():
+        SEOResult.query.delete()
+        ids = []
+        for name in ('dv-anna', 'dv-ben'):
+            user = User.query.filter_by(username=name).first()
+            if user is None:
+                user = User(username=name, email=f'{name}@example.com', role='user')
+                user.set_password('secret')
+                db.session.add(user)
+            db.session.commit()
+            ids.append(user.id)
+        DataVersion.query.delete()
+        db.session.commit()
+        yield ids
+        SEOResult.query.delete()
+        db.session.commit()
+        db.session.remove()
+
+
+def login(app, username, password):
+    client = app.test_client()
+    assert client.post('/api/auth/login', json={'username': username, 'password': password}).status_code == 200
+    return client
+
+
+def add_result(user_id, domain):
+    db.session.add(SEOResult(domain=domain, user_id=user_id, short_description='x'))
+    db.session.commit()
+
+
+def test_writes_bump_only_per_user_counters(app, users):
+    anna, ben = users
+    add_result(anna, 'dv-one.de')
+    add_result(ben, 'dv-two.de')
+    scopes = {row.scope for row in DataVersion.query}
+    assert scopes == {f'seo_result:user:{anna}', f'seo_result:user:{ben}'}
+
+
+def test_admin_etag_follows_every_user(app, users):
+    anna, ben = users
+    admin = login(app, 'admin', 'admin123')
+    add_result(anna, 'dv-one.de')
+    add_result(anna, 'dv-two.de')
+    etag = admin.get('/api/seo/results').headers['ETag']
+
+    # Ben's counter stays below Anna's: the maximum would not change
+    add_result(ben, 'dv-three.de')
+    response = admin.get('/api/seo/results', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.get_json()['results']) == 3
+
+    assert admin.get('/api/seo/results', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_user_etag_ignores_other_users(app, users):
+    anna, ben = users
+    client = login(app, 'dv-anna', 'secret')
+    add_result(anna, 'dv-one.de')
+    etag = client.get('/api/seo/results').headers['ETag']
+
+    add_result(ben, 'dv-two.de')
+    assert client.get('/api/seo/results', headers={'If-None-Match': etag}).status_code == 304
+    add_result(anna, 'dv-three.de')
+    assert client.get('/api/seo/results', headers={'If-None-Match': etag}).status_code == 200
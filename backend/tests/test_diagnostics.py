@@ -0,0 +1,23 @@
+import pytest
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    assert client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin123'}).status_code == 200
+    return client
+
+
+@pytest.fixture
+def tracing(admin_client):
+    assert admin_client.post('/api/diagnostics/memory/tracemalloc', json={'frames': 1}).status_code == 200
+    yield admin_client
+    admin_client.delete('/api/diagnostics/memory/tracemalloc')
+
+
+@pytest.mark.parametrize('limit, status', [('5', 200), ('abc', 200), ('0', 400), ('201', 400), ('-3', 400)])
+def test_memory_top_limit(tracing, limit, status):
+    response = tracing.get(f'/api/diagnostics/memory/top?limit={limit}')
+    assert response.status_code == status
+    if status == 400:
+        assert 'limit' in response.get_json()['error']
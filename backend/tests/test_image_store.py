@@ -0,0 +1,188 @@
+import os
+import base64
+import threading
+import time
+import pytest
+from src.models.user import db
+from src.models.image import GeneratedImage, ImageJob
+from src.routes import image_generator
+from src.services import image_store
+
+PNG = base64.b64encode(b'\x89PNG\r\n\x1a\n' + os.urandom(64)).decode()
+
+
+def stored_image(user_id, b64=PNG, user_input='Bäckerei am Markt', image_type='kachel'):
+    """A GeneratedImage row with its file in the store"""
+    content_hash, path, _ = image_store.store_base64(b64)
+    prompt, size = image_generator.build_prompt(user_input, image_type)
+    image = GeneratedImage(
+        user_id=user_id, user_input=user_input, image_type=image_type,
+        image_url=image_store.url_for_path(path), prompt_used=prompt,
+        prompt_hash=GeneratedImage.prompt_hash_for(prompt, size), image_size=size,
+        content_hash=content_hash
+    )
+    db.session.add(image)
+    db.session.commit()
+    return image.id, content_hash, path
+
+
+def delete_and_release(app, image_id, result, before_release=None):
+    """What DELETE /api/images/delete/<id> does, on another thread and session"""
+    deleted = threading.Event()
+
+    def run():
+        with app.app_context():
+            image = db.session.get(GeneratedImage, image_id)
+            refs = image_store.image_refs(image)
+            db.session.delete(image)
+            db.session.commit()
+            deleted.set()
+            if before_release is not None:
+                before_release.wait(5)
+            result.append(image_store.release(*refs))
+            db.session.remove()
+    thread = threading.Thread(target=run)
+    thread.start()
+    deleted.wait(5)
+    return thread
+
+
+@pytest.fixture
+def clean(app):
+    with app.app_context():
+        GeneratedImage.query.delete()
+        ImageJob.query.delete()
+        db.session.commit()
+        yield
+        db.session.remove()
+
+
+def release_during_commit(monkeypatch, app, image_id):
+    """Delete ``image_id`` now; release its files while the writer is between file check and commit"""
+    released = []
+    go = threading.Event()
+    thread = delete_and_release(app, image_id, released, before_release=go)
+    is_stored = image_store.is_stored
+
+    def racing_is_stored(url):
+        if not go.is_set():
+            go.set()
+            # Give release() time to run (or block)
+            time.sleep(0.3)
+        return is_stored(url)
+
+    monkeypatch.setattr(image_store, 'is_stored', racing_is_stored)
+    return thread, released
+
+
+def test_release_waits_for_reuse_commit(app, admin, clean, monkeypatch):
+    image_id, content_hash, path = stored_image(admin)
+    race = []
+    reusable_images = image_generator.reusable_images
+
+    def racing_reusable_images(user_id, prompt_hash, limit):
+        # The image is picked for reuse, then deleted by its owner
+        images = reusable_images(user_id, prompt_hash, limit)
+        race.extend(release_during_commit(monkeypatch, app, image_id))
+        return images
+
+    monkeypatch.setattr(image_generator, 'reusable_images', racing_reusable_images)
+    payload, status = image_generator.create_image_job(
+        admin, {'user_input': 'Bäckerei am Markt', 'image_type': 'kachel', 'allow_reuse': True},
+        submit=lambda args, count: True
+    )
+    thread, released = race
+    thread.join(5)
+
+    assert status == 202
+    assert payload['job']['status'] == 'done'
+    assert released == [0]
+    assert os.path.isfile(path)
+    assert GeneratedImage.query.filter_by(content_hash=content_hash).count() == 1
+
+
+def test_release_waits_for_new_variant_commit(app, admin, clean, monkeypatch):
+    image_id, content_hash, path = stored_image(admin)
+    # The API returned the same bytes again
+    fields = image_generator.store_image_response(
+        type('Response', (), {'data': [type('Item', (), {'b64_json': PNG})()]})()
+    )
+    job = ImageJob(id='a' * 32, user_id=admin, user_input='x', image_type='kachel', variants=1, status='running')
+    db.session.add(job)
+    db.session.commit()
+    thread, released = release_during_commit(monkeypatch, app, image_id)
+
+    image_generator.finish_variant(job.id, admin, 'x', 'kachel', 'prompt', '1024x1024', fields)
+    thread.join(5)
+
+    assert released == [0]
+    assert os.path.isfile(path)
+    assert db.session.get(ImageJob, job.id).status == 'done'
+
+
+def test_variant_fails_if_release_won(app, admin, clean):
+    image_id, content_hash, path = stored_image(admin)
+    fields = {'image_url': image_store.url_for_path(path), 'content_hash': content_hash}
+    released = []
+    delete_and_release(app, image_id, released).join(5)
+    assert released and not os.path.exists(path)
+
+    job = ImageJob(id='b' * 32, user_id=admin, user_input='x', image_type='kachel', variants=1, status='running')
+    db.session.add(job)
+    db.session.commit()
+    image_generator.finish_variant(job.id, admin, 'x', 'kachel', 'prompt', '1024x1024', fields)
+
+    assert db.session.get(ImageJob, job.id).status == 'failed'
+    assert GeneratedImage.query.filter_by(content_hash=content_hash).count() == 0
+
+
+def test_store_after_release_writes_the_file_again(app, admin, clean):
+    image_id, content_hash, path = stored_image(admin)
+    released = []
+    delete_and_release(app, image_id, released).join(5)
+
+    again, again_path, created = image_store.store_base64(PNG)
+
+    assert (again, again_path, created) == (content_hash, path, True)
+    assert os.path.isfile(path)
+
+
+def test_legacy_uploads_are_adopted(tmp_path, monkeypatch):
+    legacy = tmp_path / 'static' / 'uploads'
+    (legacy / 'ab' / 'cd').mkdir(parents=True)
+    (legacy / 'ab' / 'cd' / 'abcd.png').write_bytes(b'png')
+    (legacy / 'old-uuid.png').write_bytes(b'old')
+    (legacy / image_store.TMP_DIR).mkdir()
+    (legacy / image_store.TMP_DIR / 'x.part').write_bytes(b'')
+    monkeypatch.setattr(image_store, 'LEGACY_UPLOAD_ROOTS', (str(legacy),))
+    monkeypatch.delenv('UPLOAD_DIR')
+
+    assert image_store.adopt_legacy_uploads() == 2
+
+    root = image_store.upload_root()
+    assert image_store.path_for_url('/static/uploads/ab/cd/abcd.png') == os.path.join(root, 'ab', 'cd', 'abcd.png')
+    with open(os.path.join(root, 'ab', 'cd', 'abcd.png'), 'rb') as f:
+        assert f.read() == b'png'
+    assert os.path.isfile(os.path.join(root, 'old-uuid.png'))
+    assert not (legacy / 'old-uuid.png').exists()
+    assert image_store.adopt_legacy_uploads() == 0
+
+
+def test_reuse_only_picks_own_images(app, admin, clean, monkeypatch):
+    from src.models.user import User
+    other = User.query.filter_by(username='reuse-other').first()
+    if other is None:
+        other = User(username='reuse-other', email='reuse-other@example.com', role='user')
+        other.set_password('secret')
+        db.session.add(other)
+        db.session.commit()
+    stored_image(other.id)
+    monkeypatch.setattr(image_generator, 'OPENAI_API_KEY', 'test-key')
+
+    payload, status = image_generator.create_image_job(
+        admin, {'user_input': 'Bäckerei am Markt', 'image_type': 'kachel', 'allow_reuse': True},
+        submit=lambda args, count: True
+    )
+
+    assert status == 202
+    assert (payload['job']['status'], payload['job']['completed']) == ('queued', 0)
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import update
+from src.models.user import db, User
+from src.services import principal
+
+
+@pytest.fixture
+def member(app):
+    with app.app_context():
+        user = User.query.filter_by(username='principal-member').first()
+        if user is None:
+            user = User(username='principal-member', email='principal-member@example.com', role='user')
+            user.set_password('secret')
+            db.session.add(user)
+        user.role = 'admin'
+        db.session.commit()
+        principal.invalidate_principal(user.id)
+        yield user.id
+        db.session.remove()
+
+
+def set_role(user_id, role):
+    """Role change made by another worker process (no local invalidation)"""
+    with db.engine.begin() as conn:
+        conn.execute(update(User.__table__).where(User.__table__.c.id == user_id).values(role=role))
+    # The next request starts with a new session
+    db.session.remove()
+
+
+def test_demoted_admin_loses_rights_without_invalidation(member):
+    assert principal.load_principal(member).is_admin
+    set_role(member, 'user')
+
+    assert not principal.load_principal(member).is_admin
+
+
+def test_regular_users_are_cached(member):
+    set_role(member, 'user')
+    assert principal.load_principal(member).role == 'user'
+    set_role(member, 'editor')
+
+    assert principal.load_principal(member).role == 'user'
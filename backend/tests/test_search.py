@@ -0,0 +1,29 @@
+import pytest
+from src.models.user import db, SEOResult
+from src.models.search import search_results
+
+
+@pytest.fixture
+def crawled(app, admin):
+    with app.app_context():
+        SEOResult.query.delete()
+        db.session.add(SEOResult(
+            domain='baeckerei-xss.de', user_id=admin, short_description='Bäckerei',
+            long_description='<img src=x onerror=alert(1)> Frische Brötchen & Kuchen aus der Bäckerei <b>am Markt</b>'
+        ))
+        db.session.commit()
+        yield
+        SEOResult.query.delete()
+        db.session.commit()
+        db.session.remove()
+
+
+def test_snippet_escapes_crawled_text(crawled):
+    hits, total = search_results('brötchen')
+
+    assert total == 1
+    snippet = hits[0][1]
+    assert '<mark>Brötchen</mark>' in snippet
+    assert '<img' not in snippet and '<b>' not in snippet
+    assert '&lt;img src=x onerror=alert(1)&gt;' in snippet
+    assert '&amp; Kuchen' in snippet
@@ -0,0 +1,34 @@
+import pytest
+from src.models.user import db
+from src.models.image import GeneratedImage
+from src.models.change_event import ChangeEvent
+from src.models.data_version import DataVersion
+from src.services import upload_gc
+
+
+@pytest.fixture
+def images(app, admin):
+    with app.app_context():
+        GeneratedImage.query.delete()
+        for n in range(3):
+            db.session.add(GeneratedImage(
+                user_id=admin, user_input='x', image_type='kachel', prompt_used='p',
+                image_url=f'https://images.example.com/{n}.png', image_bytes=1000
+            ))
+        db.session.commit()
+        ChangeEvent.query.delete()
+        DataVersion.query.delete()
+        db.session.commit()
+        yield admin
+        db.session.remove()
+
+
+def test_quota_eviction_deletes_rows_one_by_one(images):
+    report = {'evicted_images': 0, 'evicted_bytes': 0}
+    upload_gc.enforce_user_quota(report, 1500)
+
+    assert report['evicted_images'] == 2
+    assert GeneratedImage.query.count() == 1
+    # Per-user events and versions, no reset for everybody
+    assert [(e.op, e.user_id) for e in ChangeEvent.query] == [('delete', images)] * 2
+    assert [v.scope for v in DataVersion.query] == [f'image:user:{images}']
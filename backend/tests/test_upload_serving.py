@@ -0,0 +1,40 @@
+import os
+import pytest
+from src.services import image_store
+
+
+@pytest.fixture
+def uploads(app):
+    root = image_store.upload_root()
+    os.makedirs(os.path.join(root, 'ab', 'cd'), exist_ok=True)
+    os.makedirs(os.path.join(root, image_store.TMP_DIR), exist_ok=True)
+    files = {
+        'ab/cd/image.png': b'png',
+        'tmp/tmpx1y2.part': b'partial',
+        '.gc.lock': b'',
+        'ab/.hidden.png': b'png',
+    }
+    for name, data in files.items():
+        with open(os.path.join(root, *name.split('/')), 'wb') as f:
+            f.write(data)
+    return app.test_client()
+
+
+def test_serves_stored_file(uploads):
+    response = uploads.get('/static/uploads/ab/cd/image.png')
+    assert response.status_code == 200
+    assert response.data == b'png'
+
+
+@pytest.mark.parametrize('path', ['ab', 'ab/cd', 'ab/cd/'])
+def test_directory_is_not_found(uploads, path):
+    assert uploads.get(f'/static/uploads/{path}').status_code == 404
+
+
+def test_partial_write_is_not_found(uploads):
+    assert uploads.get('/static/uploads/tmp/tmpx1y2.part').status_code == 404
+
+
+@pytest.mark.parametrize('path', ['.gc.lock', 'ab/.hidden.png'])
+def test_dot_file_is_not_found(uploads, path):
+    assert uploads.get(f'/static/uploads/{path}').status_code == 404
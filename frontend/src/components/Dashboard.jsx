@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
+import { useChangeFeed } from '../hooks/use-change-feed';
 import Header from './Header';
 import DomainAnalysisForm from './DomainAnalysisForm';
 import SEOResultDisplay from './SEOResultDisplay';
@@ -10,7 +11,10 @@ import { Input } from '@/components/ui/input';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
 import { Alert, AlertDescription } from '@/components/ui/alert';
-import { Search, RefreshCw, Eye, Trash2, Users, Settings, ArrowLeft, Image, Globe } from 'lucide-react';
+import { Search, RefreshCw, Eye, Trash2, Users, Settings, ArrowLeft, Image, Globe, Download } from 'lucide-react';
+
+const RESULT_FIELDS = 'id,domain,created_at,username';
+const PER_PAGE = 10;
 
 const Dashboard = () => {
   const { token, isAdmin } = useAuth();
@@ -25,8 +29,8 @@ const Dashboard = () => {
   const [showUserManagement, setShowUserManagement] = useState(false);
 
   useEffect(() => {
-    fetchResults();
-  }, [currentPage, searchTerm]);
+    if (activeTab === 'text') fetchResults();
+  }, [currentPage, searchTerm, activeTab]);
 
   const fetchResults = async () => {
     setLoading(true);
@@ -35,7 +39,8 @@ const Dashboard = () => {
     try {
       const params = new URLSearchParams({
         page: currentPage,
-        per_page: 10,
+        per_page: PER_PAGE,
+        fields: RESULT_FIELDS,
         ...(searchTerm && { search: searchTerm })
       });
 
@@ -62,9 +67,24 @@ const Dashboard = () => {
     }
   };
 
+  // Apply new and deleted results to the list instead of reloading the page
+  // (the images tab has its own feed)
+  useChangeFeed(activeTab === 'text' ? `result_fields=${RESULT_FIELDS}` : null, (change) => {
+    if (change.entity === null || (change.entity === 'seo_result' && change.op === 'reset')) {
+      fetchResults();
+    } else if (change.entity !== 'seo_result') {
+      return;
+    } else if (change.op === 'delete') {
+      setResults(prev => prev.filter(result => result.id !== change.entity_id));
+    } else if (change.data && currentPage === 1 && !searchTerm) {
+      setResults(prev => prev.some(result => result.id === change.data.id)
+        ? prev
+        : [change.data, ...prev].slice(0, PER_PAGE));
+    }
+  });
+
   const handleAnalysisComplete = (newResult) => {
     setSelectedResult(newResult);
-    fetchResults(); // Refresh the list
   };
 
   const handleSearch = (e) => {
@@ -110,7 +130,7 @@ const Dashboard = () => {
       });
 
       if (response.ok) {
-        fetchResults();
+        setResults(prev => prev.filter(result => result.id !== resultId));
         if (selectedResult && selectedResult.id === resultId) {
           setSelectedResult(null);
         }
@@ -306,6 +326,14 @@ const Dashboard = () => {
                       </>
                     )}
                   </Button>
+                  <Button
+                    variant="outline"
+                    onClick={() => { window.location.href = '/api/seo/export?format=xlsx'; }}
+                    className="w-full mt-2 flex items-center space-x-2"
+                  >
+                    <Download className="h-4 w-4" />
+                    <span>Alle Profile exportieren (Excel)</span>
+                  </Button>
                 </CardContent>
               </Card>
             )}
@@ -1,5 +1,6 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useAuth } from '../context/AuthContext';
+import { useChangeFeed } from '../hooks/use-change-feed';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
@@ -8,27 +9,49 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Alert, AlertDescription } from '@/components/ui/alert';
 import { Badge } from '@/components/ui/badge';
+import { Checkbox } from '@/components/ui/checkbox';
 import { Loader2, Image, Download, Trash2, CheckCircle, Eye } from 'lucide-react';
 
+const IMAGE_FIELDS = 'id,image_type,image_url,thumbnail_url,user_input,created_at';
+
 const ImageGenerator = () => {
   const [userInput, setUserInput] = useState('');
   const [imageType, setImageType] = useState('header');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
-  const [generatedImage, setGeneratedImage] = useState(null);
+  const [variants, setVariants] = useState('1');
+  const [allowReuse, setAllowReuse] = useState(false);
+  const [generatedImages, setGeneratedImages] = useState([]);
   const [imageHistory, setImageHistory] = useState([]);
   const [historyLoading, setHistoryLoading] = useState(false);
   const { token } = useAuth();
+  const pollTimer = useRef(null);
 
   useEffect(() => {
     fetchImageHistory();
+    return () => clearTimeout(pollTimer.current);
   }, []);
 
+  // New and deleted images (also from other tabs) without reloading the history
+  useChangeFeed(`image_fields=${IMAGE_FIELDS}`, (change) => {
+    if (change.entity === null || (change.entity === 'image' && change.op === 'reset')) {
+      fetchImageHistory();
+    } else if (change.entity !== 'image') {
+      return;
+    } else if (change.op === 'delete') {
+      setImageHistory(prev => prev.filter(img => img.id !== change.entity_id));
+    } else if (change.data) {
+      setImageHistory(prev => prev.some(img => img.id === change.data.id)
+        ? prev
+        : [change.data, ...prev].slice(0, 10));
+    }
+  });
+
   const fetchImageHistory = async () => {
     setHistoryLoading(true);
     try {
-      const response = await fetch('/api/images/history?page=1&per_page=10', {
+      const response = await fetch(`/api/images/history?page=1&per_page=10&fields=${IMAGE_FIELDS}`, {
         headers: {
           'Content-Type': 'application/json',
         },
@@ -49,12 +72,51 @@ const ImageGenerator = () => {
     }
   };
 
+  const pollJob = async (jobId) => {
+    try {
+      const response = await fetch(`/api/images/jobs/${jobId}`, {
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        credentials: 'include'
+      });
+
+      const data = await response.json();
+
+      if (!response.ok) {
+        setError(data.error || 'Bildgenerierung fehlgeschlagen');
+        setLoading(false);
+        return;
+      }
+
+      const job = data.job;
+      setGeneratedImages(job.images);
+
+      if (job.status === 'done') {
+        setSuccess(job.images.length > 1 ? `${job.images.length} Bilder erfolgreich generiert!` : 'Bild erfolgreich generiert!');
+        if (job.failed > 0) {
+          setError(`${job.failed} von ${job.variants} Varianten fehlgeschlagen`);
+        }
+        setLoading(false);
+      } else if (job.status === 'failed') {
+        setError(job.error || 'Bildgenerierung fehlgeschlagen');
+        setLoading(false);
+      } else {
+        pollTimer.current = setTimeout(() => pollJob(jobId), 3000);
+      }
+    } catch (error) {
+      console.error('Job polling error:', error);
+      pollTimer.current = setTimeout(() => pollJob(jobId), 5000);
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     setLoading(true);
     setError('');
     setSuccess('');
-    setGeneratedImage(null);
+    setGeneratedImages([]);
+    clearTimeout(pollTimer.current);
 
     try {
       const response = await fetch('/api/images/generate', {
@@ -65,25 +127,33 @@ const ImageGenerator = () => {
         credentials: 'include',
         body: JSON.stringify({ 
           user_input: userInput,
-          image_type: imageType 
+          image_type: imageType,
+          variants: parseInt(variants, 10),
+          allow_reuse: allowReuse
         }),
       });
 
       const data = await response.json();
 
       if (response.ok) {
-        setSuccess('Bild erfolgreich generiert!');
-        setGeneratedImage(data.image);
         setUserInput('');
-        // Refresh history
-        fetchImageHistory();
+        if (data.job.status === 'done') {
+          // All variants were served from earlier images
+          setGeneratedImages(data.job.images);
+          setSuccess('Vorhandene Bilder wiederverwendet!');
+          setLoading(false);
+        } else {
+          // Job runs in the background, poll until all variants are done
+          setGeneratedImages(data.job.images);
+          pollTimer.current = setTimeout(() => pollJob(data.job.id), 3000);
+        }
       } else {
         setError(data.error || 'Bildgenerierung fehlgeschlagen');
+        setLoading(false);
       }
     } catch (error) {
       console.error('Image generation error:', error);
       setError('Netzwerkfehler bei der Bildgenerierung');
-    } finally {
       setLoading(false);
     }
   };
@@ -179,6 +249,21 @@ const ImageGenerator = () => {
               </Select>
             </div>
             
+            <div className="space-y-2">
+              <Label htmlFor="variants">Anzahl Varianten</Label>
+              <Select value={variants} onValueChange={setVariants}>
+                <SelectTrigger>
+                  <SelectValue placeholder="Anzahl auswählen" />
+                </SelectTrigger>
+                <SelectContent>
+                  <SelectItem value="1">1 Bild</SelectItem>
+                  <SelectItem value="2">2 Varianten</SelectItem>
+                  <SelectItem value="3">3 Varianten</SelectItem>
+                  <SelectItem value="4">4 Varianten</SelectItem>
+                </SelectContent>
+              </Select>
+            </div>
+            
             <div className="space-y-2">
               <Label htmlFor="userInput">Was soll dargestellt werden?</Label>
               <Textarea
@@ -192,6 +277,18 @@ const ImageGenerator = () => {
               />
             </div>
             
+            <div className="flex items-center space-x-2">
+              <Checkbox
+                id="allowReuse"
+                checked={allowReuse}
+                onCheckedChange={(checked) => setAllowReuse(checked === true)}
+                disabled={loading}
+              />
+              <Label htmlFor="allowReuse" className="text-sm font-normal">
+                Bereits generierte Bilder für identische Eingaben wiederverwenden
+              </Label>
+            </div>
+            
             <Button 
               type="submit" 
               className="w-full text-white font-medium hover:opacity-90 transition-opacity" 
@@ -212,43 +309,51 @@ const ImageGenerator = () => {
       </Card>
 
       {/* Generated Image Display */}
-      {generatedImage && (
+      {generatedImages.length > 0 && (
         <Card>
           <CardHeader>
-            <CardTitle>Generiertes Bild</CardTitle>
+            <CardTitle>{generatedImages.length > 1 ? 'Generierte Bilder' : 'Generiertes Bild'}</CardTitle>
           </CardHeader>
           <CardContent>
-            <div className="space-y-4">
-              <div className="flex items-center space-x-2">
-                <Badge className={getImageTypeBadgeColor(generatedImage.image_type)}>
-                  {getImageTypeLabel(generatedImage.image_type)}
-                </Badge>
-                <span className="text-sm text-gray-600">
-                  {generatedImage.image_size}
-                </span>
-              </div>
-              
-              <div className="relative">
-                <img 
-                  src={generatedImage.image_url} 
-                  alt={generatedImage.user_input}
-                  className="w-full rounded-lg shadow-lg"
-                />
-              </div>
-              
-              <div className="flex space-x-2">
-                <Button 
-                  onClick={() => downloadImage(generatedImage.image_url, `generated-${generatedImage.image_type}-${Date.now()}.png`)}
-                  variant="outline"
-                  size="sm"
-                >
-                  <Download className="h-4 w-4 mr-2" />
-                  Herunterladen
-                </Button>
-              </div>
+            <div className="space-y-6">
+              {generatedImages.map((generatedImage) => (
+                <div key={generatedImage.id} className="space-y-4">
+                  <div className="flex items-center space-x-2">
+                    <Badge className={getImageTypeBadgeColor(generatedImage.image_type)}>
+                      {getImageTypeLabel(generatedImage.image_type)}
+                    </Badge>
+                    <span className="text-sm text-gray-600">
+                      {generatedImage.image_size}
+                    </span>
+                  </div>
+                  
+                  <div className="relative">
+                    <picture>
+                      {generatedImage.avif_url && <source srcSet={generatedImage.avif_url} type="image/avif" />}
+                      {generatedImage.webp_url && <source srcSet={generatedImage.webp_url} type="image/webp" />}
+                      <img 
+                        src={generatedImage.image_url} 
+                        alt={generatedImage.user_input}
+                        className="w-full rounded-lg shadow-lg"
+                      />
+                    </picture>
+                  </div>
+                  
+                  <div className="flex space-x-2">
+                    <Button 
+                      onClick={() => downloadImage(generatedImage.image_url, `generated-${generatedImage.image_type}-${generatedImage.id}.png`)}
+                      variant="outline"
+                      size="sm"
+                    >
+                      <Download className="h-4 w-4 mr-2" />
+                      Herunterladen
+                    </Button>
+                  </div>
+                </div>
+              ))}
               
               <div className="text-sm text-gray-600">
-                <strong>Beschreibung:</strong> {generatedImage.user_input}
+                <strong>Beschreibung:</strong> {generatedImages[0].user_input}
               </div>
             </div>
           </CardContent>
@@ -292,8 +397,9 @@ const ImageGenerator = () => {
                   
                   <div className="relative">
                     <img 
-                      src={image.image_url} 
+                      src={image.thumbnail_url || image.image_url} 
                       alt={image.user_input}
+                      loading="lazy"
                       className="w-full h-32 object-cover rounded"
                     />
                   </div>
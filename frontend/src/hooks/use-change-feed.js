@@ -0,0 +1,74 @@
+import * as React from "react"
+
+const POLL_TIMEOUT = 25
+const RETRY_DELAY = 5000
+
+// Calls onChange for every event of /api/changes: an EventSource stream,
+// or long-polls when the server has no stream slot left (429) or the stream fails.
+// query: search string of the feed (field projections), null to stay disconnected.
+export function useChangeFeed(query, onChange) {
+  const handler = React.useRef(onChange)
+  handler.current = onChange
+
+  React.useEffect(() => {
+    if (query === null) return
+    let stopped = false
+    let cursor = null
+    let source = null
+    let timer = null
+    const controller = new AbortController()
+
+    const emit = (change) => {
+      cursor = change.id
+      handler.current(change)
+    }
+
+    const poll = async () => {
+      if (stopped) return
+      const params = new URLSearchParams(query)
+      if (cursor !== null) {
+        params.set("since", cursor)
+        params.set("timeout", POLL_TIMEOUT)
+      }
+      let delay = 0
+      try {
+        const response = await fetch(`/api/changes?${params}`, {
+          credentials: "include",
+          signal: controller.signal,
+        })
+        const data = await response.json()
+        if (response.ok) {
+          data.events.forEach(emit)
+          cursor = data.cursor
+          if (data.retry_after) delay = data.retry_after * 1000
+        } else {
+          delay = RETRY_DELAY
+        }
+      } catch (error) {
+        if (stopped) return
+        delay = RETRY_DELAY
+      }
+      timer = setTimeout(poll, delay)
+    }
+
+    source = new EventSource(`/api/changes/stream?${new URLSearchParams(query)}`, { withCredentials: true })
+    source.addEventListener("ready", (e) => {
+      if (cursor === null) cursor = JSON.parse(e.data).cursor
+    })
+    source.onmessage = (e) => emit(JSON.parse(e.data))
+    source.onerror = () => {
+      // CONNECTING: the browser reconnects with Last-Event-ID by itself
+      if (source.readyState === EventSource.CLOSED && !stopped) {
+        source = null
+        poll()
+      }
+    }
+
+    return () => {
+      stopped = true
+      if (source) source.close()
+      controller.abort()
+      clearTimeout(timer)
+    }
+  }, [query])
+}